@@ -0,0 +1,151 @@
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+import Utility.DBConnector as Connector
+
+MONTHS = 12
+
+
+# occupancy of every apartment over one calendar year, built from a single pass over
+# Reservations. a stay [start_date, end_date) occupies the nights start_date .. end_date - 1,
+# the night of a day is counted in the month of that day.
+# bitmaps[i, d] is True when apartment apartment_ids[i] is occupied on the night of day d.
+class OccupancyReport:
+    def __init__(self, year: int, apartment_ids: np.ndarray, owner_ids: np.ndarray,
+                 locations: List[Tuple[str, str]], location_index: np.ndarray, bitmaps: np.ndarray):
+        self.year = year
+        self.first_day = date(year, 1, 1)
+        self.apartment_ids = apartment_ids
+        # owner of every apartment, 0 for apartments without an owner
+        self.owner_ids = owner_ids
+        # (city, country) pairs, location_index[i] is the location of apartment i
+        self.locations = locations
+        self.location_index = location_index
+        self.bitmaps = bitmaps
+        # first day (offset) of every month, and the number of days in it
+        self.month_starts = np.array([(date(year, month, 1) - self.first_day).days for month in range(1, MONTHS + 1)])
+        self.month_days = np.diff(np.append(self.month_starts, bitmaps.shape[1]))
+        # occupied nights of every apartment in every month
+        self.monthly_nights = np.add.reduceat(bitmaps, self.month_starts, axis=1, dtype=np.int64) \
+            if bitmaps.shape[0] > 0 else np.zeros((0, MONTHS), dtype=np.int64)
+
+    def _grouped_rates(self, monthly_nights: np.ndarray, groups: np.ndarray, group_count: int) -> np.ndarray:
+        # monthly rate of a group of apartments = their occupied nights / their available nights
+        nights = np.zeros((group_count, MONTHS), dtype=np.int64)
+        np.add.at(nights, groups, monthly_nights)
+        apartments = np.bincount(groups, minlength=group_count)
+        available = apartments[:, None] * self.month_days[None, :]
+        return np.divide(nights, available, out=np.zeros(nights.shape), where=available > 0)
+
+    # apartment id -> occupancy rate of each month, 0.0 - 1.0
+    def per_apartment(self) -> Dict[int, List[float]]:
+        rates = self.monthly_nights / self.month_days[None, :]
+        return {int(apartment_id): rates[i].tolist() for i, apartment_id in enumerate(self.apartment_ids)}
+
+    # owner id -> occupancy rate of each month over all the owner's apartments
+    def per_owner(self) -> Dict[int, List[float]]:
+        owned = self.owner_ids > 0
+        owners, groups = np.unique(self.owner_ids[owned], return_inverse=True)
+        rates = self._grouped_rates(self.monthly_nights[owned], groups, len(owners))
+        return {int(owner_id): rates[i].tolist() for i, owner_id in enumerate(owners)}
+
+    # (city, country) -> occupancy rate of each month over all apartments there
+    def per_city(self) -> Dict[Tuple[str, str], List[float]]:
+        rates = self._grouped_rates(self.monthly_nights, self.location_index, len(self.locations))
+        return {location: rates[i].tolist() for i, location in enumerate(self.locations)}
+
+    # apartment id -> longest run of free nights in the year
+    def longest_gaps(self) -> Dict[int, int]:
+        count, days = self.bitmaps.shape
+        if count == 0:
+            return {}
+        # occupied nights with a sentinel night before and after the year, the longest
+        # gap of a row is the largest distance between two consecutive occupied nights
+        padded = np.ones((count, days + 2), dtype=bool)
+        padded[:, 1:-1] = self.bitmaps
+        rows, cols = np.nonzero(padded)
+        gaps = np.diff(cols) - 1
+        same_row = rows[1:] == rows[:-1]
+        longest = np.zeros(count, dtype=np.int64)
+        np.maximum.at(longest, rows[1:][same_row], gaps[same_row])
+        return {int(apartment_id): int(longest[i]) for i, apartment_id in enumerate(self.apartment_ids)}
+
+    # the top days by number of occupied apartments, busiest first
+    def peak_days(self, top: int = 10) -> List[Tuple[date, int]]:
+        occupied = self.bitmaps.sum(axis=0, dtype=np.int64)
+        order = np.argsort(-occupied, kind="stable")[:top]
+        return [(self.first_day + timedelta(days=int(day)), int(occupied[day])) for day in order]
+
+
+# apartments are (id, city, country, owner id or 0) sorted by id, stays come in chunks of
+# (apartment_id, first night, end) as day offsets from January 1st, clipped to the year
+def build_occupancy_report(year: int, apartments: List[tuple], stay_chunks: Iterable[List[tuple]]) -> OccupancyReport:
+    days = (date(year + 1, 1, 1) - date(year, 1, 1)).days
+    apartment_ids = np.array([row[0] for row in apartments], dtype=np.int64)
+    owner_ids = np.array([row[3] for row in apartments], dtype=np.int64)
+    locations = sorted({(row[1], row[2]) for row in apartments})
+    location_of = {location: i for i, location in enumerate(locations)}
+    location_index = np.array([location_of[(row[1], row[2])] for row in apartments], dtype=np.int64)
+
+    # +1 at the first night of every stay and -1 after its last, the running sum over
+    # the year is then the number of stays covering each night
+    changes = np.zeros((len(apartment_ids), days + 1), dtype=np.int32)
+    for rows in stay_chunks:
+        chunk = np.array(rows, dtype=np.int64)
+        rows_of = np.searchsorted(apartment_ids, chunk[:, 0])
+        np.add.at(changes, (rows_of, chunk[:, 1]), 1)
+        np.add.at(changes, (rows_of, chunk[:, 2]), -1)
+    bitmaps = np.cumsum(changes[:, :days], axis=1) > 0
+    return OccupancyReport(year, apartment_ids, owner_ids, locations, location_index, bitmaps)
+
+
+# the report of a year without apartments, what the Solution APIs return on an error
+def empty_report(year: int) -> OccupancyReport:
+    return build_occupancy_report(year, [], [])
+
+
+# the (id, city, country, owner id or 0) rows and the stays build_occupancy_report takes,
+# STAYS_QUERY with the parameters of stay_params(year)
+APARTMENTS_QUERY = """
+    SELECT Apartments.id, Apartments.city, Apartments.country, COALESCE(OwnsApartment.owner_id, 0)
+    FROM Apartments
+    LEFT JOIN OwnsApartment ON Apartments.id = OwnsApartment.apartment_id
+    ORDER BY Apartments.id
+"""
+STAYS_QUERY = """
+    SELECT apartment_id, GREATEST(start_date, %(first)s) - %(first)s, LEAST(end_date, %(last)s) - %(first)s
+    FROM Reservations
+    WHERE start_date < %(last)s AND end_date > %(first)s
+"""
+
+
+def stay_params(year: int) -> Dict[str, date]:
+    return {"first": date(year, 1, 1), "last": date(year + 1, 1, 1)}
+
+
+def occupancy_report(year: int) -> OccupancyReport:
+    conn = Connector.DBConnector(read_only=True)
+    try:
+        # one snapshot for both, every stay is of an apartment in the list
+        with conn.snapshot():
+            _, apartments = conn.execute(APARTMENTS_QUERY)
+            return build_occupancy_report(year, apartments.rows, conn.stream(STAYS_QUERY, stay_params(year)))
+    finally:
+        conn.close()
+
+
+# one report of the apartments of several reports of the same year, each of different
+# apartments (e.g. one report per shard)
+def combine_reports(reports: List[OccupancyReport]) -> OccupancyReport:
+    apartment_ids = np.concatenate([report.apartment_ids for report in reports])
+    order = np.argsort(apartment_ids, kind="stable")
+    apartment_locations = [report.locations[i] for report in reports for i in report.location_index.tolist()]
+    locations = sorted(set(apartment_locations))
+    location_of = {location: i for i, location in enumerate(locations)}
+    location_index = np.array([location_of[apartment_locations[i]] for i in order.tolist()], dtype=np.int64)
+    return OccupancyReport(reports[0].year, apartment_ids[order],
+                           np.concatenate([report.owner_ids for report in reports])[order],
+                           locations, location_index,
+                           np.concatenate([report.bitmaps for report in reports])[order])
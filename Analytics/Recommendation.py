@@ -0,0 +1,160 @@
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+import Utility.DBConnector as Connector
+from Business.Apartment import Apartment
+
+MIN_RATING = 1
+MAX_RATING = 10
+# cells of the dense per-batch accumulators, see RecommendationEngine.batch_size
+BATCH_CELLS = 4 * 10 ** 6
+
+
+def _ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    # concatenation of arange(start, start + length) for every start and length
+    total = int(lengths.sum())
+    offsets = np.cumsum(lengths) - lengths
+    return np.arange(total, dtype=np.int64) - np.repeat(offsets - starts, lengths)
+
+
+def _mean_by_key(keys: np.ndarray, values: np.ndarray, size: int) -> Tuple[np.ndarray, np.ndarray]:
+    # distinct keys (0 <= key < size, sorted) and the mean of the values of each, summed
+    # in dense arrays of size cells instead of sorting the keys
+    sums = np.bincount(keys, weights=values, minlength=size)
+    counts = np.bincount(keys, minlength=size)
+    present = np.flatnonzero(counts)
+    return present, sums[present] / counts[present]
+
+
+def load_reviews(chunk_size: int = 100000) -> Tuple[np.ndarray, Dict[int, Apartment]]:
+    # (customer_id, apartment_id, rating) of every review, and the reviewed apartments by id
+    conn = Connector.DBConnector(read_only=True)
+    try:
+        # one snapshot for both, every reviewed apartment is in apartments
+        with conn.snapshot():
+            chunks = [np.array(rows, dtype=np.int64) for rows in
+                      conn.stream("SELECT customer_id, apartment_id, rating FROM Reviews", chunk_size=chunk_size)]
+            apartments = {}
+            for rows in conn.stream("""
+                SELECT id, address, city, country, size FROM Apartments
+                WHERE EXISTS (SELECT 1 FROM Reviews WHERE apartment_id = Apartments.id)
+            """, chunk_size=chunk_size):
+                for row in rows:
+                    apartments[row[0]] = Apartment(id=row[0], address=row[1], city=row[2], country=row[3],
+                                                   size=row[4])
+    finally:
+        conn.close()
+    reviews = np.concatenate(chunks) if chunks else np.zeros((0, 3), dtype=np.int64)
+    return reviews, apartments
+
+
+# the recommendations of Solution.get_apartment_recommendation for every customer at once,
+# from all reviews loaded once into a sparse customer x apartment rating matrix, kept in
+# compressed rows (the reviews of each customer) and compressed columns (the reviewers of
+# each apartment). for a customer c:
+#   ratio(c, o) = mean of rating(c, a) / rating(o, a) over the apartments a both c and
+#                 another customer o reviewed
+#   score(c, b) = mean of clamp(ratio(c, o) * rating(o, b), 1, 10) over those o, for every
+#                 apartment b some o reviewed and c did not
+# a batch of customers is computed with a few array operations over its (customer,
+# co-reviewer) pairs and their reviews, grouped in dense batch x customers and batch x
+# apartments accumulators, which bound the batch size
+class RecommendationEngine:
+    def __init__(self, customer_ids: np.ndarray, apartment_ids: np.ndarray, ratings: np.ndarray,
+                 apartments: Dict[int, Apartment] = None):
+        self.customers, customer_index = np.unique(np.asarray(customer_ids, dtype=np.int64), return_inverse=True)
+        self.apartments, apartment_index = np.unique(np.asarray(apartment_ids, dtype=np.int64), return_inverse=True)
+        ratings = np.asarray(ratings, dtype=np.float64)
+        # apartment id -> Apartment, for the results of recommend()
+        self.apartment_details = apartments if apartments is not None else {}
+        customer_count, apartment_count = len(self.customers), len(self.apartments)
+
+        # rows: the reviews sorted by (customer, apartment)
+        order = np.lexsort((apartment_index, customer_index))
+        self.row_starts = np.searchsorted(customer_index[order], np.arange(customer_count + 1))
+        self.row_apartments = apartment_index[order]
+        self.row_ratings = ratings[order]
+
+        # columns: the reviews sorted by (apartment, customer)
+        order = np.lexsort((customer_index, apartment_index))
+        self.column_starts = np.searchsorted(apartment_index[order], np.arange(apartment_count + 1))
+        self.column_customers = customer_index[order]
+        self.column_ratings = ratings[order]
+
+    @staticmethod
+    def load(chunk_size: int = 100000) -> 'RecommendationEngine':
+        reviews, apartments = load_reviews(chunk_size)
+        return RecommendationEngine(reviews[:, 0], reviews[:, 1], reviews[:, 2], apartments)
+
+    # customers a batch may hold so its accumulators stay within BATCH_CELLS cells
+    def batch_size(self) -> int:
+        return max(1, BATCH_CELLS // max(len(self.customers), len(self.apartments), 1))
+
+    # (customer, apartment, score) of all recommendations of the customers (indices into
+    # self.customers, ascending), sorted by customer and apartment
+    def scores(self, customers: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        customer_count, apartment_count = len(self.customers), len(self.apartments)
+        customers = np.asarray(customers, dtype=np.int64)
+        batch = len(customers)
+
+        # every review of the customers next to every other review of the same apartment,
+        # customers are numbered 0 .. batch - 1 within the batch
+        starts = self.row_starts[customers]
+        lengths = self.row_starts[customers + 1] - starts
+        reviews = _ranges(starts, lengths)
+        owners = np.repeat(np.arange(batch), lengths)
+        apartments = self.row_apartments[reviews]
+        starts = self.column_starts[apartments]
+        lengths = self.column_starts[apartments + 1] - starts
+        others = _ranges(starts, lengths)
+        pair_customers = np.repeat(owners, lengths)
+        pair_others = self.column_customers[others]
+        ratios = np.repeat(self.row_ratings[reviews], lengths) / self.column_ratings[others]
+        keep = pair_others != customers[pair_customers]
+        pairs, ratios = _mean_by_key(pair_customers[keep] * customer_count + pair_others[keep], ratios[keep],
+                                     batch * customer_count)
+        pair_customers, pair_others = pairs // customer_count, pairs % customer_count
+
+        # every review of every co-reviewer, scaled by its ratio, then the apartments the
+        # customer reviewed are dropped from the sums
+        starts = self.row_starts[pair_others]
+        lengths = self.row_starts[pair_others + 1] - starts
+        reviews = _ranges(starts, lengths)
+        targets = np.repeat(pair_customers * apartment_count, lengths) + self.row_apartments[reviews]
+        predictions = np.clip(np.repeat(ratios, lengths) * self.row_ratings[reviews], MIN_RATING, MAX_RATING)
+        sums = np.bincount(targets, weights=predictions, minlength=batch * apartment_count)
+        counts = np.bincount(targets, minlength=batch * apartment_count)
+        counts[owners * apartment_count + apartments] = 0
+        targets = np.flatnonzero(counts)
+        return customers[targets // apartment_count], targets % apartment_count, sums[targets] / counts[targets]
+
+    def _results(self, apartments: np.ndarray, scores: np.ndarray) -> List[Tuple[Apartment, float]]:
+        details = self.apartment_details
+        return [(details.get(apartment_id), score)
+                for apartment_id, score in zip(self.apartments[apartments].tolist(), scores.tolist())]
+
+    # same as Solution.get_apartment_recommendation(customer_id), sorted by apartment id
+    def recommend(self, customer_id: int) -> List[Tuple[Apartment, float]]:
+        if customer_id is None:
+            return []
+        position = np.searchsorted(self.customers, customer_id)
+        if position == len(self.customers) or self.customers[position] != customer_id:
+            return []
+        _, apartments, scores = self.scores(np.array([position]))
+        return self._results(apartments, scores)
+
+    # customer id -> recommendations, for every customer with at least one, computed
+    # batch_size customers at a time (by default as many as BATCH_CELLS allows)
+    def recommend_all(self, batch_size: int = None) -> Iterator[Tuple[int, List[Tuple[Apartment, float]]]]:
+        batch_size = batch_size if batch_size is not None else self.batch_size()
+        for first in range(0, len(self.customers), batch_size):
+            customers, apartments, scores = self.scores(np.arange(first, min(first + batch_size, len(self.customers))))
+            bounds = (np.flatnonzero(np.diff(customers)) + 1).tolist()
+            for start, end in zip([0] + bounds, bounds + [len(customers)]):
+                if start < end:
+                    yield int(self.customers[customers[start]]), self._results(apartments[start:end], scores[start:end])
+
+
+def recommendations_for_all(batch_size: int = None) -> Dict[int, List[Tuple[Apartment, float]]]:
+    return dict(RecommendationEngine.load().recommend_all(batch_size))
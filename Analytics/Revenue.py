@@ -0,0 +1,114 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+import Utility.DBConnector as Connector
+
+# commission taken on every reservation, as in Solution.profit_per_month
+COMMISSION = 0.15
+MONTHS = 12
+
+
+# all reservations as columnar arrays, loaded once. every report is then a masked
+# np.bincount over these arrays, so producing many variants (per owner, per city,
+# per stay length, other commission rates) costs no further database work.
+# like profit_per_month, a reservation's price is attributed to the month of its end_date.
+class RevenueSnapshot:
+    def __init__(self, apartment_ids: np.ndarray, customer_ids: np.ndarray, years: np.ndarray,
+                 months: np.ndarray, nights: np.ndarray, prices: np.ndarray, owner_ids: np.ndarray,
+                 location_index: np.ndarray, locations: List[Tuple[str, str]]):
+        self.apartment_ids = apartment_ids
+        self.customer_ids = customer_ids
+        self.years = years
+        self.months = months
+        self.nights = nights
+        self.prices = prices
+        # owner of the reserved apartment, 0 when it has none
+        self.owner_ids = owner_ids
+        # location of the reserved apartment, an index into locations
+        self.location_index = location_index
+        self.locations = locations
+
+    @staticmethod
+    def load(chunk_size: int = 100000) -> 'RevenueSnapshot':
+        conn = Connector.DBConnector(read_only=True)
+        try:
+            # one snapshot for both, every reserved apartment is in the list
+            with conn.snapshot():
+                _, apartments = conn.execute("SELECT id, city, country FROM Apartments ORDER BY id")
+                chunks = []
+                for rows in conn.stream("""
+                    SELECT Reservations.apartment_id, Reservations.customer_id,
+                           EXTRACT(YEAR FROM end_date)::int, EXTRACT(MONTH FROM end_date)::int,
+                           end_date - start_date, total_price, COALESCE(OwnsApartment.owner_id, 0)
+                    FROM Reservations
+                    LEFT JOIN OwnsApartment ON Reservations.apartment_id = OwnsApartment.apartment_id
+                """, chunk_size=chunk_size):
+                    chunks.append(np.array(rows, dtype=np.float64))
+        finally:
+            conn.close()
+        locations = sorted({(row[1], row[2]) for row in apartments.rows})
+        location_of = {location: i for i, location in enumerate(locations)}
+        known_ids = np.array([row[0] for row in apartments.rows], dtype=np.int64)
+        known_locations = np.array([location_of[(row[1], row[2])] for row in apartments.rows], dtype=np.int64)
+
+        columns = np.concatenate(chunks) if chunks else np.zeros((0, 7))
+        apartment_ids = columns[:, 0].astype(np.int64)
+        return RevenueSnapshot(apartment_ids=apartment_ids,
+                               customer_ids=columns[:, 1].astype(np.int64),
+                               years=columns[:, 2].astype(np.int64),
+                               months=columns[:, 3].astype(np.int64),
+                               nights=columns[:, 4].astype(np.int64),
+                               prices=columns[:, 5],
+                               owner_ids=columns[:, 6].astype(np.int64),
+                               location_index=known_locations[np.searchsorted(known_ids, apartment_ids)],
+                               locations=locations)
+
+    def __len__(self):
+        return len(self.prices)
+
+    def _mask(self, year: int = None) -> np.ndarray:
+        if year is None:
+            return np.ones(len(self.prices), dtype=bool)
+        return self.years == year
+
+    def _grouped(self, keys: np.ndarray, year: int, commission: float) -> Tuple[np.ndarray, np.ndarray]:
+        # distinct keys and the commission earned on each of them
+        mask = self._mask(year)
+        values, groups = np.unique(keys[mask], return_inverse=True)
+        sums = np.bincount(groups, weights=self.prices[mask], minlength=len(values))
+        return values, sums * commission
+
+    # same result as Solution.profit_per_month(year) when commission is left at 15%
+    def profit_per_month(self, year: int, commission: float = COMMISSION) -> List[Tuple[int, float]]:
+        mask = self._mask(year)
+        sums = np.bincount(self.months[mask] - 1, weights=self.prices[mask], minlength=MONTHS)
+        return [(month + 1, float(sums[month] * commission)) for month in range(MONTHS)]
+
+    def by_owner(self, year: int = None, commission: float = COMMISSION) -> Dict[int, float]:
+        values, profits = self._grouped(self.owner_ids, year, commission)
+        return {int(owner_id): float(profit) for owner_id, profit in zip(values, profits) if owner_id > 0}
+
+    def by_city(self, year: int = None, commission: float = COMMISSION) -> Dict[Tuple[str, str], float]:
+        values, profits = self._grouped(self.location_index, year, commission)
+        return {self.locations[i]: float(profit) for i, profit in zip(values, profits)}
+
+    def by_stay_length(self, year: int = None, commission: float = COMMISSION) -> Dict[int, float]:
+        values, profits = self._grouped(self.nights, year, commission)
+        return {int(nights): float(profit) for nights, profit in zip(values, profits)}
+
+    def by_apartment(self, year: int = None, commission: float = COMMISSION) -> Dict[int, float]:
+        values, profits = self._grouped(self.apartment_ids, year, commission)
+        return {int(apartment_id): float(profit) for apartment_id, profit in zip(values, profits)}
+
+    def by_customer(self, year: int = None, commission: float = COMMISSION) -> Dict[int, float]:
+        values, profits = self._grouped(self.customer_ids, year, commission)
+        return {int(customer_id): float(profit) for customer_id, profit in zip(values, profits)}
+
+    # owner id -> profit of each month of the year
+    def owner_per_month(self, year: int, commission: float = COMMISSION) -> Dict[int, List[float]]:
+        mask = self._mask(year) & (self.owner_ids > 0)
+        owners, groups = np.unique(self.owner_ids[mask], return_inverse=True)
+        sums = np.zeros((len(owners), MONTHS))
+        np.add.at(sums, (groups, self.months[mask] - 1), self.prices[mask])
+        return {int(owner_id): (sums[i] * commission).tolist() for i, owner_id in enumerate(owners)}
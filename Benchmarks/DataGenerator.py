@@ -0,0 +1,174 @@
+import argparse
+import bisect
+import random
+import sys
+from datetime import date, timedelta
+from typing import Iterator, List, Tuple
+
+import Solution
+import Utility.DBConnector as Connector
+
+# deterministic synthetic data for the Solution schema, at millions of rows.
+# the same config (including the seed) always produces the same rows, and every
+# dataset satisfies the constraints of create_tables:
+#   - reservations of an apartment never overlap
+#   - a review exists only after a completed stay of that customer in that apartment,
+#     and there is at most one review per (customer, apartment)
+#   - apartments per owner and reservations (hence reviews) per customer follow a power law
+# run from the repository root:
+#   python -m Benchmarks.DataGenerator --reservations 1000000 --seed 7
+
+DEFAULT_LOCATIONS = [("Haifa", "Israel"), ("Tel Aviv", "Israel"), ("Jerusalem", "Israel"),
+                     ("Paris", "France"), ("Lyon", "France"), ("Berlin", "Germany"),
+                     ("Munich", "Germany"), ("London", "UK"), ("New York", "USA"), ("Tokyo", "Japan")]
+
+
+class GeneratorConfig:
+    def __init__(self, reservations: int = 100000, customers: int = None, apartments: int = None,
+                 owners: int = None, locations: List[Tuple[str, str]] = None, seed: int = 236363,
+                 skew: float = 1.1, review_probability: float = 0.6, max_nights: int = 14,
+                 max_gap: int = 20, first_date: date = date(2015, 1, 1), today: date = date(2025, 1, 1)):
+        self.reservations = reservations
+        self.customers = customers if customers is not None else max(10, reservations // 10)
+        self.apartments = apartments if apartments is not None else max(10, reservations // 50)
+        self.owners = owners if owners is not None else max(2, self.apartments // 4)
+        self.locations = locations if locations is not None else DEFAULT_LOCATIONS
+        self.seed = seed
+        # zipf exponent of the power-law distributions, larger means more skewed
+        self.skew = skew
+        # chance that a completed stay gets reviewed
+        self.review_probability = review_probability
+        self.max_nights = max_nights
+        self.max_gap = max_gap
+        self.first_date = first_date
+        # stays ending after this date are not completed yet, so never reviewed
+        self.today = today
+
+
+class ZipfSampler:
+    # draws 1..n where k is drawn with probability proportional to 1/k^skew
+    def __init__(self, n: int, skew: float, rng: random.Random):
+        self.rng = rng
+        self.cumulative = []
+        total = 0.0
+        for k in range(1, n + 1):
+            total += 1.0 / (k ** skew)
+            self.cumulative.append(total)
+        self.total = total
+
+    def sample(self) -> int:
+        return bisect.bisect_left(self.cumulative, self.rng.random() * self.total) + 1
+
+
+class DataGenerator:
+    def __init__(self, config: GeneratorConfig = None):
+        self.config = config if config is not None else GeneratorConfig()
+
+    def _rng(self, stream: str) -> random.Random:
+        # one independent generator per table so that each can be regenerated alone
+        return random.Random(f"{self.config.seed}:{stream}")
+
+    def owners(self) -> Iterator[tuple]:
+        for owner_id in range(1, self.config.owners + 1):
+            yield owner_id, f"owner {owner_id}"
+
+    def customers(self) -> Iterator[tuple]:
+        for customer_id in range(1, self.config.customers + 1):
+            yield customer_id, f"customer {customer_id}"
+
+    def apartments(self) -> Iterator[tuple]:
+        rng = self._rng("apartments")
+        for apartment_id in range(1, self.config.apartments + 1):
+            city, country = self.config.locations[rng.randrange(len(self.config.locations))]
+            yield apartment_id, f"{apartment_id} {city} street", city, country, rng.randint(20, 250)
+
+    def owns_apartment(self) -> Iterator[tuple]:
+        rng = self._rng("owns")
+        owner = ZipfSampler(self.config.owners, self.config.skew, rng)
+        for apartment_id in range(1, self.config.apartments + 1):
+            yield owner.sample(), apartment_id
+
+    def reservations(self) -> Iterator[tuple]:
+        # every apartment keeps a calendar cursor, a new stay starts a random gap after
+        # the previous one ended, so stays of the same apartment never overlap
+        rng = self._rng("reservations")
+        customer = ZipfSampler(self.config.customers, self.config.skew, rng)
+        apartment = ZipfSampler(self.config.apartments, self.config.skew / 2, rng)
+        next_free = [self.config.first_date] * (self.config.apartments + 1)
+        for _ in range(self.config.reservations):
+            apartment_id = apartment.sample()
+            customer_id = customer.sample()
+            start = next_free[apartment_id] + timedelta(days=rng.randint(0, self.config.max_gap))
+            nights = rng.randint(1, self.config.max_nights)
+            end = start + timedelta(days=nights)
+            next_free[apartment_id] = end
+            price = round(nights * rng.uniform(40, 400), 2)
+            yield customer_id, apartment_id, start, end, price
+
+    def reviews(self) -> Iterator[tuple]:
+        # replays the reservation stream, so reviews always follow a completed stay
+        rng = self._rng("reviews")
+        reviewed = set()
+        for customer_id, apartment_id, start, end, price in self.reservations():
+            if end > self.config.today or (customer_id, apartment_id) in reviewed:
+                continue
+            if rng.random() >= self.config.review_probability:
+                continue
+            reviewed.add((customer_id, apartment_id))
+            review_date = min(end + timedelta(days=rng.randint(0, 30)), self.config.today)
+            yield customer_id, apartment_id, review_date, rng.randint(1, 10), f"review {len(reviewed)}"
+
+    # table name, columns and the generator of its rows, in foreign key order
+    def tables(self) -> List[Tuple[str, List[str], Iterator[tuple]]]:
+        return [("Owners", ["id", "name"], self.owners()),
+                ("Customers", ["id", "name"], self.customers()),
+                ("Apartments", ["id", "address", "city", "country", "size"], self.apartments()),
+                ("OwnsApartment", ["owner_id", "apartment_id"], self.owns_apartment()),
+                ("Reservations", ["customer_id", "apartment_id", "start_date", "end_date", "total_price"],
+                 self.reservations()),
+                ("Reviews", ["customer_id", "apartment_id", "review_date", "rating", "review_text"],
+                 self.reviews())]
+
+    # streams the whole dataset into the (empty) tables with COPY and returns the row counts
+    def load(self, verbose: bool = False) -> dict:
+        counts = {}
+        conn = Connector.DBConnector()
+        try:
+            for table, columns, rows in self.tables():
+                counts[table] = conn.copy_rows(table, columns, rows)
+                if verbose:
+                    print(f"{table}: {counts[table]} rows")
+            conn.execute("ANALYZE")
+        finally:
+            conn.close()
+        return counts
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Generate and load a synthetic Solution dataset")
+    parser.add_argument("--reservations", type=int, default=100000)
+    parser.add_argument("--customers", type=int)
+    parser.add_argument("--apartments", type=int)
+    parser.add_argument("--owners", type=int)
+    parser.add_argument("--seed", type=int, default=236363)
+    parser.add_argument("--skew", type=float, default=1.1)
+    parser.add_argument("--locations", nargs="+", metavar="CITY:COUNTRY",
+                        help="cities to place apartments in, e.g. Haifa:Israel Paris:France")
+    parser.add_argument("--reset", action="store_true", help="drop and recreate the tables first")
+    args = parser.parse_args(argv)
+
+    locations = None
+    if args.locations:
+        locations = [tuple(location.split(":", 1)) for location in args.locations]
+    config = GeneratorConfig(reservations=args.reservations, customers=args.customers,
+                             apartments=args.apartments, owners=args.owners, locations=locations,
+                             seed=args.seed, skew=args.skew)
+    if args.reset:
+        Solution.drop_tables()
+    Solution.create_tables()
+    DataGenerator(config).load(verbose=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
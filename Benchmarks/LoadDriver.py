@@ -0,0 +1,246 @@
+import argparse
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import date, timedelta
+from typing import Dict, List
+
+import Solution
+import Utility.DBConnector as Connector
+import Utility.Retry as Retry
+from Utility.ReturnValue import ReturnValue
+from Benchmarks.DataGenerator import DataGenerator, GeneratorConfig, ZipfSampler
+from Benchmarks.SolutionBenchmark import percentile
+
+# concurrent load on the booking path: N threads or processes issue a mix of
+# customer_made_reservation / customer_cancelled_reservation / customer_reviewed_apartment,
+# with most bookings going to a few hot apartments. afterwards the Reservations table
+# is checked for overlapping stays, which must never be committed.
+# run from the repository root:
+#   python -m Benchmarks.LoadDriver --workers 16 --operations 500 --mix reserve=70 cancel=10 review=20
+#   python -m Benchmarks.LoadDriver --setup 100000 --processes --workers 8
+
+OPERATIONS = ("reserve", "cancel", "review")
+# SQLSTATEs of failures caused by concurrency rather than by the request itself
+SERIALIZATION_FAILURE = "40001"
+DEADLOCK_DETECTED = "40P01"
+
+
+class LoadConfig:
+    def __init__(self, workers: int = 8, operations: int = 200, mix: Dict[str, int] = None,
+                 hot_skew: float = 1.2, window_start: date = date(2030, 1, 1), window_days: int = 365,
+                 max_nights: int = 7, seed: int = 236363, customers: int = None, apartments: int = None,
+                 reuse_connections: bool = False):
+        self.workers = workers
+        # operations per worker
+        self.operations = operations
+        self.mix = mix if mix is not None else {"reserve": 70, "cancel": 10, "review": 20}
+        # zipf exponent of the apartment choice, larger means hotter hot apartments
+        self.hot_skew = hot_skew
+        # bookings are made inside [window_start, window_start + window_days), a small
+        # window means more conflicts
+        self.window_start = window_start
+        self.window_days = window_days
+        self.max_nights = max_nights
+        self.seed = seed
+        self.customers = customers
+        self.apartments = apartments
+        # see Connector.enable_connection_reuse
+        self.reuse_connections = reuse_connections
+
+
+def _max_id(table: str) -> int:
+    conn = Connector.DBConnector()
+    try:
+        _, result = conn.execute("SELECT COALESCE(MAX(id), 0) FROM " + table)
+        return result.rows[0][0]
+    finally:
+        conn.close()
+
+
+def _worker(config: LoadConfig, worker: int) -> Dict:
+    # the flag is module state, processes do not inherit it from the driver
+    Connector.enable_connection_reuse(config.reuse_connections)
+    rng = random.Random(f"{config.seed}:{worker}")
+    apartment = ZipfSampler(config.apartments, config.hot_skew, rng)
+    operations = list(config.mix.keys())
+    weights = [config.mix[op] for op in operations]
+    latencies = {op: [] for op in OPERATIONS}
+    results = {op: Counter() for op in OPERATIONS}
+    sqlstates = Counter()
+    booked = []
+
+    me = threading.get_ident()
+
+    def count_failures(trace):
+        if threading.get_ident() == me and trace.error is not None:
+            # mapped errors (DatabaseException) keep the psycopg2 error as their context
+            pgcode = getattr(trace.error, "pgcode", None) or getattr(trace.error.__context__, "pgcode", None)
+            sqlstates[pgcode or type(trace.error).__name__] += 1
+
+    retries_before = Retry.retry_metrics()
+    Connector.add_execute_hook(after=count_failures)
+    try:
+        for _ in range(config.operations):
+            op = rng.choices(operations, weights)[0]
+            if op == "cancel" and booked:
+                customer_id, apartment_id, start, end = booked.pop(rng.randrange(len(booked)))
+                call = lambda: Solution.customer_cancelled_reservation(customer_id, apartment_id, start)
+            elif op == "review" and booked:
+                customer_id, apartment_id, start, end = booked[rng.randrange(len(booked))]
+                call = lambda: Solution.customer_reviewed_apartment(customer_id, apartment_id, end,
+                                                                    rng.randint(1, 10), "load test")
+            else:
+                op = "reserve"
+                customer_id = rng.randint(1, config.customers)
+                apartment_id = apartment.sample()
+                start = config.window_start + timedelta(days=rng.randrange(config.window_days))
+                end = start + timedelta(days=rng.randint(1, config.max_nights))
+                call = lambda: Solution.customer_made_reservation(customer_id, apartment_id, start, end,
+                                                                  100.0 * (end - start).days)
+            before = time.perf_counter()
+            result = call()
+            latencies[op].append((time.perf_counter() - before) * 1000)
+            results[op][result.name] += 1
+            if op == "reserve" and result == ReturnValue.OK:
+                booked.append((customer_id, apartment_id, start, end))
+    finally:
+        Connector.remove_execute_hook(count_failures)
+        Connector.release_thread_connection()
+    # only meaningful when the worker had its process to itself, see run()
+    retries = _retry_delta(retries_before, Retry.retry_metrics())
+    return {"latencies": latencies, "results": results, "sqlstates": sqlstates, "retries": retries}
+
+
+def _retry_delta(before: Dict, after: Dict) -> Counter:
+    delta = Counter()
+    for name, counters in after.items():
+        for counter, value in counters.items():
+            delta[f"{name}.{counter}"] += value - before.get(name, {}).get(counter, 0)
+    return delta
+
+
+def overlapping_reservations() -> List[tuple]:
+    # pairs of committed stays of the same apartment whose dates intersect
+    conn = Connector.DBConnector()
+    try:
+        _, result = conn.execute("""
+            SELECT a.apartment_id, a.customer_id, a.start_date, a.end_date,
+                   b.customer_id, b.start_date, b.end_date
+            FROM Reservations a
+            JOIN Reservations b ON a.apartment_id = b.apartment_id
+                AND (a.customer_id, a.start_date) < (b.customer_id, b.start_date)
+                AND a.start_date < b.end_date AND b.start_date < a.end_date
+        """)
+        return result.rows
+    finally:
+        conn.close()
+
+
+def run(config: LoadConfig, processes: bool = False) -> Dict:
+    if config.customers is None:
+        config.customers = _max_id("Customers")
+    if config.apartments is None:
+        config.apartments = _max_id("Apartments")
+    if config.customers == 0 or config.apartments == 0:
+        raise ValueError("no customers or apartments to book, load data first (--setup)")
+
+    executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    retries_before = Retry.retry_metrics()
+    start = time.perf_counter()
+    try:
+        with executor(max_workers=config.workers) as pool:
+            reports = list(pool.map(_worker, [config] * config.workers, range(config.workers)))
+    finally:
+        # worker threads set the flag of this process, do not leave it on for the caller
+        if not processes:
+            Connector.enable_connection_reuse(False)
+            Connector.release_thread_connection()
+    elapsed = time.perf_counter() - start
+
+    summary = {"elapsed": elapsed, "operations": {}, "sqlstates": Counter()}
+    if processes:
+        summary["retries"] = sum((report["retries"] for report in reports), Counter())
+    else:
+        # threads share the retry counters of this process
+        summary["retries"] = _retry_delta(retries_before, Retry.retry_metrics())
+    total = 0
+    for op in OPERATIONS:
+        latencies = sorted(x for report in reports for x in report["latencies"][op])
+        results = sum((report["results"][op] for report in reports), Counter())
+        if not latencies:
+            continue
+        total += len(latencies)
+        summary["operations"][op] = {
+            "calls": len(latencies),
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "results": {name: count / len(latencies) for name, count in results.items()},
+        }
+    for report in reports:
+        summary["sqlstates"].update(report["sqlstates"])
+    summary["throughput"] = total / elapsed if elapsed > 0 else 0.0
+    summary["overlaps"] = overlapping_reservations()
+    return summary
+
+
+def print_summary(summary: Dict):
+    print(f"{summary['throughput']:.1f} ops/s over {summary['elapsed']:.2f}s")
+    for op, stats in summary["operations"].items():
+        rates = ", ".join(f"{name}={rate:.1%}" for name, rate in sorted(stats["results"].items()))
+        print(f"  {op:8} {stats['calls']:7} calls  p50={stats['p50']:.2f}ms p95={stats['p95']:.2f}ms "
+              f"p99={stats['p99']:.2f}ms  {rates}")
+    states = summary["sqlstates"]
+    print(f"  serialization failures: {states.get(SERIALIZATION_FAILURE, 0)}, "
+          f"deadlocks: {states.get(DEADLOCK_DETECTED, 0)}, all failed statements: {dict(states)}")
+    retries = {name: count for name, count in sorted(summary["retries"].items()) if count}
+    print(f"  retries: {retries}")
+    if summary["overlaps"]:
+        print(f"  FAILED: {len(summary['overlaps'])} overlapping reservations were committed")
+        for overlap in summary["overlaps"][:10]:
+            print("    " + str(overlap))
+    else:
+        print("  no overlapping reservations")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Concurrent load on the Solution booking path")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--operations", type=int, default=200, help="operations per worker")
+    parser.add_argument("--processes", action="store_true", help="run workers as processes, not threads")
+    parser.add_argument("--reuse-connections", action="store_true",
+                        help="keep one connection per worker thread instead of one per call")
+    parser.add_argument("--mix", nargs="+", default=["reserve=70", "cancel=10", "review=20"],
+                        metavar="OP=WEIGHT")
+    parser.add_argument("--hot-skew", type=float, default=1.2)
+    parser.add_argument("--window-days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=236363)
+    parser.add_argument("--setup", type=int, metavar="RESERVATIONS",
+                        help="recreate the tables and load a generated dataset of this size first")
+    args = parser.parse_args(argv)
+
+    mix = {}
+    for entry in args.mix:
+        op, weight = entry.split("=", 1)
+        if op not in OPERATIONS:
+            parser.error(f"unknown operation {op}, expected one of {', '.join(OPERATIONS)}")
+        mix[op] = int(weight)
+
+    if args.setup:
+        Solution.drop_tables()
+        Solution.create_tables()
+        DataGenerator(GeneratorConfig(reservations=args.setup, seed=args.seed)).load()
+
+    config = LoadConfig(workers=args.workers, operations=args.operations, mix=mix, hot_skew=args.hot_skew,
+                        window_days=args.window_days, seed=args.seed, reuse_connections=args.reuse_connections)
+    summary = run(config, args.processes)
+    print_summary(summary)
+    return 1 if summary["overlaps"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+import argparse
+import json
+import random
+import sys
+from typing import Dict, List, Tuple
+
+import Solution
+import Utility.DBConnector as Connector
+from Benchmarks.SolutionBenchmark import populate, populate_realistic, workloads
+
+# EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) of every statement the Solution functions run,
+# with the representative arguments of Benchmarks.SolutionBenchmark, and a diff against
+# the plans of a previous run: plan shape (node types, relations, indexes), estimated vs
+# actual rows and shared buffers. run from the repository root:
+#   python -m Benchmarks.PlanCapture --size 100000 --output plans.json
+#   python -m Benchmarks.PlanCapture --size 100000 --baseline plans.json
+#   python -m Benchmarks.PlanCapture --existing --only get_apartment_recommendation
+# the statements are taken with an execute hook while the function runs, then replayed in
+# the same order under EXPLAIN ANALYZE, each function in test mode and rolled back, so the
+# data is left as it was (statements run through DBConnector.stream are not seen)
+
+DEFAULT_SIZE = 10 ** 5
+# statements EXPLAIN accepts, everything else (LOCK TABLE, ...) is replayed as is
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "VALUES")
+# an estimate off by this factor or more is reported
+MISESTIMATE_FACTOR = 10.0
+# buffer growth below this many blocks is noise
+MIN_BUFFER_GROWTH = 16
+
+
+def _capture_statements(call) -> List[str]:
+    statements = []
+
+    def record(trace):
+        statements.append(trace.query)
+
+    Connector.add_execute_hook(after=record)
+    Connector.begin_test()
+    try:
+        call()
+    finally:
+        Connector.rollback_test()
+        Connector.remove_execute_hook(record)
+    return statements
+
+
+def _explain_statements(statements: List[str]) -> List[Dict]:
+    plans = []
+    conn = Connector.DBConnector()
+    Connector.begin_test()
+    try:
+        for query in statements:
+            if not query.lstrip().upper().startswith(EXPLAINABLE):
+                conn.execute(query)
+                continue
+            try:
+                _, result = conn.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query)
+                analyzed = True
+            except Exception as e:
+                # a statement that fails (a constraint violation) still has a plan, only
+                # without actual rows and buffers
+                try:
+                    _, result = conn.execute("EXPLAIN (FORMAT JSON) " + query)
+                except Exception:
+                    plans.append({"query": query, "error": str(e)})
+                    continue
+                analyzed = False
+            output = result.rows[0][0]
+            if isinstance(output, str):
+                output = json.loads(output)
+            plans.append({"query": query, "analyzed": analyzed, "plan": output[0]})
+    finally:
+        Connector.rollback_test()
+        conn.close()
+    return plans
+
+
+def capture(size: int, seed: int, only: List[str] = None, realistic: bool = False) -> Dict[str, Dict]:
+    # plans of every function of workloads() that calls Solution, against the current tables
+    plans = {}
+    calls = workloads(size, random.Random(seed), realistic)
+    Connector.start_test_mode()
+    try:
+        for name, call in calls.items():
+            if (only and name not in only) or not hasattr(Solution, name):
+                continue
+            statements = _capture_statements(lambda: call(0))
+            plans[name] = {"statements": _explain_statements(statements)}
+            print(f"  {name:32} {len(statements)} statements")
+    finally:
+        Connector.stop_test_mode()
+    return plans
+
+
+def run(size: int, seed: int, only: List[str] = None, realistic: bool = False, existing: bool = False) -> Dict:
+    conn = Connector.DBConnector()
+    try:
+        _, result = conn.execute("SHOW server_version")
+        version = result.rows[0][0]
+    finally:
+        conn.close()
+    if not existing:
+        print(f"populating {size} reservations...")
+        Solution.drop_tables()
+        Solution.create_tables()
+        if realistic:
+            populate_realistic(size, seed)
+        else:
+            populate(size)
+    try:
+        functions = capture(size, seed, only, realistic)
+    finally:
+        if not existing:
+            Solution.drop_tables()
+    return {"server_version": version, "size": size, "functions": functions}
+
+
+def plan_nodes(plan: Dict, depth: int = 0) -> List[Tuple[int, Dict]]:
+    # the nodes of a plan tree in pre-order, with their depth
+    nodes = [(depth, plan)]
+    for child in plan.get("Plans", []):
+        nodes += plan_nodes(child, depth + 1)
+    return nodes
+
+
+def node_label(node: Dict) -> str:
+    label = node["Node Type"]
+    if "Relation Name" in node:
+        label += " on " + node["Relation Name"]
+    if "Index Name" in node:
+        label += " using " + node["Index Name"]
+    return label
+
+
+def plan_shape(plan: Dict) -> List[str]:
+    return ["  " * depth + node_label(node) for depth, node in plan_nodes(plan["Plan"])]
+
+
+def misestimate(node: Dict) -> float:
+    # how far the planner's row estimate was off, per loop, as a factor >= 1
+    if "Actual Rows" not in node:
+        return 1.0
+    estimated = max(node["Plan Rows"], 1)
+    actual = max(node["Actual Rows"], 1)
+    return max(estimated, actual) / min(estimated, actual)
+
+
+def buffers(plan: Dict) -> int:
+    # shared blocks the statement touched (hit or read), the root counts its whole tree
+    root = plan["Plan"]
+    return root.get("Shared Hit Blocks", 0) + root.get("Shared Read Blocks", 0)
+
+
+def diff(results: Dict, baseline: Dict, tolerance: float) -> Tuple[List[str], List[str]]:
+    # (regressions, notes): changed plan shapes and buffer growth beyond tolerance
+    # (0.2 = 20%) are regressions, misestimates that got worse are notes
+    regressions, notes = [], []
+    if results.get("server_version") != baseline.get("server_version"):
+        notes.append(f"server version {baseline.get('server_version')} -> {results.get('server_version')}")
+    for name, function in results["functions"].items():
+        old_function = baseline["functions"].get(name)
+        if old_function is None:
+            continue
+        old_statements = old_function["statements"]
+        if len(old_statements) != len(function["statements"]):
+            notes.append(f"{name}: {len(old_statements)} statements -> {len(function['statements'])}")
+            continue
+        for i, (old, new) in enumerate(zip(old_statements, function["statements"])):
+            where = f"{name}[{i}]"
+            if "plan" not in old or "plan" not in new:
+                if "plan" in old:
+                    regressions.append(f"{where}: EXPLAIN failed: {new['error']}")
+                continue
+            old_shape, new_shape = plan_shape(old["plan"]), plan_shape(new["plan"])
+            if old_shape != new_shape:
+                regressions.append(f"{where}: plan changed\n    was:\n      " + "\n      ".join(old_shape)
+                                   + "\n    now:\n      " + "\n      ".join(new_shape))
+            else:
+                old_nodes = [node for _, node in plan_nodes(old["plan"]["Plan"])]
+                new_nodes = [node for _, node in plan_nodes(new["plan"]["Plan"])]
+                for old_node, new_node in zip(old_nodes, new_nodes):
+                    factor = misestimate(new_node)
+                    if factor >= MISESTIMATE_FACTOR and factor > 2 * misestimate(old_node):
+                        notes.append(f"{where}: {node_label(new_node)} estimated {new_node['Plan Rows']} rows, "
+                                     f"actual {new_node.get('Actual Rows')} (was {old_node['Plan Rows']} / "
+                                     f"{old_node.get('Actual Rows')})")
+            old_buffers, new_buffers = buffers(old["plan"]), buffers(new["plan"])
+            if new_buffers - old_buffers >= MIN_BUFFER_GROWTH and new_buffers > old_buffers * (1 + tolerance):
+                regressions.append(f"{where}: shared buffers {old_buffers} -> {new_buffers}")
+    return regressions, notes
+
+
+def print_report(results: Dict):
+    for name, function in results["functions"].items():
+        for i, statement in enumerate(function["statements"]):
+            if "plan" not in statement:
+                print(f"{name}[{i}]: EXPLAIN failed: {statement['error']}")
+                continue
+            plan = statement["plan"]
+            worst = max(plan_nodes(plan["Plan"]), key=lambda entry: misestimate(entry[1]))[1]
+            print(f"{name}[{i}]: {plan.get('Execution Time', 0):.2f}ms, {buffers(plan)} buffers, "
+                  f"worst estimate x{misestimate(worst):.1f} ({node_label(worst)})")
+            for line in plan_shape(plan):
+                print("    " + line)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Capture and compare the query plans of the Solution API")
+    parser.add_argument("--size", type=int, default=DEFAULT_SIZE)
+    parser.add_argument("--seed", type=int, default=236363)
+    parser.add_argument("--only", nargs="+", help="capture only these functions")
+    parser.add_argument("--realistic", action="store_true",
+                        help="load power-law data from Benchmarks.DataGenerator instead of uniform data")
+    parser.add_argument("--existing", action="store_true",
+                        help="explain against the data already in the database (--size still shapes the arguments)")
+    parser.add_argument("--output", default="plans.json")
+    parser.add_argument("--baseline", help="JSON plans of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    results = run(args.size, args.seed, args.only, args.realistic, args.existing)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2, default=str)
+    print(f"plans written to {args.output}")
+    print_report(results)
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as f:
+        regressions, notes = diff(results, json.load(f), args.tolerance)
+    for note in notes:
+        print("NOTE: " + note)
+    for regression in regressions:
+        print("REGRESSION: " + regression)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
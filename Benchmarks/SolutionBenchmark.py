@@ -0,0 +1,267 @@
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import date, timedelta
+from typing import Callable, Dict, List
+
+import Solution
+import Utility.DBConnector as Connector
+from Benchmarks.DataGenerator import DataGenerator, GeneratorConfig, DEFAULT_LOCATIONS
+from Business.Owner import Owner
+from Business.Customer import Customer
+from Business.Apartment import Apartment
+
+# benchmark every Solution function against datasets of growing size.
+# run from the repository root:
+#   python -m Benchmarks.SolutionBenchmark --sizes 1000 100000 --output bench.json
+#   python -m Benchmarks.SolutionBenchmark --sizes 1000 --baseline bench.json
+# results are stored as JSON: {size: {function: {calls, throughput, p50, p95, p99}}},
+# latencies in milliseconds, throughput in calls per second
+
+DEFAULT_SIZES = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7]
+BASE_DATE = date(2000, 1, 1)
+# ids used by the CRUD benchmarks, far above anything populate() creates
+FRESH_ID = 10 ** 9
+# p95 latency (ms) a function must stay under at every size
+LATENCY_BUDGETS = {"find_available_apartments": 10.0}
+
+
+def dataset_shape(size: int) -> Dict[str, int]:
+    apartments = max(10, size // 100)
+    return {"reservations": size,
+            "apartments": apartments,
+            "customers": max(10, size // 20),
+            "owners": max(2, apartments // 5)}
+
+
+def populate_realistic(size: int, seed: int):
+    # same table sizes as populate, but skewed data from the synthetic generator
+    shape = dataset_shape(size)
+    config = GeneratorConfig(reservations=size, customers=shape["customers"], apartments=shape["apartments"],
+                             owners=shape["owners"], seed=seed)
+    DataGenerator(config).load()
+
+
+def populate(size: int):
+    # fills the (empty) tables with size reservations and up to size reviews,
+    # generated server side so even 10^7 rows never pass through python.
+    # reservations of an apartment are weekly slots, so they never overlap.
+    # the customer permutation is computed in bigint, i * 7919 leaves int4 past 271k rows
+    shape = dataset_shape(size)
+    queries = [
+        ("INSERT INTO Owners SELECT i, 'owner ' || i FROM generate_series(1, %(owners)s) i", shape),
+        ("INSERT INTO Customers SELECT i, 'customer ' || i FROM generate_series(1, %(customers)s) i", shape),
+        ("""INSERT INTO Apartments
+            SELECT i, 'street ' || i, 'city ' || (i %% 50), 'country ' || (i %% 5), 30 + i %% 120
+            FROM generate_series(1, %(apartments)s) i""", shape),
+        ("""INSERT INTO OwnsApartment
+            SELECT 1 + (i %% %(owners)s), i FROM generate_series(1, %(apartments)s) i""", shape),
+        ("""INSERT INTO Reservations
+            SELECT 1 + (i::bigint * 7919) %% %(customers)s,
+                   1 + (i - 1) %% %(apartments)s,
+                   %(base)s + ((i - 1) / %(apartments)s) * 7,
+                   %(base)s + ((i - 1) / %(apartments)s) * 7 + 1 + i %% 6,
+                   100 + (i %% 50) * 10
+            FROM generate_series(1, %(reservations)s) i""", dict(shape, base=BASE_DATE)),
+        ("""INSERT INTO Reviews
+            SELECT DISTINCT ON (customer_id, apartment_id)
+                   customer_id, apartment_id, end_date + 1, 1 + (customer_id + apartment_id) % 10, 'review'
+            FROM Reservations
+            ORDER BY customer_id, apartment_id, end_date""", None),
+        ("ANALYZE", None),
+    ]
+    conn = Connector.DBConnector()
+    try:
+        for query, params in queries:
+            conn.execute(query, params=params)
+    finally:
+        conn.close()
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(call: Callable[[int], object], iterations: int) -> Dict[str, float]:
+    latencies = []
+    start = time.perf_counter()
+    for i in range(iterations):
+        before = time.perf_counter()
+        call(i)
+        latencies.append((time.perf_counter() - before) * 1000)
+    total = time.perf_counter() - start
+    latencies.sort()
+    return {"calls": iterations,
+            "throughput": iterations / total if total > 0 else 0.0,
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99)}
+
+
+def workloads(size: int, rng: random.Random, realistic: bool = False) -> Dict[str, Callable[[int], object]]:
+    # every function is called with arguments that hit existing rows, except the
+    # writes which use fresh ids (and clean up after themselves in pairs)
+    shape = dataset_shape(size)
+
+    def any_owner():
+        return rng.randint(1, shape["owners"])
+
+    def any_customer():
+        return rng.randint(1, shape["customers"])
+
+    def any_apartment():
+        return rng.randint(1, shape["apartments"])
+
+    def far_future(i):
+        return date(3000, 1, 1) + timedelta(days=7 * i)
+
+    def any_location():
+        if realistic:
+            return DEFAULT_LOCATIONS[rng.randrange(len(DEFAULT_LOCATIONS))]
+        k = rng.randrange(50)
+        return "city " + str(k), "country " + str(k % 5)
+
+    snapshot = []
+
+    def snapshot_profit_per_month(i):
+        # one report from a snapshot loaded once, compare with profit_per_month
+        if not snapshot:
+            from Analytics.Revenue import RevenueSnapshot
+            snapshot.append(RevenueSnapshot.load())
+        return snapshot[0].profit_per_month(2000 + i % 20)
+
+    def find_available(i):
+        # a few nights somewhere in the booked period of the dataset
+        city, country = any_location()
+        first = GeneratorConfig().first_date if realistic else BASE_DATE
+        start = first + timedelta(days=rng.randrange(7 * max(1, size // shape["apartments"])))
+        return Solution.find_available_apartments(city, country, start, start + timedelta(days=rng.randint(1, 7)),
+                                                  min_size=rng.choice([None, 50, 100]), limit=20)
+
+    return {
+        "add_owner": lambda i: Solution.add_owner(Owner(FRESH_ID + i, "bench")),
+        "get_owner": lambda i: Solution.get_owner(any_owner()),
+        "delete_owner": lambda i: Solution.delete_owner(FRESH_ID + i),
+        "add_customer": lambda i: Solution.add_customer(Customer(FRESH_ID + i, "bench")),
+        "get_customer": lambda i: Solution.get_customer(any_customer()),
+        "delete_customer": lambda i: Solution.delete_customer(FRESH_ID + i),
+        "add_apartment": lambda i: Solution.add_apartment(
+            Apartment(FRESH_ID + i, "bench " + str(i), "bench", "bench", 50)),
+        "get_apartment": lambda i: Solution.get_apartment(any_apartment()),
+        "delete_apartment": lambda i: Solution.delete_apartment(FRESH_ID + i),
+        "customer_made_reservation": lambda i: Solution.customer_made_reservation(
+            1, 1 + i % shape["apartments"], far_future(i), far_future(i) + timedelta(days=3), 300),
+        "customer_cancelled_reservation": lambda i: Solution.customer_cancelled_reservation(
+            1, 1 + i % shape["apartments"], far_future(i)),
+        "owner_owns_apartment": lambda i: Solution.owner_owns_apartment(any_owner(), any_apartment()),
+        "get_apartment_owner": lambda i: Solution.get_apartment_owner(any_apartment()),
+        "get_owner_apartments": lambda i: Solution.get_owner_apartments(any_owner()),
+        "get_apartment_rating": lambda i: Solution.get_apartment_rating(any_apartment()),
+        "get_owner_rating": lambda i: Solution.get_owner_rating(any_owner()),
+        "get_top_customer": lambda i: Solution.get_top_customer(),
+        "reservations_per_owner": lambda i: Solution.reservations_per_owner(),
+        "get_all_location_owners": lambda i: Solution.get_all_location_owners(),
+        "best_value_for_money": lambda i: Solution.best_value_for_money(),
+        "profit_per_month": lambda i: Solution.profit_per_month(2000 + i % 20),
+        "get_apartment_recommendation": lambda i: Solution.get_apartment_recommendation(any_customer()),
+        "find_available_apartments": find_available,
+        "snapshot_profit_per_month": snapshot_profit_per_month,
+    }
+
+
+# full-table aggregates are far slower than point lookups, so they get fewer calls
+HEAVY = {"get_top_customer", "reservations_per_owner", "get_all_location_owners",
+         "best_value_for_money", "profit_per_month", "get_apartment_recommendation"}
+
+
+def run(sizes: List[int], iterations: int, seed: int, only: List[str] = None,
+        realistic: bool = False) -> Dict[str, Dict]:
+    results = {}
+    for size in sizes:
+        print(f"populating {size} reservations...")
+        Solution.drop_tables()
+        Solution.create_tables()
+        if realistic:
+            populate_realistic(size, seed)
+        else:
+            populate(size)
+        rng = random.Random(seed)
+        results[str(size)] = {}
+        # the calls reuse one connection, like a long running worker, so the latencies
+        # (and LATENCY_BUDGETS) measure the queries rather than connection setup
+        Connector.enable_connection_reuse()
+        try:
+            for name, call in workloads(size, rng, realistic).items():
+                if only and name not in only:
+                    continue
+                calls = max(1, iterations // 10) if name in HEAVY else iterations
+                results[str(size)][name] = measure(call, calls)
+                stats = results[str(size)][name]
+                print(f"  {name:32} {stats['throughput']:10.1f}/s  p50={stats['p50']:.2f}ms "
+                      f"p95={stats['p95']:.2f}ms p99={stats['p99']:.2f}ms")
+        finally:
+            Connector.enable_connection_reuse(False)
+            Connector.release_thread_connection()
+    Solution.drop_tables()
+    return results
+
+
+def over_budget(results: Dict[str, Dict]) -> List[str]:
+    failures = []
+    for size, functions in results.items():
+        for name, budget in LATENCY_BUDGETS.items():
+            if name in functions and functions[name]["p95"] > budget:
+                failures.append(f"{name} @ {size}: p95 {functions[name]['p95']:.2f}ms > {budget:.2f}ms")
+    return failures
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    # a function regressed if its p95 grew by more than tolerance (0.2 = 20%)
+    regressions = []
+    for size, functions in results.items():
+        for name, stats in functions.items():
+            old = baseline.get(size, {}).get(name)
+            if old is None or old["p95"] <= 0:
+                continue
+            if stats["p95"] > old["p95"] * (1 + tolerance):
+                regressions.append(f"{name} @ {size}: p95 {old['p95']:.2f}ms -> {stats['p95']:.2f}ms")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the Solution API")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=236363)
+    parser.add_argument("--only", nargs="+", help="benchmark only these functions")
+    parser.add_argument("--realistic", action="store_true",
+                        help="load power-law data from Benchmarks.DataGenerator instead of uniform data")
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.iterations, args.seed, args.only, args.realistic)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {args.output}")
+
+    failures = over_budget(results)
+    for failure in failures:
+        print("OVER BUDGET: " + failure)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION: " + regression)
+        failures += regressions
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -26,20 +26,27 @@ class TestCRUD(unittest.TestCase):
 
     @classmethod
     def setUpClass(cls):
+        # all tests share one connection whose transaction is rolled back at the end,
+        # the embedded backend (SOLUTION_BACKEND=embedded) only has to be emptied after each test
+        if BACKEND == "postgres":
+            Connector.start_test_mode()
         create_tables()
 
     def setUp(self):
         # This method will be called before each test
         # Set up your test environment
-        # create_tables()
-        pass
+        if BACKEND == "postgres":
+            Connector.begin_test()
 
     def tearDown(self):
         # This method will be called after each test
         # Clean up your test environment
         # print("Tables after test:")
         # print_all_tables()
-        clear_tables()
+        if BACKEND == "postgres":
+            Connector.rollback_test()
+        else:
+            clear_tables()
         
     def test_owner(self):
         print("Running Test: test_owner...")
@@ -670,7 +677,8 @@ class TestCRUD(unittest.TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        drop_tables()
+        if BACKEND == "postgres":
+            Connector.stop_test_mode()
 
 
 if __name__ == "__main__":
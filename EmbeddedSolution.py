@@ -0,0 +1,633 @@
+import csv
+import functools
+import os
+import threading
+from datetime import date
+from typing import Dict, Iterator, List, Tuple
+
+from Utility.ReturnValue import ReturnValue
+from Utility.AvailabilityIndex import AvailabilityIndex
+
+from Business.Owner import Owner
+from Business.Customer import Customer
+from Business.Apartment import Apartment
+
+# the Solution API kept in memory, without a database server: for edge nodes and fast
+# tests. selected with SOLUTION_BACKEND=embedded (see the end of Solution.py). every
+# function returns what its Postgres version returns, the constraint checks happen in the
+# order Postgres meets them (NOT NULL, CHECK, UNIQUE, then FOREIGN KEY) and the ratings
+# and recommendations follow the same SQL math. differences: results Postgres returns in
+# no particular order come sorted by id here, ratings are floats instead of Decimals, and
+# the tables always exist (drop_tables empties them). test_EmbeddedBackend.py runs
+# BigTest.py against both backends and compares every result.
+
+__all__ = [
+    "create_tables", "clear_tables", "drop_tables",
+    "add_owner", "get_owner", "delete_owner", "add_apartment", "get_apartment", "delete_apartment",
+    "add_customer", "get_customer", "delete_customer",
+    "customer_made_reservation", "customer_cancelled_reservation",
+    "customer_reviewed_apartment", "customer_updated_review",
+    "owner_owns_apartment", "owner_drops_apartment", "get_apartment_owner", "get_owner_apartments",
+    "get_apartment_rating", "get_owner_rating", "get_apartment_ratings", "get_owner_ratings", "all_owner_ratings",
+    "get_top_customer", "reservations_per_owner", "get_all_location_owners", "print_all_tables",
+    "best_value_for_money", "profit_per_month", "occupancy_report",
+    "get_apartment_recommendation", "get_all_apartment_recommendations", "find_available_apartments",
+    "import_reservations", "import_reviews", "delete_owners", "delete_customers", "delete_apartments",
+    "export_table", "export_query",
+    "enable_availability_index", "disable_availability_index", "get_availability_index",
+    "enable_change_feed", "disable_change_feed",
+]
+
+
+class _Tables:
+    def __init__(self):
+        # id -> name
+        self.owners: Dict[int, str] = {}
+        self.customers: Dict[int, str] = {}
+        # id -> (address, city, country, size)
+        self.apartments: Dict[int, tuple] = {}
+        # (address, city, country) of every apartment, the UNIQUE constraint
+        self.addresses = set()
+        # (customer_id, apartment_id, start_date) -> (end_date, total_price)
+        self.reservations: Dict[tuple, tuple] = {}
+        # the stays of every apartment, for the overlap checks
+        self.calendars = AvailabilityIndex()
+        # (customer_id, apartment_id) -> (review_date, rating, review_text)
+        self.reviews: Dict[tuple, tuple] = {}
+        # apartment_id -> {customer_id: rating} and customer_id -> {apartment_id: rating}
+        self.apartment_ratings: Dict[int, Dict[int, int]] = {}
+        self.customer_ratings: Dict[int, Dict[int, int]] = {}
+        # apartment_id -> owner_id
+        self.owns: Dict[int, int] = {}
+
+
+_tables = _Tables()
+# one lock for everything: every function sees and leaves the tables consistent
+_lock = threading.RLock()
+_index_enabled = False
+
+
+def _synchronized(function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with _lock:
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def _positive(*values) -> bool:
+    try:
+        return all(value is not None and value > 0 for value in values)
+    except TypeError:
+        return False
+
+
+def _to_apartment(apartment_id: int) -> Apartment:
+    address, city, country, size = _tables.apartments[apartment_id]
+    return Apartment(id=apartment_id, address=address, city=city, country=country, size=size)
+
+
+def _set_review(customer_id: int, apartment_id: int, review_date: date, rating: int, text: str):
+    _tables.reviews[(customer_id, apartment_id)] = (review_date, rating, text)
+    _tables.apartment_ratings.setdefault(apartment_id, {})[customer_id] = rating
+    _tables.customer_ratings.setdefault(customer_id, {})[apartment_id] = rating
+
+
+def _remove_reviews(keys: List[tuple]):
+    for customer_id, apartment_id in keys:
+        del _tables.reviews[(customer_id, apartment_id)]
+        del _tables.apartment_ratings[apartment_id][customer_id]
+        del _tables.customer_ratings[customer_id][apartment_id]
+
+
+# ---------------------------------- CRUD API: ----------------------------------
+
+@_synchronized
+def create_tables():
+    return ReturnValue.OK
+
+
+@_synchronized
+def clear_tables():
+    global _tables
+    _tables = _Tables()
+
+
+@_synchronized
+def drop_tables():
+    clear_tables()
+
+
+@_synchronized
+def add_owner(owner: Owner) -> ReturnValue:
+    if not _positive(owner.get_owner_id()) or owner.get_owner_name() is None:
+        return ReturnValue.BAD_PARAMS
+    if owner.get_owner_id() in _tables.owners:
+        return ReturnValue.ALREADY_EXISTS
+    _tables.owners[owner.get_owner_id()] = owner.get_owner_name()
+    return ReturnValue.OK
+
+
+@_synchronized
+def get_owner(owner_id: int) -> Owner:
+    if owner_id not in _tables.owners:
+        return Owner.bad_owner()
+    return Owner(owner_id=owner_id, owner_name=_tables.owners[owner_id])
+
+
+def _delete_owner(owner_id: int) -> ReturnValue:
+    if not _positive(owner_id):
+        return ReturnValue.BAD_PARAMS
+    if owner_id not in _tables.owners:
+        return ReturnValue.NOT_EXISTS
+    del _tables.owners[owner_id]
+    for apartment_id in [a for a, o in _tables.owns.items() if o == owner_id]:
+        del _tables.owns[apartment_id]
+    return ReturnValue.OK
+
+
+@_synchronized
+def delete_owner(owner_id: int) -> ReturnValue:
+    return _delete_owner(owner_id)
+
+
+@_synchronized
+def add_apartment(apartment: Apartment) -> ReturnValue:
+    values = (apartment.get_id(), apartment.get_address(), apartment.get_city(),
+              apartment.get_country(), apartment.get_size())
+    if any(value is None for value in values) or not _positive(apartment.get_id(), apartment.get_size()):
+        return ReturnValue.BAD_PARAMS
+    address = values[1:4]
+    if apartment.get_id() in _tables.apartments or address in _tables.addresses:
+        return ReturnValue.ALREADY_EXISTS
+    _tables.apartments[apartment.get_id()] = values[1:]
+    _tables.addresses.add(address)
+    return ReturnValue.OK
+
+
+@_synchronized
+def get_apartment(apartment_id: int) -> Apartment:
+    if apartment_id not in _tables.apartments:
+        return Apartment.bad_apartment()
+    return _to_apartment(apartment_id)
+
+
+def _delete_apartment(apartment_id: int) -> ReturnValue:
+    if not _positive(apartment_id):
+        return ReturnValue.BAD_PARAMS
+    if apartment_id not in _tables.apartments:
+        return ReturnValue.NOT_EXISTS
+    _tables.addresses.discard(_tables.apartments.pop(apartment_id)[:3])
+    for customer_id, start, _ in _tables.calendars.reservations(apartment_id):
+        del _tables.reservations[(customer_id, apartment_id, start)]
+    _tables.calendars.remove_apartment(apartment_id)
+    _remove_reviews([(customer_id, apartment_id) for customer_id in _tables.apartment_ratings.get(apartment_id, {})])
+    _tables.owns.pop(apartment_id, None)
+    return ReturnValue.OK
+
+
+@_synchronized
+def delete_apartment(apartment_id: int) -> ReturnValue:
+    return _delete_apartment(apartment_id)
+
+
+@_synchronized
+def add_customer(customer: Customer) -> ReturnValue:
+    if not _positive(customer.get_customer_id()) or customer.get_customer_name() is None:
+        return ReturnValue.BAD_PARAMS
+    if customer.get_customer_id() in _tables.customers:
+        return ReturnValue.ALREADY_EXISTS
+    _tables.customers[customer.get_customer_id()] = customer.get_customer_name()
+    return ReturnValue.OK
+
+
+@_synchronized
+def get_customer(customer_id: int) -> Customer:
+    if customer_id not in _tables.customers:
+        return Customer.bad_customer()
+    return Customer(customer_id=customer_id, customer_name=_tables.customers[customer_id])
+
+
+def _delete_customer(customer_id: int) -> ReturnValue:
+    if not _positive(customer_id):
+        return ReturnValue.BAD_PARAMS
+    if customer_id not in _tables.customers:
+        return ReturnValue.NOT_EXISTS
+    del _tables.customers[customer_id]
+    for key in [key for key in _tables.reservations if key[0] == customer_id]:
+        del _tables.reservations[key]
+    _tables.calendars.remove_customer(customer_id)
+    _remove_reviews([(customer_id, apartment_id) for apartment_id in _tables.customer_ratings.get(customer_id, {})])
+    return ReturnValue.OK
+
+
+@_synchronized
+def delete_customer(customer_id: int) -> ReturnValue:
+    return _delete_customer(customer_id)
+
+
+@_synchronized
+def customer_made_reservation(customer_id: int, apartment_id: int, start_date: date, end_date: date,
+                              total_price: float) -> ReturnValue:
+    # an overlapping stay, a NULL or a failed CHECK all make it BAD_PARAMS, whichever comes first
+    if any(value is None for value in (customer_id, apartment_id, start_date, end_date, total_price)):
+        return ReturnValue.BAD_PARAMS
+    if not _positive(customer_id, apartment_id, total_price) or start_date >= end_date:
+        return ReturnValue.BAD_PARAMS
+    if not _tables.calendars.is_available(apartment_id, start_date, end_date):
+        return ReturnValue.BAD_PARAMS
+    if customer_id not in _tables.customers or apartment_id not in _tables.apartments:
+        return ReturnValue.NOT_EXISTS
+    _tables.reservations[(customer_id, apartment_id, start_date)] = (end_date, total_price)
+    _tables.calendars.add(customer_id, apartment_id, start_date, end_date)
+    return ReturnValue.OK
+
+
+@_synchronized
+def customer_cancelled_reservation(customer_id: int, apartment_id: int, start_date: date) -> ReturnValue:
+    if not _positive(customer_id, apartment_id) or start_date is None:
+        return ReturnValue.BAD_PARAMS
+    if _tables.reservations.pop((customer_id, apartment_id, start_date), None) is None:
+        return ReturnValue.NOT_EXISTS
+    _tables.calendars.remove(customer_id, apartment_id, start_date)
+    return ReturnValue.OK
+
+
+def _valid_review(customer_id, apartment_id, review_date, rating, text) -> bool:
+    return (_positive(customer_id, apartment_id) and review_date is not None and rating is not None
+            and 1 <= rating <= 10 and text is not None and len(text) > 0)
+
+
+@_synchronized
+def customer_reviewed_apartment(customer_id: int, apartment_id: int, review_date: date, rating: int,
+                                review_text: str) -> ReturnValue:
+    if not _valid_review(customer_id, apartment_id, review_date, rating, review_text):
+        return ReturnValue.BAD_PARAMS
+    if not any(customer == customer_id and end <= review_date
+               for customer, _, end in _tables.calendars.reservations(apartment_id)):
+        return ReturnValue.NOT_EXISTS
+    if (customer_id, apartment_id) in _tables.reviews:
+        return ReturnValue.ALREADY_EXISTS
+    _set_review(customer_id, apartment_id, review_date, rating, review_text)
+    return ReturnValue.OK
+
+
+@_synchronized
+def customer_updated_review(customer_id: int, apartment_id: int, update_date: date, new_rating: int,
+                            new_text: str) -> ReturnValue:
+    if not _valid_review(customer_id, apartment_id, update_date, new_rating, new_text):
+        return ReturnValue.BAD_PARAMS
+    review = _tables.reviews.get((customer_id, apartment_id))
+    if review is None or review[0] > update_date:
+        return ReturnValue.NOT_EXISTS
+    _set_review(customer_id, apartment_id, update_date, new_rating, new_text)
+    return ReturnValue.OK
+
+
+@_synchronized
+def owner_owns_apartment(owner_id: int, apartment_id: int) -> ReturnValue:
+    if not _positive(owner_id, apartment_id):
+        return ReturnValue.BAD_PARAMS
+    if apartment_id in _tables.owns:
+        return ReturnValue.ALREADY_EXISTS
+    if owner_id not in _tables.owners or apartment_id not in _tables.apartments:
+        return ReturnValue.NOT_EXISTS
+    _tables.owns[apartment_id] = owner_id
+    return ReturnValue.OK
+
+
+@_synchronized
+def owner_drops_apartment(owner_id: int, apartment_id: int) -> ReturnValue:
+    if not _positive(owner_id, apartment_id):
+        return ReturnValue.BAD_PARAMS
+    if _tables.owns.get(apartment_id) != owner_id:
+        return ReturnValue.NOT_EXISTS
+    del _tables.owns[apartment_id]
+    return ReturnValue.OK
+
+
+@_synchronized
+def get_apartment_owner(apartment_id: int) -> Owner:
+    owner_id = _tables.owns.get(apartment_id)
+    if owner_id is None:
+        return Owner.bad_owner()
+    return Owner(owner_id=owner_id, owner_name=_tables.owners[owner_id])
+
+
+def _owned(owner_id: int) -> List[int]:
+    return sorted(apartment_id for apartment_id, owner in _tables.owns.items() if owner == owner_id)
+
+
+@_synchronized
+def get_owner_apartments(owner_id: int) -> List[Apartment]:
+    return [_to_apartment(apartment_id) for apartment_id in _owned(owner_id)]
+
+
+# ---------------------------------- BASIC API: ----------------------------------
+
+def _apartment_rating(apartment_id: int) -> float:
+    ratings = _tables.apartment_ratings.get(apartment_id)
+    if not ratings:
+        return 0.0
+    return sum(ratings.values()) / len(ratings)
+
+
+@_synchronized
+def get_apartment_rating(apartment_id: int) -> float:
+    return _apartment_rating(apartment_id)
+
+
+@_synchronized
+def get_owner_rating(owner_id: int) -> float:
+    # unrated apartments count as 0, like OwnerRating
+    apartments = _owned(owner_id)
+    if not apartments:
+        return 0.0
+    return sum(_apartment_rating(apartment_id) for apartment_id in apartments) / len(apartments)
+
+
+@_synchronized
+def get_apartment_ratings(apartment_ids: List[int]) -> Dict[int, float]:
+    return {apartment_id: _apartment_rating(apartment_id) for apartment_id in apartment_ids}
+
+
+@_synchronized
+def get_owner_ratings(owner_ids: List[int]) -> Dict[int, float]:
+    return {owner_id: get_owner_rating(owner_id) for owner_id in owner_ids}
+
+
+def all_owner_ratings(chunk_size: int = 10000) -> Iterator[Tuple[int, float]]:
+    with _lock:
+        ratings = [(owner_id, get_owner_rating(owner_id)) for owner_id in sorted(_tables.owners)]
+    yield from ratings
+
+@_synchronized
+def get_top_customer() -> Customer:
+    counts = {}
+    for customer_id, _, _ in _tables.reservations:
+        counts[customer_id] = counts.get(customer_id, 0) + 1
+    if not counts:
+        return Customer.bad_customer()
+    customer_id = min(counts, key=lambda id: (-counts[id], id))
+    return Customer(customer_id=customer_id, customer_name=_tables.customers[customer_id])
+
+
+@_synchronized
+def reservations_per_owner() -> List[Tuple[str, int]]:
+    per_apartment = {}
+    for _, apartment_id, _ in _tables.reservations:
+        per_apartment[apartment_id] = per_apartment.get(apartment_id, 0) + 1
+    per_owner = {owner_id: 0 for owner_id in _tables.owners}
+    for apartment_id, owner_id in _tables.owns.items():
+        per_owner[owner_id] += per_apartment.get(apartment_id, 0)
+    return [(_tables.owners[owner_id], count) for owner_id, count in sorted(per_owner.items())]
+
+
+# ---------------------------------- ADVANCED API: ----------------------------------
+
+@_synchronized
+def get_all_location_owners() -> List[Owner]:
+    locations = {(city, country) for _, city, country, _ in _tables.apartments.values()}
+    owned = {owner_id: set() for owner_id in _tables.owners}
+    for apartment_id, owner_id in _tables.owns.items():
+        _, city, country, _ = _tables.apartments[apartment_id]
+        owned[owner_id].add((city, country))
+    # an owner without apartments is one (NULL, NULL) row in OwnersAndApartments,
+    # which COUNT(DISTINCT (city, country)) counts as one location
+    return [Owner(owner_id=owner_id, owner_name=_tables.owners[owner_id])
+            for owner_id, owner_locations in sorted(owned.items())
+            if max(len(owner_locations), 1) == len(locations)]
+
+
+@_synchronized
+def print_all_tables():
+    for name in ("owners", "customers", "apartments", "reservations", "owns", "reviews"):
+        print(f"Table: {name}")
+        print(sorted(getattr(_tables, name).items()))
+        print("\n")
+
+
+@_synchronized
+def best_value_for_money() -> Apartment:
+    prices = {}
+    for (_, apartment_id, start), (end, price) in _tables.reservations.items():
+        prices.setdefault(apartment_id, []).append(price / (end - start).days)
+    best, best_value = None, None
+    for apartment_id in sorted(prices):
+        if not _tables.apartment_ratings.get(apartment_id):
+            continue
+        per_night = prices[apartment_id]
+        value = _apartment_rating(apartment_id) / (sum(per_night) / len(per_night))
+        if best_value is None or value > best_value:
+            best, best_value = apartment_id, value
+    if best is None:
+        return Apartment.bad_apartment()
+    return _to_apartment(best)
+
+
+@_synchronized
+def profit_per_month(year: int) -> List[Tuple[int, float]]:
+    profits = [0.0] * 12
+    for (_, _, _), (end, price) in _tables.reservations.items():
+        if end.year == year:
+            profits[end.month - 1] += price
+    return [(month + 1, profit * 0.15) for month, profit in enumerate(profits)]
+
+
+@_synchronized
+def occupancy_report(year: int):
+    from Analytics.Occupancy import build_occupancy_report, empty_report
+    first, last = date(year, 1, 1), date(year + 1, 1, 1)
+    apartments = [(apartment_id, city, country, _tables.owns.get(apartment_id, 0))
+                  for apartment_id, (_, city, country, _) in sorted(_tables.apartments.items())]
+    stays = [(apartment_id, (max(start, first) - first).days, (min(end, last) - first).days)
+             for (_, apartment_id, start), (end, _) in _tables.reservations.items()
+             if start < last and end > first]
+    try:
+        return build_occupancy_report(year, apartments, [stays] if stays else [])
+    except Exception as e:
+        print(e)
+        return empty_report(year)
+
+
+@_synchronized
+def get_apartment_recommendation(customer_id: int, limit: int = None,
+                                 min_score: float = None) -> List[Tuple[Apartment, float]]:
+    if limit is not None and limit <= 0:
+        return []
+    mine = _tables.customer_ratings.get(customer_id, {})
+    # how the customer rates compared to every other customer who reviewed the same apartments
+    ratios = {}
+    for apartment_id, rating in mine.items():
+        for other, other_rating in _tables.apartment_ratings[apartment_id].items():
+            if other != customer_id:
+                ratios.setdefault(other, []).append(rating / other_rating)
+    predictions = {}
+    for other, other_ratios in ratios.items():
+        ratio = sum(other_ratios) / len(other_ratios)
+        for apartment_id, rating in _tables.customer_ratings[other].items():
+            if apartment_id not in mine:
+                predictions.setdefault(apartment_id, []).append(max(1, min(10, ratio * rating)))
+    scores = [(apartment_id, sum(values) / len(values)) for apartment_id, values in sorted(predictions.items())]
+    if min_score is not None:
+        scores = [(apartment_id, score) for apartment_id, score in scores if score >= min_score]
+    if limit is not None or min_score is not None:
+        scores.sort(key=lambda item: (-item[1], item[0]))
+    if limit is not None:
+        scores = scores[:limit]
+    return [(_to_apartment(apartment_id), score) for apartment_id, score in scores]
+
+
+
+@_synchronized
+def get_all_apartment_recommendations() -> Dict[int, List[Tuple[Apartment, float]]]:
+    recommendations = {}
+    for customer_id in sorted(_tables.customer_ratings):
+        apartments = get_apartment_recommendation(customer_id)
+        if apartments:
+            recommendations[customer_id] = apartments
+    return recommendations
+
+# ---------------------------------- SEARCH API: ----------------------------------
+
+@_synchronized
+def find_available_apartments(city: str, country: str, start_date: date, end_date: date,
+                              min_size: int = None, limit: int = 100) -> List[Apartment]:
+    if city is None or country is None or start_date is None or end_date is None or start_date >= end_date:
+        return []
+    if limit is None or limit <= 0:
+        return []
+    found = []
+    for apartment_id, (_, apartment_city, apartment_country, size) in sorted(_tables.apartments.items()):
+        if (apartment_city, apartment_country) != (city, country) or (min_size is not None and size < min_size):
+            continue
+        if _tables.calendars.is_available(apartment_id, start_date, end_date):
+            found.append(_to_apartment(apartment_id))
+            if len(found) == limit:
+                break
+    return found
+
+
+# ---------------------------------- BULK API: ----------------------------------
+
+# the bulk functions are defined as the single row ones applied in order, so here they are just that
+
+@_synchronized
+def import_reservations(rows: List[Tuple[int, int, date, date, float]]) -> List[ReturnValue]:
+    return [customer_made_reservation(*row) for row in rows]
+
+
+@_synchronized
+def import_reviews(rows: List[Tuple[int, int, date, int, str]]) -> List[ReturnValue]:
+    return [customer_reviewed_apartment(*row) for row in rows]
+
+
+@_synchronized
+def delete_owners(owner_ids: List[int]) -> Dict[int, ReturnValue]:
+    results = {}
+    for owner_id in owner_ids:
+        if owner_id not in results:
+            results[owner_id] = _delete_owner(owner_id)
+    return results
+
+
+@_synchronized
+def delete_customers(customer_ids: List[int]) -> Dict[int, ReturnValue]:
+    results = {}
+    for customer_id in customer_ids:
+        if customer_id not in results:
+            results[customer_id] = _delete_customer(customer_id)
+    return results
+
+
+@_synchronized
+def delete_apartments(apartment_ids: List[int]) -> Dict[int, ReturnValue]:
+    results = {}
+    for apartment_id in apartment_ids:
+        if apartment_id not in results:
+            results[apartment_id] = _delete_apartment(apartment_id)
+    return results
+
+
+# ---------------------------------- EXPORT API: ----------------------------------
+
+# the tables as CSV with the columns of the Postgres tables. there is no SQL here, so no
+# export_query, no views and no PostgreSQL binary format (these return ERROR)
+
+def _table_rows(table: str) -> Tuple[List[str], List[tuple]]:
+    if table == "owners":
+        return ["id", "name"], sorted(_tables.owners.items())
+    if table == "customers":
+        return ["id", "name"], sorted(_tables.customers.items())
+    if table == "apartments":
+        return (["id", "address", "city", "country", "size"],
+                [(apartment_id, *row) for apartment_id, row in sorted(_tables.apartments.items())])
+    if table == "reservations":
+        return (["customer_id", "apartment_id", "start_date", "end_date", "total_price"],
+                [(*key, *row) for key, row in sorted(_tables.reservations.items())])
+    if table == "ownsapartment":
+        return ["owner_id", "apartment_id"], [(owner_id, apartment_id)
+                                              for apartment_id, owner_id in sorted(_tables.owns.items())]
+    return (["customer_id", "apartment_id", "review_date", "rating", "review_text"],
+            [(*key, *row) for key, row in sorted(_tables.reviews.items())])
+
+
+@_synchronized
+def export_table(table: str, destination, format: str = "csv") -> ReturnValue:
+    tables = ("owners", "customers", "apartments", "reservations", "ownsapartment", "reviews")
+    views = ("apartmentrating", "ownerrating", "ownersandapartments", "apartmentsandreviews")
+    if not isinstance(table, str) or table.lower() not in tables + views or format not in ("csv", "binary"):
+        return ReturnValue.BAD_PARAMS
+    if table.lower() in views or format == "binary":
+        return ReturnValue.ERROR
+    columns, rows = _table_rows(table.lower())
+    if isinstance(destination, (str, bytes, os.PathLike)):
+        with open(destination, "w", newline="") as file:
+            _write_csv(file, columns, rows)
+    else:
+        _write_csv(destination, columns, rows)
+    return ReturnValue.OK
+
+
+def _write_csv(file, columns: List[str], rows: List[tuple]):
+    writer = csv.writer(file, lineterminator="\n")
+    writer.writerow(columns)
+    writer.writerows(rows)
+
+
+def export_query(query, destination, format: str = "csv", params=None) -> ReturnValue:
+    return ReturnValue.ERROR
+
+
+# ---------------------------------- AVAILABILITY INDEX: ----------------------------------
+
+# the reservations are kept in an AvailabilityIndex anyway, enabling only hands it out
+
+@_synchronized
+def enable_availability_index() -> AvailabilityIndex:
+    global _index_enabled
+    _index_enabled = True
+    return _tables.calendars
+
+
+@_synchronized
+def disable_availability_index():
+    global _index_enabled
+    _index_enabled = False
+
+
+@_synchronized
+def get_availability_index() -> AvailabilityIndex:
+    return _tables.calendars if _index_enabled else None
+
+
+# ---------------------------------- CHANGE FEED: ----------------------------------
+
+# a single process owns the tables, there are no other writers to hear about
+
+def enable_change_feed():
+    pass
+
+
+def disable_change_feed():
+    pass
@@ -0,0 +1,844 @@
+import codecs
+import contextlib
+import functools
+import heapq
+import io
+import os
+import types
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Callable, Dict, Iterator, List, Tuple, Union
+
+import psycopg2.extensions
+from psycopg2 import sql
+
+import Solution
+import Utility.DBConnector as Connector
+import Utility.ResultCache as ResultCache
+from Utility.ResultCache import cached, writes
+from Utility.ReturnValue import ReturnValue
+from Utility.AvailabilityIndex import AvailabilityIndex
+
+from Business.Owner import Owner
+from Business.Customer import Customer
+from Business.Apartment import Apartment
+
+# the Solution API over several Postgres databases (shards), each with the full schema.
+# selected with SOLUTION_BACKEND=sharded (see the end of Solution.py), the shards are the
+# database.ini sections whose name starts with "shard", or configure_shards() for tests.
+#   - an apartment lives on shard_of(apartment id), with its reservations, reviews and
+#     ownership, so everything about one apartment runs on one shard, with its constraints
+#   - owners and customers are replicated to every shard, the foreign keys of the
+#     apartment-scoped tables need them. their adds go to shard 0 first, which decides
+#     the result, then to the others; an add only some shards took is undone. their
+#     deletes run in one transaction per shard, committed only if every shard ran it
+#   - address uniqueness spans the shards: add_apartment checks the other shards for the
+#     address under an advisory lock on shard 0, and undoes its insert if it is taken
+#   - aggregates (top customer, profit, ratings of owners, recommendations...) run their
+#     per-shard part on every shard in parallel and are merged here
+# the per-shard work calls the Postgres functions of Solution inside Connector.use_database.
+# in test mode every shard is the test connection, so tests of one shard only
+
+API = [
+    "create_tables", "clear_tables", "drop_tables",
+    "add_owner", "get_owner", "delete_owner", "add_apartment", "get_apartment", "delete_apartment",
+    "add_customer", "get_customer", "delete_customer",
+    "customer_made_reservation", "customer_cancelled_reservation",
+    "customer_reviewed_apartment", "customer_updated_review",
+    "owner_owns_apartment", "owner_drops_apartment", "get_apartment_owner", "get_owner_apartments",
+    "get_apartment_rating", "get_owner_rating", "get_apartment_ratings", "get_owner_ratings", "all_owner_ratings",
+    "get_top_customer", "reservations_per_owner", "get_all_location_owners", "print_all_tables",
+    "best_value_for_money", "profit_per_month", "occupancy_report",
+    "get_apartment_recommendation", "get_all_apartment_recommendations", "find_available_apartments",
+    "import_reservations", "import_reviews", "delete_owners", "delete_customers", "delete_apartments",
+    "export_table", "export_query",
+    "enable_availability_index", "disable_availability_index", "get_availability_index",
+    "enable_change_feed", "disable_change_feed",
+]
+__all__ = API + ["configure_shards", "get_shards", "shard_of"]
+
+# the single database functions, taken before SOLUTION_BACKEND=sharded replaces them in Solution
+_postgres = types.SimpleNamespace(**{name: getattr(Solution, name) for name in API})
+
+Target = Union[str, Dict[str, str]]
+# tables whose rows are on every shard
+REPLICATED = ("Owners", "Customers")
+# views that combine rows of several shards, export_table cannot concatenate them
+CROSS_SHARD_VIEWS = ("OwnerRating", "OwnersAndApartments")
+# class of the advisory locks of add_apartment, the second key is a hash of the address
+ADDRESS_LOCK = 236363
+# header and trailer of the binary COPY format: signature, flags and header extension
+# length, and the -1 field count that ends the data
+BINARY_HEADER = 19
+BINARY_TRAILER = 2
+
+_shards: List[Target] = []
+_executor = None
+
+
+# ---------------------------------- SHARDS: ----------------------------------
+
+# shards are database.ini section names or dicts of connection parameters, like replicas.
+# configure_shards() reads the [shard...] sections of database.ini (shard2 before shard10),
+# without any the primary is the only shard. the shards of a deployment must not change
+# once it holds data, every apartment id is bound to its shard by shard_of
+def configure_shards(shards: List[Target] = None):
+    global _shards, _executor
+    if shards is None:
+        parser = Connector.DBConnector._DBConnector__parser()
+        shards = sorted((section for section in parser.sections() if section.lower().startswith("shard")),
+                        key=lambda section: (len(section), section))
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+    _shards = list(shards) or [Connector.ReplicaRouter.PRIMARY]
+    _executor = ThreadPoolExecutor(max_workers=len(_shards), thread_name_prefix="shard")
+    ResultCache.clear()
+
+
+def get_shards() -> List[Target]:
+    if not _shards:
+        configure_shards()
+    return _shards
+
+
+# the shard of an apartment: Knuth's multiplicative hash, so runs of consecutive ids
+# spread over all shards. None and anything else that is not an int (rejected by every
+# function) go to shard 0
+def shard_of(apartment_id: int) -> int:
+    if not isinstance(apartment_id, int):
+        return 0
+    return (apartment_id * 2654435761) % 2 ** 32 % len(get_shards())
+
+
+def _on(shard: int, function: Callable, *args):
+    with Connector.use_database(get_shards()[shard]):
+        return function(*args)
+
+
+# runs every (shard, function, args) in parallel, the results in the same order
+def _run(calls: List[Tuple[int, Callable, tuple]]) -> List:
+    get_shards()
+    if len(calls) == 1:
+        shard, function, args = calls[0]
+        return [_on(shard, function, *args)]
+    futures = [_executor.submit(_on, shard, function, *args) for shard, function, args in calls]
+    return [future.result() for future in futures]
+
+
+# function(*args) on every shard, the results in shard order
+def _scatter(function: Callable, *args) -> List:
+    return _run([(shard, function, args) for shard in range(len(get_shards()))])
+
+
+# items grouped by the shard of key(item), in their order: shard -> [(position, item)]
+def _partition(items: list, key: Callable) -> Dict[int, List[tuple]]:
+    groups = {}
+    for position, item in enumerate(items):
+        groups.setdefault(shard_of(key(item)), []).append((position, item))
+    return groups
+
+
+# function(items of the shard) on the shard of every item, in parallel, the results put
+# back in the order of items (function returns a list with a result per item)
+def _partitioned(function: Callable, items: list, key: Callable) -> list:
+    groups = _partition(items, key)
+    shards = list(groups)
+    results = [None] * len(items)
+    for shard, shard_results in zip(shards, _run([(shard, function, ([item for _, item in groups[shard]],))
+                                                  for shard in shards])):
+        for (position, _), result in zip(groups[shard], shard_results):
+            results[position] = result
+    return results
+
+
+def _query(query, params=None) -> List[tuple]:
+    conn = Connector.DBConnector(read_only=True)
+    try:
+        _, result = conn.execute(query, params=params)
+        return result.rows
+    finally:
+        conn.close()
+
+
+# the query on every shard, the rows of every shard in one list
+def _gather(query, params=None) -> List[tuple]:
+    return [row for rows in _scatter(_query, query, params) for row in rows]
+
+
+# the rows of the query on one shard, fetched chunk_size at a time
+def _stream(shard: int, query, params=None, chunk_size: int = 10000) -> Iterator[List[tuple]]:
+    # only the connection is opened under the shard's target, the caller's code between
+    # the chunks runs without it
+    with Connector.use_database(get_shards()[shard]):
+        conn = Connector.DBConnector(read_only=True)
+    try:
+        yield from conn.stream(query, params, chunk_size=chunk_size)
+    finally:
+        conn.close()
+
+
+# ---------------------------------- CRUD API: ----------------------------------
+
+def _all_ok(results: List[ReturnValue]) -> ReturnValue:
+    return ReturnValue.OK if all(result == ReturnValue.OK for result in results) else ReturnValue.ERROR
+
+
+def _same(results: list):
+    # the result every shard agrees on, ERROR when they disagree (a shard failed)
+    return results[0] if all(result == results[0] for result in results) else ReturnValue.ERROR
+
+
+def create_tables():
+    result = _all_ok(_scatter(_postgres.create_tables))
+    if _listeners and result == ReturnValue.OK:
+        # tables dropped and created again lost their change feed triggers
+        _scatter(Solution._set_change_triggers, True)
+    return result
+
+
+def clear_tables():
+    _scatter(_postgres.clear_tables)
+
+
+def drop_tables():
+    _scatter(_postgres.drop_tables)
+
+
+# add of a replicated row: shard 0 answers (BAD_PARAMS, ALREADY_EXISTS...), then the other
+# shards take it. if one of them does not, the row is deleted again where it was added
+def _replicated_add(add: Callable, delete: Callable, row, row_id: int) -> ReturnValue:
+    result = _on(0, add, row)
+    if result != ReturnValue.OK or len(get_shards()) == 1:
+        return result
+    others = range(1, len(get_shards()))
+    results = _run([(shard, add, (row,)) for shard in others])
+    if all(result == ReturnValue.OK for result in results):
+        return ReturnValue.OK
+    print(f"add of {row_id} failed on some shards, undone")
+    _run([(shard, delete, (row_id,)) for shard, result in zip([0, *others], [ReturnValue.OK, *results])
+          if result == ReturnValue.OK])
+    return ReturnValue.ERROR
+
+
+# delete of a replicated row, in a transaction on every shard: if one shard fails, all of
+# them are rolled back, the cascaded rows of the other shards too, so the replicas do not
+# diverge. shard 0 answers (NOT_EXISTS...). the commits are not one atomic step, a shard
+# that fails to commit after others did is reported and ERROR returned
+def _replicated_delete(table: str, row_id: int) -> ReturnValue:
+    if row_id is None or row_id <= 0:
+        return ReturnValue.BAD_PARAMS
+    query = sql.SQL("DELETE FROM " + table + " WHERE id = {id}").format(id=sql.Literal(row_id))
+    connections = []
+    committed = []
+    try:
+        with contextlib.ExitStack() as transactions:
+            rows = []
+            for shard, target in enumerate(get_shards()):
+                with Connector.use_database(target):
+                    connections.append(Connector.DBConnector())
+                # records the shard once its transaction() is left without an error, i.e. committed
+                transactions.push(lambda error_type, error, traceback, shard=shard:
+                                  committed.append(shard) if error_type is None else None)
+                transactions.enter_context(connections[-1].transaction())
+                rows_effected, _ = connections[-1].execute(query)
+                rows.append(rows_effected)
+    except Exception as e:
+        print(e)
+        if committed:
+            print(f"delete of {row_id} from {table} committed only on shards {sorted(committed)}")
+        return ReturnValue.ERROR
+    finally:
+        for conn in connections:
+            conn.close()
+    return ReturnValue.OK if rows[0] > 0 else ReturnValue.NOT_EXISTS
+
+
+def add_owner(owner: Owner) -> ReturnValue:
+    return _replicated_add(_postgres.add_owner, _postgres.delete_owner, owner, owner.get_owner_id())
+
+
+def get_owner(owner_id: int) -> Owner:
+    # any copy will do, the reads are spread like the apartments
+    return _on(shard_of(owner_id), _postgres.get_owner, owner_id)
+
+
+@writes("Owners", "OwnsApartment")
+def delete_owner(owner_id: int) -> ReturnValue:
+    return _replicated_delete("Owners", owner_id)
+
+
+def add_apartment(apartment: Apartment) -> ReturnValue:
+    shard = shard_of(apartment.get_id())
+    address = (apartment.get_address(), apartment.get_city(), apartment.get_country())
+    if len(get_shards()) == 1 or None in address:
+        return _on(shard, _postgres.add_apartment, apartment)
+    # adds of the same address take turns on this lock, whatever their shard
+    key = zlib.crc32(repr(address).encode()) - 2 ** 31
+    with Connector.use_database(get_shards()[0]):
+        lock = Connector.DBConnector()
+    try:
+        with lock.transaction():
+            lock.execute("SELECT pg_advisory_xact_lock(%s, %s)", params=(ADDRESS_LOCK, key))
+            # the home shard first: its constraints decide BAD_PARAMS and a duplicate id
+            result = _on(shard, _postgres.add_apartment, apartment)
+            if result != ReturnValue.OK:
+                return result
+            query = "SELECT 1 FROM Apartments WHERE address = %s AND city = %s AND country = %s"
+            others = [other for other in range(len(get_shards())) if other != shard]
+            taken = _run([(other, _query, (query, address)) for other in others])
+            if any(taken):
+                print(f"address {address} already exists on another shard")
+                _on(shard, _postgres.delete_apartment, apartment.get_id())
+                return ReturnValue.ALREADY_EXISTS
+    except Exception as e:
+        print(e)
+        return ReturnValue.ERROR
+    finally:
+        lock.close()
+    return ReturnValue.OK
+
+
+def get_apartment(apartment_id: int) -> Apartment:
+    return _on(shard_of(apartment_id), _postgres.get_apartment, apartment_id)
+
+
+def delete_apartment(apartment_id: int) -> ReturnValue:
+    return _on(shard_of(apartment_id), _postgres.delete_apartment, apartment_id)
+
+
+def add_customer(customer: Customer) -> ReturnValue:
+    return _replicated_add(_postgres.add_customer, _postgres.delete_customer, customer, customer.get_customer_id())
+
+
+def get_customer(customer_id: int) -> Customer:
+    return _on(shard_of(customer_id), _postgres.get_customer, customer_id)
+
+
+@writes("Customers", "Reservations", "Reviews")
+def delete_customer(customer_id: int) -> ReturnValue:
+    result = _replicated_delete("Customers", customer_id)
+    if result == ReturnValue.OK and Solution._availability_index is not None:
+        Solution._availability_index.remove_customer(customer_id)
+    return result
+
+
+def customer_made_reservation(customer_id: int, apartment_id: int, start_date: date, end_date: date,
+                              total_price: float) -> ReturnValue:
+    return _on(shard_of(apartment_id), _postgres.customer_made_reservation,
+               customer_id, apartment_id, start_date, end_date, total_price)
+
+
+def customer_cancelled_reservation(customer_id: int, apartment_id: int, start_date: date) -> ReturnValue:
+    return _on(shard_of(apartment_id), _postgres.customer_cancelled_reservation,
+               customer_id, apartment_id, start_date)
+
+
+def customer_reviewed_apartment(customer_id: int, apartment_id: int, review_date: date, rating: int,
+                                review_text: str) -> ReturnValue:
+    return _on(shard_of(apartment_id), _postgres.customer_reviewed_apartment,
+               customer_id, apartment_id, review_date, rating, review_text)
+
+
+def customer_updated_review(customer_id: int, apartment_id: int, update_date: date, new_rating: int,
+                            new_text: str) -> ReturnValue:
+    return _on(shard_of(apartment_id), _postgres.customer_updated_review,
+               customer_id, apartment_id, update_date, new_rating, new_text)
+
+
+def owner_owns_apartment(owner_id: int, apartment_id: int) -> ReturnValue:
+    return _on(shard_of(apartment_id), _postgres.owner_owns_apartment, owner_id, apartment_id)
+
+
+def owner_drops_apartment(owner_id: int, apartment_id: int) -> ReturnValue:
+    return _on(shard_of(apartment_id), _postgres.owner_drops_apartment, owner_id, apartment_id)
+
+
+def get_apartment_owner(apartment_id: int) -> Owner:
+    return _on(shard_of(apartment_id), _postgres.get_apartment_owner, apartment_id)
+
+
+def get_owner_apartments(owner_id: int) -> List[Apartment]:
+    apartments = [apartment for shard_apartments in _scatter(_postgres.get_owner_apartments, owner_id)
+                  for apartment in shard_apartments]
+    return sorted(apartments, key=lambda apartment: apartment.get_id())
+
+
+# ---------------------------------- BASIC API: ----------------------------------
+
+def get_apartment_rating(apartment_id: int) -> float:
+    return _on(shard_of(apartment_id), _postgres.get_apartment_rating, apartment_id)
+
+
+def get_owner_rating(owner_id: int) -> float:
+    return get_owner_ratings([owner_id])[owner_id]
+
+
+def _apartment_ratings(apartment_ids: List[int]) -> List[float]:
+    ratings = _postgres.get_apartment_ratings(apartment_ids)
+    return [ratings[apartment_id] for apartment_id in apartment_ids]
+
+
+def get_apartment_ratings(apartment_ids: List[int]) -> Dict[int, float]:
+    ids = list(dict.fromkeys(apartment_ids))
+    try:
+        return dict(zip(ids, _partitioned(_apartment_ratings, ids, lambda apartment_id: apartment_id)))
+    except Exception as e:
+        print(e)
+        return {apartment_id: 0.0 for apartment_id in apartment_ids}
+
+
+# the rating of an owner is the mean over all its apartments, on every shard: each shard
+# sums the ratings of the owner's apartments there (0 for unrated ones) and counts them
+OWNER_TOTALS = """
+    SELECT OwnsApartment.owner_id, SUM(COALESCE(ApartmentRating.rating, 0)), COUNT(*)
+    FROM OwnsApartment
+    LEFT JOIN ApartmentRating ON ApartmentRating.apartment_id = OwnsApartment.apartment_id
+    {where}
+    GROUP BY OwnsApartment.owner_id
+    ORDER BY OwnsApartment.owner_id
+"""
+
+
+def get_owner_ratings(owner_ids: List[int]) -> Dict[int, float]:
+    ratings = {owner_id: 0.0 for owner_id in owner_ids}
+    known = [owner_id for owner_id in ratings if owner_id is not None]
+    if not known:
+        return ratings
+    try:
+        rows = _gather(OWNER_TOTALS.format(where="WHERE OwnsApartment.owner_id = ANY(%s)"), (known,))
+    except Exception as e:
+        print(e)
+        return {owner_id: 0.0 for owner_id in owner_ids}
+    totals = {}
+    for owner_id, total, count in rows:
+        previous_total, previous_count = totals.get(owner_id, (0, 0))
+        totals[owner_id] = (previous_total + total, previous_count + count)
+    for owner_id, (total, count) in totals.items():
+        ratings[owner_id] = total / count
+    return ratings
+
+
+# the owners of shard 0 merged with the totals of every shard, all ordered by owner id
+def all_owner_ratings(chunk_size: int = 10000) -> Iterator[Tuple[int, float]]:
+    try:
+        totals = heapq.merge(*[(row for rows in _stream(shard, OWNER_TOTALS.format(where=""), chunk_size=chunk_size)
+                                for row in rows) for shard in range(len(get_shards()))])
+        pending = next(totals, None)
+        for rows in _stream(0, "SELECT id FROM Owners ORDER BY id", chunk_size=chunk_size):
+            for (owner_id,) in rows:
+                total, count = 0, 0
+                while pending is not None and pending[0] <= owner_id:
+                    if pending[0] == owner_id:
+                        total, count = total + pending[1], count + pending[2]
+                    pending = next(totals, None)
+                yield owner_id, total / count if count else 0.0
+    except Exception as e:
+        print(e)
+
+
+@cached(depends_on=["Customers", "Reservations"])
+def get_top_customer() -> Customer:
+    try:
+        counts = {}
+        for customer_id, count in _gather("SELECT customer_id, COUNT(*) FROM Reservations GROUP BY customer_id"):
+            counts[customer_id] = counts.get(customer_id, 0) + count
+        if not counts:
+            return Customer.bad_customer()
+        top = min(counts, key=lambda customer_id: (-counts[customer_id], customer_id))
+    except Exception as e:
+        print(e)
+        return Customer.bad_customer()
+    return get_customer(top)
+
+
+@cached(depends_on=["Owners", "OwnsApartment", "Reservations"])
+def reservations_per_owner() -> List[Tuple[str, int]]:
+    try:
+        counts = {}
+        for owner_id, count in _gather("""
+            SELECT OwnsApartment.owner_id, COUNT(Reservations.apartment_id)
+            FROM OwnsApartment
+            LEFT JOIN Reservations ON OwnsApartment.apartment_id = Reservations.apartment_id
+            GROUP BY OwnsApartment.owner_id
+        """):
+            counts[owner_id] = counts.get(owner_id, 0) + count
+        owners = _on(0, _query, "SELECT id, name FROM Owners ORDER BY id")
+    except Exception as e:
+        print(e)
+        return []
+    return [(name, counts.get(owner_id, 0)) for owner_id, name in owners]
+
+
+# ---------------------------------- ADVANCED API: ----------------------------------
+
+def _locations() -> Tuple[List[tuple], List[tuple]]:
+    # (city, country) of the apartments, and (owner, city, country) of the owned ones
+    conn = Connector.DBConnector(read_only=True)
+    try:
+        _, locations = conn.execute("SELECT DISTINCT city, country FROM Apartments")
+        _, owned = conn.execute("""
+            SELECT DISTINCT OwnsApartment.owner_id, Apartments.city, Apartments.country
+            FROM OwnsApartment
+            JOIN Apartments ON OwnsApartment.apartment_id = Apartments.id
+        """)
+        return locations.rows, owned.rows
+    finally:
+        conn.close()
+
+
+@cached(depends_on=["Owners", "OwnsApartment", "Apartments"])
+def get_all_location_owners() -> List[Owner]:
+    try:
+        locations, owned = set(), {}
+        for shard_locations, shard_owned in _scatter(_locations):
+            locations.update(shard_locations)
+            for owner_id, city, country in shard_owned:
+                owned.setdefault(owner_id, set()).add((city, country))
+        owners = _on(0, _query, "SELECT id, name FROM Owners ORDER BY id")
+    except Exception as e:
+        print(e)
+        return []
+    # like COUNT(DISTINCT (city, country)) over the owner's rows of OwnersAndApartments, an
+    # owner without apartments has one row of NULLs, which counts as one location
+    return [Owner(owner_id=owner_id, owner_name=name) for owner_id, name in owners
+            if len(owned.get(owner_id, ())) == len(locations) or (owner_id not in owned and len(locations) == 1)]
+
+
+def print_all_tables():
+    for shard in range(len(get_shards())):
+        print(f"Shard {shard}:")
+        _on(shard, _postgres.print_all_tables)
+
+
+@cached(depends_on=["Apartments", "Reservations", "Reviews"])
+def best_value_for_money() -> Apartment:
+    try:
+        rows = _gather("""
+            SELECT ApartmentsAndReviews.id, ApartmentsAndReviews.address, ApartmentsAndReviews.city,
+                ApartmentsAndReviews.country, ApartmentsAndReviews.size,
+                AVG(ApartmentsAndReviews.rating) / AVG(Reservations.total_price / (Reservations.end_date - Reservations.start_date)) AS value
+            FROM ApartmentsAndReviews
+            JOIN Reservations ON ApartmentsAndReviews.id = Reservations.apartment_id
+            GROUP BY ApartmentsAndReviews.id, ApartmentsAndReviews.address, ApartmentsAndReviews.city,
+                ApartmentsAndReviews.country, ApartmentsAndReviews.size
+            ORDER BY value DESC, ApartmentsAndReviews.id
+            LIMIT 1
+        """)
+    except Exception as e:
+        print(e)
+        return Apartment.bad_apartment()
+    if not rows:
+        return Apartment.bad_apartment()
+    row = min(rows, key=lambda row: (-row[5], row[0]))
+    return Apartment(id=row[0], address=row[1], city=row[2], country=row[3], size=row[4])
+
+
+@cached(depends_on=["Reservations"])
+def profit_per_month(year: int) -> List[Tuple[int, float]]:
+    try:
+        totals = {}
+        for month, total in _gather("""
+            SELECT EXTRACT(MONTH FROM end_date)::integer, SUM(total_price)
+            FROM Reservations
+            WHERE EXTRACT(YEAR FROM end_date) = %s
+            GROUP BY EXTRACT(MONTH FROM end_date)
+        """, (year,)):
+            totals[month] = totals.get(month, 0) + total
+    except Exception as e:
+        print(e)
+        return []
+    return [(month, totals[month] * 0.15 if month in totals else 0.0) for month in range(1, 13)]
+
+
+# every shard builds the report of its apartments from one snapshot of its own, the
+# reports are then put together
+def occupancy_report(year: int):
+    from Analytics.Occupancy import combine_reports, empty_report, occupancy_report as shard_occupancy_report
+    try:
+        return combine_reports(_scatter(shard_occupancy_report, year))
+    except Exception as e:
+        print(e)
+        return empty_report(year)
+
+
+# first the ratio of every other customer to this one, from the apartments both reviewed,
+# summed on each shard and merged; then every shard averages the scaled reviews of those
+# customers for its apartments, with the ratios sent as arrays. limit and min_score are
+# applied on every shard and again to the merged lists
+def get_apartment_recommendation(customer_id: int, limit: int = None,
+                                 min_score: float = None) -> List[Tuple[Apartment, float]]:
+    if limit is not None and limit <= 0:
+        return []
+    try:
+        sums = {}
+        for other_id, total, count in _gather("""
+            SELECT Reviews.customer_id, SUM((Mine.rating::real / Reviews.rating)::float8), COUNT(*)
+            FROM Reviews AS Mine
+            JOIN Reviews ON Mine.apartment_id = Reviews.apartment_id
+            WHERE Mine.customer_id = %(cid)s AND Reviews.customer_id <> %(cid)s
+            GROUP BY Reviews.customer_id
+        """, {"cid": customer_id}):
+            previous_total, previous_count = sums.get(other_id, (0.0, 0))
+            sums[other_id] = (previous_total + total, previous_count + count)
+        if not sums:
+            return []
+        others = list(sums)
+        ratios = [sums[other_id][0] / sums[other_id][1] for other_id in others]
+
+        top = sql.SQL("")
+        if min_score is not None:
+            top += sql.SQL("""
+                HAVING AVG(GREATEST(1, LEAST(10, Mitam.avgRating * ApartmentsAndReviews.rating))) >= %(min_score)s
+            """)
+        if limit is not None or min_score is not None:
+            top += sql.SQL(" ORDER BY finalRating DESC, ApartmentsAndReviews.id")
+        if limit is not None:
+            top += sql.SQL(" LIMIT %(limit)s")
+        rows = _gather(sql.SQL("""
+            WITH Mitam AS (
+                SELECT * FROM unnest(%(others)s::integer[], %(ratios)s::float8[]) AS Mitam(OtherCustId, avgRating)
+            )
+            SELECT ApartmentsAndReviews.id, ApartmentsAndReviews.address, ApartmentsAndReviews.city,
+                ApartmentsAndReviews.country, ApartmentsAndReviews.size,
+                AVG(GREATEST(1, LEAST(10, Mitam.avgRating * ApartmentsAndReviews.rating))) as finalRating
+            FROM ApartmentsAndReviews
+            JOIN Mitam ON ApartmentsAndReviews.customer_id = Mitam.OtherCustId
+            WHERE NOT EXISTS (
+                SELECT * FROM Reviews
+                WHERE apartment_id = ApartmentsAndReviews.id AND customer_id = %(cid)s
+            )
+            GROUP BY ApartmentsAndReviews.id, ApartmentsAndReviews.address, ApartmentsAndReviews.city,
+                ApartmentsAndReviews.country, ApartmentsAndReviews.size
+            {top}
+        """).format(top=top), {"cid": customer_id, "others": others, "ratios": ratios,
+                               "min_score": min_score, "limit": limit})
+    except Exception as e:
+        print(e)
+        return []
+    if limit is not None or min_score is not None:
+        rows = sorted(rows, key=lambda row: (-row[5], row[0]))[:limit]
+    return [(Apartment(id=row[0], address=row[1], city=row[2], country=row[3], size=row[4]), row[5]) for row in rows]
+
+
+def get_all_apartment_recommendations() -> Dict[int, List[Tuple[Apartment, float]]]:
+    import numpy as np
+    from Analytics.Recommendation import RecommendationEngine, load_reviews
+    try:
+        loaded = _scatter(load_reviews)
+        reviews = np.concatenate([shard_reviews for shard_reviews, _ in loaded])
+        apartments = {}
+        for _, shard_apartments in loaded:
+            apartments.update(shard_apartments)
+        engine = RecommendationEngine(reviews[:, 0], reviews[:, 1], reviews[:, 2], apartments)
+        return dict(engine.recommend_all())
+    except Exception as e:
+        print(e)
+        return {}
+
+
+# ---------------------------------- SEARCH API: ----------------------------------
+
+def find_available_apartments(city: str, country: str, start_date: date, end_date: date,
+                              min_size: int = None, limit: int = 100) -> List[Apartment]:
+    # the first limit of every shard hold the first limit of all
+    apartments = [apartment for shard_apartments in _scatter(_postgres.find_available_apartments, city, country,
+                                                             start_date, end_date, min_size, limit)
+                  for apartment in shard_apartments]
+    return sorted(apartments, key=lambda apartment: apartment.get_id())[:limit]
+
+
+# ---------------------------------- BULK API: ----------------------------------
+
+# the rows of every shard are imported there in one batch, all shards in parallel. the
+# checks of a row only involve its apartment, so the results are those of one database
+def import_reservations(rows: List[Tuple[int, int, date, date, float]]) -> List[ReturnValue]:
+    return _partitioned(_postgres.import_reservations, rows, lambda row: row[1])
+
+
+def import_reviews(rows: List[Tuple[int, int, date, int, str]]) -> List[ReturnValue]:
+    return _partitioned(_postgres.import_reviews, rows, lambda row: row[1])
+
+
+def _same_per_id(results: List[Dict[int, ReturnValue]]) -> Dict[int, ReturnValue]:
+    return {id: _same([shard_results[id] for shard_results in results]) for id in results[0]}
+
+
+def delete_owners(owner_ids: List[int]) -> Dict[int, ReturnValue]:
+    return _same_per_id(_scatter(_postgres.delete_owners, owner_ids))
+
+
+def delete_customers(customer_ids: List[int]) -> Dict[int, ReturnValue]:
+    return _same_per_id(_scatter(_postgres.delete_customers, customer_ids))
+
+
+def _delete_apartments(apartment_ids: List[int]) -> List[ReturnValue]:
+    results = _postgres.delete_apartments(apartment_ids)
+    return [results[apartment_id] for apartment_id in apartment_ids]
+
+
+def delete_apartments(apartment_ids: List[int]) -> Dict[int, ReturnValue]:
+    ids = list(dict.fromkeys(apartment_ids))
+    return dict(zip(ids, _partitioned(_delete_apartments, ids, lambda apartment_id: apartment_id)))
+
+
+# ---------------------------------- EXPORT API: ----------------------------------
+
+# the COPY output of one shard on its way to the common destination: the header of every
+# shard but the first and the binary trailer of every shard but the last are dropped.
+# psycopg2 writes bytes here, they are decoded for text destinations
+class _ShardPart:
+    def __init__(self, file, binary: bool, first: bool, last: bool, encoding: str):
+        self.file = file
+        self.skip_line = not binary and not first
+        self.skip = BINARY_HEADER if binary and not first else 0
+        self.hold = BINARY_TRAILER if binary and not last else 0
+        self.held = b""
+        self.decoder = codecs.getincrementaldecoder(encoding)() \
+            if not binary and isinstance(file, io.TextIOBase) else None
+
+    def write(self, data: bytes):
+        data = bytes(data)
+        if self.skip_line:
+            end = data.find(b"\n")
+            if end < 0:
+                return
+            self.skip_line = False
+            data = data[end + 1:]
+        if self.skip:
+            dropped = min(self.skip, len(data))
+            self.skip -= dropped
+            data = data[dropped:]
+        if self.hold:
+            data = self.held + data
+            self.held = data[-self.hold:]
+            data = data[:-self.hold]
+        if data:
+            self.file.write(self.decoder.decode(data) if self.decoder else data)
+
+    def close(self):
+        if self.decoder:
+            self.file.write(self.decoder.decode(b"", final=True))
+
+
+def _copy_shards(query: sql.Composable, file, binary: bool, params=None):
+    count = len(get_shards())
+    for shard in range(count):
+        with Connector.use_database(get_shards()[shard]):
+            conn = Connector.DBConnector(read_only=True)
+        try:
+            if count == 1:
+                conn.copy_out(query, file, binary=binary, params=params)
+                continue
+            encoding = psycopg2.extensions.encodings.get(conn.connection.encoding, "utf-8")
+            part = _ShardPart(file, binary, shard == 0, shard == count - 1, encoding)
+            conn.copy_out(query, part, binary=binary, params=params)
+            part.close()
+        finally:
+            conn.close()
+
+
+def _export(query: sql.Composable, destination, format: str, params=None) -> ReturnValue:
+    if format not in Solution.EXPORT_FORMATS:
+        return ReturnValue.BAD_PARAMS
+    try:
+        if isinstance(destination, (str, bytes, os.PathLike)):
+            with open(destination, "wb") as file:
+                _copy_shards(query, file, format == "binary", params)
+        else:
+            _copy_shards(query, destination, format == "binary", params)
+    except Exception as e:
+        print(e)
+        return ReturnValue.ERROR
+    return ReturnValue.OK
+
+
+# one file for all shards, in the format of Solution.export_table: the replicated tables
+# come from shard 0, the rows of the others from every shard in turn. the views of owners
+# (OwnerRating, OwnersAndApartments) combine several shards and are refused with ERROR
+def export_table(table: str, destination, format: str = "csv") -> ReturnValue:
+    names = {name.lower(): name for name in Solution.EXPORTABLE}
+    if not isinstance(table, str) or table.lower() not in names:
+        return ReturnValue.BAD_PARAMS
+    if names[table.lower()] in REPLICATED:
+        return _on(0, _postgres.export_table, table, destination, format)
+    if names[table.lower()] in CROSS_SHARD_VIEWS:
+        if format not in Solution.EXPORT_FORMATS:
+            return ReturnValue.BAD_PARAMS
+        print(f"{table} spans the shards, export its tables instead")
+        return ReturnValue.ERROR
+    return _export(sql.SQL("SELECT * FROM {0}").format(sql.Identifier(table.lower())), destination, format)
+
+
+# the query runs on every shard and the rows are concatenated: right for row by row
+# queries of the apartment-scoped tables, an aggregate comes once per shard
+def export_query(query, destination, format: str = "csv", params=None) -> ReturnValue:
+    if isinstance(query, str):
+        query = sql.SQL(query)
+    return _export(query, destination, format, params)
+
+
+# ---------------------------------- AVAILABILITY INDEX: ----------------------------------
+
+# the index of Solution, loaded from every shard. Solution's write functions keep it in
+# sync, they run in this process whatever the shard
+def _reload_shard(index: AvailabilityIndex, shard: int):
+    # the shard's apartments with reservations, and those the index has from it, which
+    # may be gone
+    ids = [row[0] for row in _query("SELECT DISTINCT apartment_id FROM Reservations")]
+    index.reload(ids + [apartment_id for apartment_id in index.apartments() if shard_of(apartment_id) == shard])
+
+
+def enable_availability_index() -> AvailabilityIndex:
+    index = AvailabilityIndex()
+    _run([(shard, _reload_shard, (index, shard)) for shard in range(len(get_shards()))])
+    Solution._availability_index = index
+    return index
+
+
+def disable_availability_index():
+    _postgres.disable_availability_index()
+
+
+def get_availability_index() -> AvailabilityIndex:
+    return _postgres.get_availability_index()
+
+
+# ---------------------------------- CHANGE FEED: ----------------------------------
+
+# one listener per shard. a change of a shard is handled by Solution._on_change on that
+# shard, except that the whole index is never reloaded for one shard, only its apartments
+_listeners: List[Connector.ChangeListener] = []
+
+
+def _on_change(shard: int, event: Connector.ChangeEvent):
+    if event.table is not None and event.keys is not None:
+        _on(shard, Solution._on_change, event)
+        return
+    if event.table is None:
+        ResultCache.clear()
+    else:
+        ResultCache.invalidate(event.table)
+    index = _postgres.get_availability_index()
+    if index is not None and event.table in (None, "reservations", "apartments", "customers"):
+        _on(shard, _reload_shard, index, shard)
+
+
+def enable_change_feed():
+    if _listeners:
+        return
+    for shard, target in enumerate(get_shards()):
+        listener = Connector.ChangeListener(section=target)
+        listener.add_callback(functools.partial(_on_change, shard))
+        listener.start()
+        _listeners.append(listener)
+    _scatter(Solution._set_change_triggers, True)
+
+
+def disable_change_feed():
+    while _listeners:
+        _listeners.pop().stop()
+    try:
+        _scatter(Solution._set_change_triggers, False)
+    except Exception as e:
+        print(e)
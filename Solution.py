@@ -1,4 +1,6 @@
-from typing import List, Tuple
+import os
+import sys
+from typing import Dict, Iterator, List, Tuple
 from psycopg2 import sql
 from datetime import date, datetime
 
@@ -7,6 +9,11 @@ from Utility.DBConnector import ResultSet
 
 from Utility.ReturnValue import ReturnValue
 from Utility.Exceptions import DatabaseException
+from Utility.AvailabilityIndex import AvailabilityIndex
+import Utility.SchemaMigrations as SchemaMigrations
+from Utility.Retry import RETRYABLE, retry_transaction
+import Utility.ResultCache as ResultCache
+from Utility.ResultCache import cached, writes
 
 from Business.Owner import Owner
 from Business.Customer import Customer
@@ -17,21 +24,25 @@ from psycopg2 import sql
 
 # ---------------------------------- CRUD API: ----------------------------------
 
-def create_tables():
-    
-    queries = [
+# every table, for functions that write to all of them (see Utility/ResultCache.py)
+TABLES = ("Owners", "Apartments", "Customers", "Reservations", "Reviews", "OwnsApartment")
+
+# the schema, as migrations applied in order by create_tables (see Utility/SchemaMigrations.py).
+# never change a released migration, append a new version instead
+MIGRATIONS = [
+    (1, "tables and views", [
         """
         CREATE TABLE IF NOT EXISTS Owners(
             id INTEGER PRIMARY KEY check(id > 0),
             name TEXT NOT NULL
-          
+      
         )
         """,            
         """
         CREATE TABLE IF NOT EXISTS Customers(
             id INTEGER PRIMARY KEY check(id > 0),
             name TEXT NOT NULL
-            
+        
         )
         """,
         """
@@ -103,22 +114,92 @@ def create_tables():
         SELECT * FROM Apartments
         JOIN Reviews ON Apartments.id = Reviews.apartment_id
         """,
-        ]
-    conn = Connector.DBConnector()
-    try:
-        for query in queries:
-            conn.execute(query)
+    ]),
+    (2, "search indexes", [
+        # apartment search by location and size (find_available_apartments)
+        """
+        CREATE INDEX IF NOT EXISTS apartments_location_idx ON Apartments(country, city, size)
+        """,
+        # overlap checks of an apartment's stays: end_date > start AND start_date < end
+        # only walks the stays ending after start, without visiting the table
+        """
+        CREATE INDEX IF NOT EXISTS reservations_apartment_dates_idx ON Reservations(apartment_id, end_date, start_date)
+        """,
+    ]),
+    (3, "foreign key indexes", [
+        # ON DELETE CASCADE looks up the referencing rows of every deleted owner / apartment,
+        # without these indexes each lookup is a scan of the whole table
+        """
+        CREATE INDEX IF NOT EXISTS reviews_apartment_idx ON Reviews(apartment_id)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS owns_apartment_owner_idx ON OwnsApartment(owner_id)
+        """,
+    ]),
+    (4, "change notifications", [
+        # one NOTIFY per statement, sent when the transaction commits, with the keys of the
+        # changed rows when there are few enough to fit a payload (see Connector.ChangeListener).
+        # an UPDATE sends the keys before and after it. the triggers calling it only exist
+        # while the change feed is enabled, see enable_change_feed
+        """
+        CREATE OR REPLACE FUNCTION solution_notify_change() RETURNS trigger AS $$
+        DECLARE
+            changed_rows JSONB;
+            changed INTEGER;
+            keys JSONB;
+        BEGIN
+            IF TG_OP <> 'TRUNCATE' THEN
+                IF TG_OP = 'INSERT' THEN
+                    SELECT jsonb_agg(to_jsonb(new_rows)) INTO changed_rows
+                    FROM (SELECT * FROM new_rows LIMIT 51) AS new_rows;
+                ELSIF TG_OP = 'DELETE' THEN
+                    SELECT jsonb_agg(to_jsonb(old_rows)) INTO changed_rows
+                    FROM (SELECT * FROM old_rows LIMIT 51) AS old_rows;
+                ELSE
+                    SELECT jsonb_agg(changed_row) INTO changed_rows FROM (
+                        (SELECT to_jsonb(old_rows) AS changed_row FROM old_rows LIMIT 51)
+                        UNION ALL
+                        (SELECT to_jsonb(new_rows) FROM new_rows LIMIT 51)
+                    ) AS both_rows;
+                END IF;
+                SELECT COUNT(*), jsonb_agg(changed_key) INTO changed, keys FROM (
+                    SELECT DISTINCT (SELECT jsonb_object_agg(key, changed_row -> key)
+                                     FROM unnest(TG_ARGV) AS key) AS changed_key
+                    FROM jsonb_array_elements(changed_rows) AS changed_row
+                ) AS changed_keys;
+                IF changed = 0 THEN
+                    RETURN NULL;
+                END IF;
+                IF changed > 50 THEN
+                    keys := NULL;
+                END IF;
+            END IF;
+            PERFORM pg_notify('solution_changes', json_build_object(
+                'table', lower(TG_TABLE_NAME), 'operation', TG_OP, 'keys', keys)::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+    ]),
+]
+
 
+@writes(*TABLES)
+def create_tables():
+    # a schema that is already up to date costs one version check, not a round of DDL
+    try:
+        SchemaMigrations.migrate(MIGRATIONS)
+        if _change_feed:
+            # tables dropped and created again lost their triggers
+            _set_change_triggers(True)
     except Exception as e:
         print(e)
-        conn.rollback()
         return ReturnValue.ERROR
-    finally:
-        conn.close()
 
     return ReturnValue.OK
 
 
+@writes(*TABLES)
 def clear_tables():
     conn = Connector.DBConnector()
     try:
@@ -134,8 +215,11 @@ def clear_tables():
         conn.rollback()
     finally:
         conn.close()
+    if _availability_index is not None:
+        _availability_index.clear()
 
 
+@writes(*TABLES)
 def drop_tables():
     conn = Connector.DBConnector()
     try:
@@ -147,14 +231,19 @@ def drop_tables():
         conn.execute("DROP TABLE IF EXISTS Reviews CASCADE")
         conn.execute("DROP VIEW IF EXISTS ApartmentRating CASCADE")
         conn.execute("DROP VIEW IF EXISTS OwnerRating CASCADE")
+        conn.execute("DROP TABLE IF EXISTS SchemaVersion CASCADE")
+        conn.execute("DROP FUNCTION IF EXISTS solution_notify_change CASCADE")
         
     except Exception as e:
         print(e)
         conn.rollback()
     finally:
         conn.close()
+    if _availability_index is not None:
+        _availability_index.clear()
 
 
+@writes("Owners")
 def add_owner(owner: Owner) -> ReturnValue:
     if(owner.get_owner_id() is None or owner.get_owner_id() <= 0): return ReturnValue.BAD_PARAMS
     if(owner.get_owner_name() is None): return ReturnValue.BAD_PARAMS
@@ -179,7 +268,7 @@ def add_owner(owner: Owner) -> ReturnValue:
 
 
 def get_owner(owner_id: int) -> Owner:
-    conn = Connector.DBConnector()
+    conn = Connector.DBConnector(read_only=True)
     resultSet = ResultSet()
     try:
         query = sql.SQL("SELECT * FROM Owners WHERE id={0}").format(sql.Literal(owner_id))
@@ -216,9 +305,11 @@ def delete_generic(id: int, table: str)->ReturnValue:
     return ReturnValue.OK
 
 
+@writes("Owners", "OwnsApartment")
 def delete_owner(owner_id: int) -> ReturnValue:
     return delete_generic(owner_id, "Owners")
 
+@writes("Apartments")
 def add_apartment(apartment: Apartment) -> ReturnValue:
     conn = Connector.DBConnector()
     try:
@@ -246,7 +337,7 @@ def add_apartment(apartment: Apartment) -> ReturnValue:
     return ReturnValue.OK
 
 def get_apartment(apartment_id: int) -> Apartment:
-    conn = Connector.DBConnector()
+    conn = Connector.DBConnector(read_only=True)
     try:
         query = sql.SQL("SELECT * FROM Apartments WHERE id={0}").format(sql.Literal(apartment_id))
         rows_affected, result_set = conn.execute(query)
@@ -269,10 +360,15 @@ def get_apartment(apartment_id: int) -> Apartment:
         conn.close()
 
 
+@writes("Apartments", "Reservations", "Reviews", "OwnsApartment")
 def delete_apartment(apartment_id: int) -> ReturnValue:
-    return delete_generic(apartment_id, "Apartments")
+    result = delete_generic(apartment_id, "Apartments")
+    if result == ReturnValue.OK and _availability_index is not None:
+        _availability_index.remove_apartment(apartment_id)
+    return result
 
 
+@writes("Customers")
 def add_customer(customer: Customer) -> ReturnValue:
     if customer.get_customer_id() is None or customer.get_customer_id() <= 0:
         return ReturnValue.BAD_PARAMS
@@ -300,7 +396,7 @@ def add_customer(customer: Customer) -> ReturnValue:
 
 
 def get_customer(customer_id: int) -> Customer:
-    conn = Connector.DBConnector()
+    conn = Connector.DBConnector(read_only=True)
     try:
         query = sql.SQL("SELECT * FROM Customers WHERE id={0}").format(sql.Literal(customer_id))
         rows_affected, result_set = conn.execute(query)
@@ -319,14 +415,22 @@ def get_customer(customer_id: int) -> Customer:
         conn.close()
 
 
+@writes("Customers", "Reservations", "Reviews")
 def delete_customer(customer_id: int) -> ReturnValue:
-    return delete_generic(customer_id, "Customers")
+    result = delete_generic(customer_id, "Customers")
+    if result == ReturnValue.OK and _availability_index is not None:
+        _availability_index.remove_customer(customer_id)
+    return result
 
 
+# runs at SERIALIZABLE so that two concurrent bookings of overlapping dates cannot both
+# pass the NOT EXISTS check, the one that loses is retried
+@writes("Reservations")
+@retry_transaction()
 def customer_made_reservation(customer_id: int, apartment_id: int, start_date: date, end_date: date,
                                 total_price: float) -> ReturnValue:
 
-    conn = Connector.DBConnector()
+    conn = Connector.DBConnector(serializable=True)
     try:
         query = sql.SQL("""
                         INSERT INTO Reservations(
@@ -334,11 +438,7 @@ def customer_made_reservation(customer_id: int, apartment_id: int, start_date: d
                             SELECT {cid}, {aid}, {sd}, {ed}, {tp}
                             WHERE NOT EXISTS (
                                 SELECT * FROM Reservations 
-                                WHERE apartment_id = {aid} AND (
-                                    {sd} > start_date AND {sd} <  end_date OR
-                                    {ed} > start_date AND {ed} < end_date OR
-                                    (start_date  > {sd} AND end_date < {ed})
-                                )
+                                WHERE apartment_id = {aid} AND start_date < {ed} AND end_date > {sd}
                             )
                         """).format(cid=sql.Literal(customer_id),
                                     aid=sql.Literal(apartment_id),
@@ -358,15 +458,20 @@ def customer_made_reservation(customer_id: int, apartment_id: int, start_date: d
     except DatabaseException.UNIQUE_VIOLATION as e:
         print("Reservation already exists, shouldn't be possible")
         return ReturnValue.ALREADY_EXISTS
+    except RETRYABLE:
+        raise
     except Exception as e:
         print(e)
         conn.rollback()
         return ReturnValue.ERROR
     finally:
         conn.close()
+    if _availability_index is not None:
+        _availability_index.add(customer_id, apartment_id, start_date, end_date)
     return ReturnValue.OK
 
 
+@writes("Reservations")
 def customer_cancelled_reservation(customer_id: int, apartment_id: int, start_date: date) -> ReturnValue:
     if customer_id is None or customer_id <= 0 or apartment_id is None or apartment_id <= 0 or start_date is None:
         return ReturnValue.BAD_PARAMS
@@ -386,14 +491,21 @@ def customer_cancelled_reservation(customer_id: int, apartment_id: int, start_da
         return ReturnValue.ERROR
     finally:
         conn.close()
+    if _availability_index is not None:
+        _availability_index.remove(customer_id, apartment_id, start_date)
     return ReturnValue.OK
 
 
+# SERIALIZABLE like customer_made_reservation. a cancel of the reservation it depends on that
+# commits meanwhile is no conflict: the outcome is that of the review written just before the
+# cancel, which the API allows as well
+@writes("Reviews")
+@retry_transaction()
 def customer_reviewed_apartment(customer_id: int, apartment_id: int, review_date: date, rating: int,
                                 review_text: str) -> ReturnValue:
     if(customer_id is None or customer_id <= 0 or apartment_id is None or apartment_id <= 0 or review_date is None or rating is None or rating < 1 or rating > 10 or review_text is None or len(review_text) == 0):
         return ReturnValue.BAD_PARAMS
-    conn = Connector.DBConnector()
+    conn = Connector.DBConnector(serializable=True)
     try:
         queryStr = """
             INSERT INTO Reviews(
@@ -423,6 +535,8 @@ def customer_reviewed_apartment(customer_id: int, apartment_id: int, review_date
     except DatabaseException.UNIQUE_VIOLATION as e:
         print(e)
         return ReturnValue.ALREADY_EXISTS
+    except RETRYABLE:
+        raise
     except Exception as e:
         print(e)
         conn.rollback()
@@ -432,6 +546,7 @@ def customer_reviewed_apartment(customer_id: int, apartment_id: int, review_date
     return ReturnValue.OK
 
 
+@writes("Reviews")
 def customer_updated_review(customer_id: int, apartment_id: int, update_date: date, new_rating: int,
                             new_text: str) -> ReturnValue:
     if(customer_id is None or customer_id <= 0 or apartment_id is None or apartment_id <= 0 or update_date is None or new_rating is None or new_rating < 1 or new_rating > 10 or new_text is None or len(new_text) == 0):
@@ -465,6 +580,7 @@ def customer_updated_review(customer_id: int, apartment_id: int, update_date: da
     return ReturnValue.OK
 
 
+@writes("OwnsApartment")
 def owner_owns_apartment(owner_id: int, apartment_id: int) -> ReturnValue:
     conn = Connector.DBConnector()
     try:
@@ -493,6 +609,7 @@ def owner_owns_apartment(owner_id: int, apartment_id: int) -> ReturnValue:
     return ReturnValue.OK
 
 
+@writes("OwnsApartment")
 def owner_drops_apartment(owner_id: int, apartment_id: int) -> ReturnValue:
     if owner_id is None or owner_id <= 0 or apartment_id is None or apartment_id <= 0:
         return ReturnValue.BAD_PARAMS
@@ -515,7 +632,7 @@ def owner_drops_apartment(owner_id: int, apartment_id: int) -> ReturnValue:
 
 
 def get_apartment_owner(apartment_id: int) -> Owner:
-    conn = Connector.DBConnector()
+    conn = Connector.DBConnector(read_only=True)
     resultSet = ResultSet()
     try:
         query = sql.SQL("""
@@ -534,7 +651,7 @@ def get_apartment_owner(apartment_id: int) -> Owner:
         conn.close()
 
 def get_owner_apartments(owner_id: int) -> List[Apartment]:
-    conn = Connector.DBConnector()
+    conn = Connector.DBConnector(read_only=True)
     resultSet = ResultSet()
     try:
         query = sql.SQL("""
@@ -560,7 +677,7 @@ def get_owner_apartments(owner_id: int) -> List[Apartment]:
 # ---------------------------------- BASIC API: ----------------------------------
 
 def get_apartment_rating(apartment_id: int) -> float:
-    conn = Connector.DBConnector()
+    conn = Connector.DBConnector(read_only=True)
     resultSet = ResultSet()
     try:
         query = sql.SQL("SELECT rating FROM ApartmentRating WHERE apartment_id={0}").format(sql.Literal(apartment_id))
@@ -576,7 +693,7 @@ def get_apartment_rating(apartment_id: int) -> float:
 
 
 def get_owner_rating(owner_id: int) -> float:
-    conn = Connector.DBConnector()
+    conn = Connector.DBConnector(read_only=True)
     resultSet = ResultSet()
     try:
         query = sql.SQL("SELECT rating FROM OwnerRating WHERE owner_id={0}").format(sql.Literal(owner_id))
@@ -591,8 +708,58 @@ def get_owner_rating(owner_id: int) -> float:
         conn.close()
 
 
+# the ratings of many apartments (owners) in one query: id -> rating for every id asked
+# for, 0.0 where get_apartment_rating (get_owner_rating) would return 0.0
+def get_ratings_generic(ids: List[int], view: str, column: str) -> Dict[int, float]:
+    ratings = {id: 0.0 for id in ids}
+    known = [id for id in ratings if id is not None]
+    if not known:
+        return ratings
+    conn = Connector.DBConnector(read_only=True)
+    try:
+        query = sql.SQL("SELECT {column}, rating FROM {view} WHERE {column} = ANY(%s)").format(
+            column=sql.Identifier(column), view=sql.Identifier(view.lower()))
+        rows_effected, resultSet = conn.execute(query, params=(known,))
+        for row in resultSet.rows:
+            ratings[row[0]] = row[1]
+        return ratings
+    except Exception as e:
+        print(e)
+        conn.rollback()
+        return {id: 0.0 for id in ids}
+    finally:
+        conn.close()
+
+
+def get_apartment_ratings(apartment_ids: List[int]) -> Dict[int, float]:
+    return get_ratings_generic(apartment_ids, "ApartmentRating", "apartment_id")
+
+
+def get_owner_ratings(owner_ids: List[int]) -> Dict[int, float]:
+    return get_ratings_generic(owner_ids, "OwnerRating", "owner_id")
+
+
+# (owner id, rating) of every owner by id, 0.0 for owners without rated apartments,
+# streamed from the server in chunks so any number of owners fits in memory
+def all_owner_ratings(chunk_size: int = 10000) -> Iterator[Tuple[int, float]]:
+    conn = Connector.DBConnector(read_only=True)
+    try:
+        for rows in conn.stream("""
+            SELECT Owners.id, OwnerRating.rating
+            FROM Owners
+            LEFT JOIN OwnerRating ON Owners.id = OwnerRating.owner_id
+            ORDER BY Owners.id
+        """, chunk_size=chunk_size):
+            for owner_id, rating in rows:
+                yield owner_id, rating if rating is not None else 0.0
+    except Exception as e:
+        print(e)
+    finally:
+        conn.close()
+
+@cached(depends_on=["Customers", "Reservations"])
 def get_top_customer() -> Customer:
-    conn = Connector.DBConnector()
+    conn = Connector.DBConnector(read_only=True)
     resultSet = ResultSet()
     try:
         query = sql.SQL("""
@@ -614,8 +781,9 @@ def get_top_customer() -> Customer:
         conn.close()
 
 
+@cached(depends_on=["Owners", "OwnsApartment", "Reservations"])
 def reservations_per_owner() -> List[Tuple[str, int]]:
-    conn = Connector.DBConnector()
+    conn = Connector.DBConnector(read_only=True)
     resultSet = ResultSet()
     try:
         query = sql.SQL("""
@@ -640,8 +808,9 @@ def reservations_per_owner() -> List[Tuple[str, int]]:
 
 # ---------------------------------- ADVANCED API: ----------------------------------
 
+@cached(depends_on=["Owners", "OwnsApartment", "Apartments"])
 def get_all_location_owners() -> List[Owner]:
-    conn = Connector.DBConnector()
+    conn = Connector.DBConnector(read_only=True)
     resultSet = ResultSet()
     try:
         query = sql.SQL("""
@@ -664,23 +833,24 @@ def get_all_location_owners() -> List[Owner]:
         conn.close()
 
 def print_all_tables():
-    tables = ["Owners", "Customers", "Apartments", "Reservations", "OwnsApartment", "Reviews"]
-    for table in tables:
-        conn = Connector.DBConnector()
-        try:
-            query = sql.SQL("SELECT * FROM " + table)
-            rows_effected, resultSet = conn.execute(query)
+    # every table as CSV, streamed over one connection
+    conn = Connector.DBConnector(read_only=True)
+    try:
+        for table in ["Owners", "Customers", "Apartments", "Reservations", "OwnsApartment", "Reviews"]:
             print(f"Table: {table}")
-            print(resultSet.rows)
+            sys.stdout.flush()
+            conn.copy_out(sql.SQL("SELECT * FROM {0}").format(sql.Identifier(table.lower())), sys.stdout)
             print("\n")
-        except Exception as e:
-            print(e)
-            conn.rollback()
-        finally:
-            conn.close()
-        
+    except Exception as e:
+        print(e)
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+@cached(depends_on=["Apartments", "Reservations", "Reviews"])
 def best_value_for_money() -> Apartment:
-    conn = Connector.DBConnector()
+    conn = Connector.DBConnector(read_only=True)
     resultSet = ResultSet()
     try:
         query = sql.SQL("""
@@ -704,16 +874,14 @@ def best_value_for_money() -> Apartment:
         conn.close()
 
 
+@cached(depends_on=["Reservations"])
 def profit_per_month(year: int) -> List[Tuple[int, float]]:
-    conn = Connector.DBConnector()
+    conn = Connector.DBConnector(read_only=True)
     resultSet = ResultSet()
     try:
-        allMonth = "CREATE TEMP TABLE allMonth (month INT);"
-        allMonth += "INSERT INTO allMonth VALUES (1), (2), (3), (4), (5), (6), (7), (8), (9), (10), (11), (12);"
-        conn.execute(allMonth)
-        
+        # generate_series rather than a temp table, a reused connection would still have it
         query = sql.SQL("""
-            SELECT allMonth.month, COALESCE(total_profit, 0) FROM allMonth 
+            SELECT allMonth.month, COALESCE(total_profit, 0) FROM generate_series(1, 12) AS allMonth(month)
             LEFT JOIN (
                 SELECT EXTRACT(MONTH FROM end_date) as month, SUM(total_price) * 0.15 as total_profit
                 FROM Reservations
@@ -737,10 +905,35 @@ def profit_per_month(year: int) -> List[Tuple[int, float]]:
         conn.close()
 
 
-def get_apartment_recommendation(customer_id: int) -> List[Tuple[Apartment, float]]:
-    conn = Connector.DBConnector()
+# occupancy_report and get_all_apartment_recommendations are computed with numpy by the
+# Analytics package, which is imported inside them so the rest of the API runs without numpy
+def occupancy_report(year: int):
+    from Analytics.Occupancy import empty_report, occupancy_report as build_occupancy_report
+    try:
+        return build_occupancy_report(year)
+    except Exception as e:
+        print(e)
+        return empty_report(year)
+
+
+# with limit and/or min_score the recommendations come best first (then by apartment id),
+# only the first limit of them and only those rated at least min_score, ordered and cut in SQL
+def get_apartment_recommendation(customer_id: int, limit: int = None,
+                                 min_score: float = None) -> List[Tuple[Apartment, float]]:
+    if limit is not None and limit <= 0:
+        return []
+    conn = Connector.DBConnector(read_only=True)
     resultSet = ResultSet()
     try:
+        top = sql.SQL("")
+        if min_score is not None:
+            top += sql.SQL("""
+                HAVING AVG(GREATEST(1, LEAST(10, Mitam.avgRating * ApartmentsAndReviews.rating))) >= {0}
+            """).format(sql.Literal(min_score))
+        if limit is not None or min_score is not None:
+            top += sql.SQL(" ORDER BY finalRating DESC, ApartmentsAndReviews.id")
+        if limit is not None:
+            top += sql.SQL(" LIMIT {0}").format(sql.Literal(limit))
         query = sql.SQL("""
             WITH ReviewTuples AS (
                 SELECT ApartmentsAndReviews.rating as ThisCustRating, 
@@ -768,7 +961,8 @@ def get_apartment_recommendation(customer_id: int) -> List[Tuple[Apartment, floa
                 WHERE apartment_id = ApartmentsAndReviews.id AND customer_id = {cid}
             )
             GROUP BY ApartmentsAndReviews.id, ApartmentsAndReviews.address, ApartmentsAndReviews.city, ApartmentsAndReviews.country, ApartmentsAndReviews.size
-        """).format(cid=sql.Literal(customer_id))
+            {top}
+        """).format(cid=sql.Literal(customer_id), top=top)
         
         rows_effected, resultSet = conn.execute(query)
         if(resultSet.isEmpty()): return []
@@ -781,4 +975,459 @@ def get_apartment_recommendation(customer_id: int) -> List[Tuple[Apartment, floa
         conn.rollback()
         return []
     finally:
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+
+
+# get_apartment_recommendation of every customer that has recommendations, customer id ->
+# the same list, from one pass over Reviews instead of one query per customer
+def get_all_apartment_recommendations() -> Dict[int, List[Tuple[Apartment, float]]]:
+    from Analytics.Recommendation import recommendations_for_all
+    try:
+        return recommendations_for_all()
+    except Exception as e:
+        print(e)
+        return {}
+
+# ---------------------------------- SEARCH API: ----------------------------------
+
+def find_available_apartments(city: str, country: str, start_date: date, end_date: date,
+                              min_size: int = None, limit: int = 100) -> List[Apartment]:
+    if city is None or country is None or start_date is None or end_date is None or start_date >= end_date:
+        return []
+    if limit is None or limit <= 0:
+        return []
+    conn = Connector.DBConnector(read_only=True)
+    resultSet = ResultSet()
+    try:
+        size_filter = sql.SQL("")
+        if min_size is not None:
+            size_filter = sql.SQL("AND Apartments.size >= {0}").format(sql.Literal(min_size))
+        query = sql.SQL("""
+            SELECT Apartments.id, Apartments.address, Apartments.city, Apartments.country, Apartments.size
+            FROM Apartments
+            WHERE Apartments.country = {country} AND Apartments.city = {city} {size_filter}
+            AND NOT EXISTS (
+                SELECT 1 FROM Reservations
+                WHERE apartment_id = Apartments.id AND end_date > {sd} AND start_date < {ed}
+            )
+            ORDER BY Apartments.id
+            LIMIT {limit}
+        """).format(country=sql.Literal(country),
+                    city=sql.Literal(city),
+                    size_filter=size_filter,
+                    sd=sql.Literal(start_date),
+                    ed=sql.Literal(end_date),
+                    limit=sql.Literal(limit))
+        rows_effected, resultSet = conn.execute(query)
+        apartments = []
+        for row in resultSet.rows:
+            apartments.append(Apartment(id= row[0], address= row[1], city= row[2], country= row[3], size= row[4]))
+        return apartments
+    except Exception as e:
+        print(e)
+        conn.rollback()
+        return []
+    finally:
+        conn.close()
+
+
+# ---------------------------------- BULK API: ----------------------------------
+
+# copies rows into a new temporary table name(ord, columns...), ord is the row's index in rows.
+# must run inside conn.transaction(), the table is dropped when it commits
+def _stage_rows(conn: Connector.DBConnector, name: str, columns: List[Tuple[str, str]], rows: List[tuple]):
+    conn.execute(sql.SQL("DROP TABLE IF EXISTS pg_temp.{0}").format(sql.Identifier(name.lower())))
+    conn.execute(sql.SQL("CREATE TEMP TABLE {0}(ord INTEGER PRIMARY KEY, {1}) ON COMMIT DROP").format(
+        sql.Identifier(name.lower()),
+        sql.SQL(", ").join(sql.SQL("{0} {1}").format(sql.Identifier(column), sql.SQL(type))
+                           for column, type in columns)))
+    conn.copy_rows(name, ["ord"] + [column for column, _ in columns],
+                   ((i,) + tuple(row) for i, row in enumerate(rows)))
+    conn.execute(sql.SQL("ANALYZE {0}").format(sql.Identifier(name.lower())))
+
+
+# rows are (customer_id, apartment_id, start_date, end_date, total_price). returns a ReturnValue
+# per row, the same as calling customer_made_reservation on the rows one by one in this order:
+# a row that overlaps an existing reservation, or an accepted row earlier in the batch, is BAD_PARAMS.
+# the rows are copied to a staging table and classified by one query, only the rows that overlap
+# other candidates of the batch are then resolved here, in input order. the accepted rows are
+# inserted by one statement, in one transaction with the checks.
+@writes("Reservations")
+def import_reservations(rows: List[Tuple[int, int, date, date, float]]) -> List[ReturnValue]:
+    rows = list(rows)
+    if not rows:
+        return []
+    conn = Connector.DBConnector()
+    try:
+        with conn.transaction():
+            # concurrent bookings wait for the import, so the checks below stay true until it commits
+            conn.execute("LOCK TABLE Reservations IN SHARE ROW EXCLUSIVE MODE")
+            _stage_rows(conn, "ReservationImport", [("customer_id", "INTEGER"), ("apartment_id", "INTEGER"),
+                                                    ("start_date", "DATE"), ("end_date", "DATE"),
+                                                    ("total_price", "FLOAT")], rows)
+            # the checks in the order the single row INSERT meets them: the overlap (NOT EXISTS),
+            # then NOT NULL and CHECK constraints, then foreign keys. conflict marks the rows whose
+            # result depends on which candidates (OK rows) are accepted: candidates overlapping
+            # another candidate, its neighbours by start_date are enough to tell, and NOT_EXISTS
+            # rows overlapping an earlier candidate, they are BAD_PARAMS if that one is accepted
+            _, result = conn.execute("""
+                WITH Classified AS (
+                    SELECT ReservationImport.*, CASE
+                        WHEN EXISTS (
+                            SELECT 1 FROM Reservations
+                            WHERE Reservations.apartment_id = ReservationImport.apartment_id
+                            AND Reservations.start_date < ReservationImport.end_date
+                            AND Reservations.end_date > ReservationImport.start_date
+                        ) THEN 'BAD_PARAMS'
+                        WHEN customer_id IS NULL OR apartment_id IS NULL OR start_date IS NULL
+                            OR end_date IS NULL OR total_price IS NULL THEN 'BAD_PARAMS'
+                        WHEN customer_id <= 0 OR apartment_id <= 0 OR total_price <= 0
+                            OR start_date >= end_date THEN 'BAD_PARAMS'
+                        WHEN NOT EXISTS (SELECT 1 FROM Customers WHERE id = customer_id)
+                            OR NOT EXISTS (SELECT 1 FROM Apartments WHERE id = apartment_id) THEN 'NOT_EXISTS'
+                        ELSE 'OK'
+                    END AS status
+                    FROM ReservationImport
+                )
+                SELECT ord, status, CASE status
+                    WHEN 'OK' THEN
+                        COALESCE(MAX(end_date) OVER (PARTITION BY apartment_id, status ORDER BY start_date, ord
+                                                     ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING) > start_date, FALSE)
+                        OR COALESCE(LEAD(start_date) OVER (PARTITION BY apartment_id, status
+                                                          ORDER BY start_date, ord) < end_date, FALSE)
+                    WHEN 'NOT_EXISTS' THEN EXISTS (
+                        SELECT 1 FROM Classified Candidate
+                        WHERE Candidate.status = 'OK' AND Candidate.apartment_id = Classified.apartment_id
+                        AND Candidate.ord < Classified.ord
+                        AND Candidate.start_date < Classified.end_date AND Candidate.end_date > Classified.start_date
+                    )
+                    ELSE FALSE
+                END AS conflict
+                FROM Classified
+                ORDER BY ord
+            """)
+            results = [ReturnValue[status] for _, status, _ in result.rows]
+            # replay the conflicting rows in input order against the candidates accepted before them
+            batch = AvailabilityIndex()
+            for i, status, conflict in result.rows:
+                customer_id, apartment_id, start_date, end_date, _ = rows[i]
+                if conflict and not batch.is_available(apartment_id, start_date, end_date):
+                    results[i] = ReturnValue.BAD_PARAMS
+                elif status == 'OK':
+                    batch.add(customer_id, apartment_id, start_date, end_date)
+            accepted = [i for i, value in enumerate(results) if value == ReturnValue.OK]
+            conn.execute("""
+                INSERT INTO Reservations(customer_id, apartment_id, start_date, end_date, total_price)
+                SELECT customer_id, apartment_id, start_date, end_date, total_price
+                FROM ReservationImport WHERE ord = ANY(%s)
+            """, params=(accepted,))
+    except Exception as e:
+        print(e)
+        return [ReturnValue.ERROR] * len(rows)
+    finally:
+        conn.close()
+    if _availability_index is not None:
+        for i in accepted:
+            customer_id, apartment_id, start_date, end_date, _ = rows[i]
+            _availability_index.add(customer_id, apartment_id, start_date, end_date)
+    return results
+
+
+# rows are (customer_id, apartment_id, review_date, rating, review_text). returns a ReturnValue
+# per row, the same as calling customer_reviewed_apartment on the rows one by one in this order:
+# BAD_PARAMS for invalid values, NOT_EXISTS without a stay of the customer that ended by the
+# review date, ALREADY_EXISTS when the customer reviewed the apartment before (or earlier in
+# the batch). the rows are staged, then checked and inserted by a single statement
+@writes("Reviews")
+def import_reviews(rows: List[Tuple[int, int, date, int, str]]) -> List[ReturnValue]:
+    rows = list(rows)
+    if not rows:
+        return []
+    conn = Connector.DBConnector()
+    try:
+        with conn.transaction():
+            _stage_rows(conn, "ReviewImport", [("customer_id", "INTEGER"), ("apartment_id", "INTEGER"),
+                                               ("review_date", "DATE"), ("rating", "INTEGER"),
+                                               ("review_text", "TEXT")], rows)
+            # a review written concurrently by customer_reviewed_apartment wins, ON CONFLICT
+            # reports the batch row as ALREADY_EXISTS instead of failing the whole import
+            _, result = conn.execute("""
+                WITH Classified AS (
+                    SELECT ReviewImport.*, CASE
+                        WHEN customer_id IS NULL OR customer_id <= 0 OR apartment_id IS NULL OR apartment_id <= 0
+                            OR review_date IS NULL OR rating IS NULL OR rating < 1 OR rating > 10
+                            OR review_text IS NULL OR review_text = '' THEN 'BAD_PARAMS'
+                        WHEN NOT EXISTS (
+                            SELECT 1 FROM Reservations
+                            WHERE Reservations.customer_id = ReviewImport.customer_id
+                            AND Reservations.apartment_id = ReviewImport.apartment_id
+                            AND Reservations.end_date <= ReviewImport.review_date
+                        ) THEN 'NOT_EXISTS'
+                        WHEN EXISTS (
+                            SELECT 1 FROM Reviews
+                            WHERE Reviews.customer_id = ReviewImport.customer_id
+                            AND Reviews.apartment_id = ReviewImport.apartment_id
+                        ) THEN 'ALREADY_EXISTS'
+                        ELSE 'OK'
+                    END AS status
+                    FROM ReviewImport
+                ),
+                Ranked AS (
+                    SELECT Classified.*, CASE
+                        WHEN status = 'OK' AND ROW_NUMBER() OVER (PARTITION BY customer_id, apartment_id, status
+                                                                  ORDER BY ord) > 1 THEN 'ALREADY_EXISTS'
+                        ELSE status
+                    END AS result
+                    FROM Classified
+                ),
+                Inserted AS (
+                    INSERT INTO Reviews(customer_id, apartment_id, review_date, rating, review_text)
+                    SELECT customer_id, apartment_id, review_date, rating, review_text
+                    FROM Ranked WHERE result = 'OK'
+                    ON CONFLICT DO NOTHING
+                    RETURNING customer_id, apartment_id
+                )
+                SELECT Ranked.ord, CASE
+                    WHEN Ranked.result = 'OK' AND Inserted.customer_id IS NULL THEN 'ALREADY_EXISTS'
+                    ELSE Ranked.result
+                END
+                FROM Ranked LEFT JOIN Inserted
+                    ON Ranked.result = 'OK' AND Ranked.customer_id = Inserted.customer_id
+                    AND Ranked.apartment_id = Inserted.apartment_id
+                ORDER BY Ranked.ord
+            """)
+    except Exception as e:
+        print(e)
+        return [ReturnValue.ERROR] * len(rows)
+    finally:
+        conn.close()
+    return [ReturnValue[status] for _, status in result.rows]
+
+
+# deletes the rows of table whose id is in ids, with one DELETE ... WHERE id = ANY(ids) per
+# table in one transaction. children are the (table, column) pairs referencing table, they are
+# deleted first the same way, so the cascades find nothing left to delete row by row.
+# returns id -> OK if it existed, NOT_EXISTS if not, BAD_PARAMS for ids that are not positive
+# numbers
+def delete_generic_many(ids: List[int], table: str, children: List[Tuple[str, str]]) -> Dict[int, ReturnValue]:
+    results = {}
+    valid = set()
+    for id in ids:
+        try:
+            if id is not None and id > 0:
+                valid.add(id)
+                continue
+        except TypeError as e:
+            print(e)
+        results[id] = ReturnValue.BAD_PARAMS
+    valid = list(valid)
+    if not valid:
+        return results
+    conn = Connector.DBConnector()
+    try:
+        with conn.transaction():
+            for child, column in children:
+                conn.execute(sql.SQL("DELETE FROM {0} WHERE {1} = ANY(%s)").format(
+                    sql.Identifier(child.lower()), sql.Identifier(column)), params=(valid,))
+            _, result = conn.execute(sql.SQL("DELETE FROM {0} WHERE id = ANY(%s) RETURNING id").format(
+                sql.Identifier(table.lower())), params=(valid,))
+    except Exception as e:
+        print(e)
+        results.update({id: ReturnValue.ERROR for id in valid})
+        return results
+    finally:
+        conn.close()
+    deleted = {row[0] for row in result.rows}
+    results.update({id: ReturnValue.OK if id in deleted else ReturnValue.NOT_EXISTS for id in valid})
+    return results
+
+
+@writes("Owners", "OwnsApartment")
+def delete_owners(owner_ids: List[int]) -> Dict[int, ReturnValue]:
+    return delete_generic_many(owner_ids, "Owners", [("OwnsApartment", "owner_id")])
+
+
+@writes("Customers", "Reservations", "Reviews")
+def delete_customers(customer_ids: List[int]) -> Dict[int, ReturnValue]:
+    results = delete_generic_many(customer_ids, "Customers", [("Reviews", "customer_id"),
+                                                              ("Reservations", "customer_id")])
+    if _availability_index is not None:
+        _availability_index.remove_customers(id for id, result in results.items() if result == ReturnValue.OK)
+    return results
+
+
+@writes("Apartments", "Reservations", "Reviews", "OwnsApartment")
+def delete_apartments(apartment_ids: List[int]) -> Dict[int, ReturnValue]:
+    results = delete_generic_many(apartment_ids, "Apartments", [("Reviews", "apartment_id"),
+                                                                ("Reservations", "apartment_id"),
+                                                                ("OwnsApartment", "apartment_id")])
+    if _availability_index is not None:
+        _availability_index.remove_apartments(id for id, result in results.items() if result == ReturnValue.OK)
+    return results
+
+
+# ---------------------------------- EXPORT API: ----------------------------------
+
+# the tables and views export_table accepts
+EXPORTABLE = TABLES + ("ApartmentRating", "OwnerRating", "OwnersAndApartments", "ApartmentsAndReviews")
+EXPORT_FORMATS = ("csv", "binary")
+
+
+def _export(query: sql.Composable, destination, format: str, params=None) -> ReturnValue:
+    # destination is a path or a file object, see DBConnector.copy_out
+    if format not in EXPORT_FORMATS:
+        return ReturnValue.BAD_PARAMS
+    conn = Connector.DBConnector(read_only=True)
+    try:
+        if isinstance(destination, (str, bytes, os.PathLike)):
+            with open(destination, "wb" if format == "binary" else "w", newline="") as file:
+                conn.copy_out(query, file, binary=format == "binary", params=params)
+        else:
+            conn.copy_out(query, destination, binary=format == "binary", params=params)
+    except Exception as e:
+        print(e)
+        conn.rollback()
+        return ReturnValue.ERROR
+    finally:
+        conn.close()
+    return ReturnValue.OK
+
+
+# streams a whole table (or view) to destination with COPY, in constant memory. CSV has a
+# header line, binary is the PostgreSQL COPY format (COPY ... FROM ... WITH (FORMAT binary)
+# loads it back into the same columns)
+def export_table(table: str, destination, format: str = "csv") -> ReturnValue:
+    names = {name.lower(): name for name in EXPORTABLE}
+    if not isinstance(table, str) or table.lower() not in names:
+        return ReturnValue.BAD_PARAMS
+    query = sql.SQL("SELECT * FROM {0}").format(sql.Identifier(table.lower()))
+    return _export(query, destination, format)
+
+
+# same for the result of any SELECT, e.g. the query of one of the functions above
+def export_query(query, destination, format: str = "csv", params=None) -> ReturnValue:
+    if isinstance(query, str):
+        query = sql.SQL(query)
+    return _export(query, destination, format, params)
+
+
+# ---------------------------------- AVAILABILITY INDEX: ----------------------------------
+
+# when enabled, reservations are mirrored in memory and kept in sync by customer_made_reservation,
+# customer_cancelled_reservation, delete_apartment and delete_customer
+_availability_index = None
+
+
+def enable_availability_index() -> AvailabilityIndex:
+    global _availability_index
+    _availability_index = AvailabilityIndex.load()
+    return _availability_index
+
+
+def disable_availability_index():
+    global _availability_index
+    _availability_index = None
+
+
+def get_availability_index() -> AvailabilityIndex:
+    return _availability_index
+
+
+# ---------------------------------- CHANGE FEED: ----------------------------------
+
+# the tables of the change feed and the primary key columns their notifications carry
+CHANGE_FEED_KEYS = [("Owners", ["id"]), ("Apartments", ["id"]), ("Customers", ["id"]),
+                    ("Reservations", ["customer_id", "apartment_id", "start_date"]),
+                    ("Reviews", ["customer_id", "apartment_id"]),
+                    ("OwnsApartment", ["owner_id", "apartment_id"])]
+
+_change_feed = False
+
+
+# the statement level triggers that call solution_notify_change (migration 4) on every write.
+# building the transition tables and the NOTIFY, whose commit waits for a global lock, cost
+# every write, so they only exist while the change feed is enabled
+def _change_trigger_statements(enabled: bool) -> List[str]:
+    statements = []
+    for table, keys in CHANGE_FEED_KEYS:
+        arguments = ", ".join("'" + key + "'" for key in keys)
+        for operation, transition_tables in [("INSERT", "NEW TABLE AS new_rows"),
+                                             ("UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+                                             ("DELETE", "OLD TABLE AS old_rows"),
+                                             ("TRUNCATE", None)]:
+            trigger = f"{table}_notify_{operation.lower()}"
+            statements.append(f"DROP TRIGGER IF EXISTS {trigger} ON {table}")
+            if enabled:
+                referencing = f"REFERENCING {transition_tables}" if transition_tables else ""
+                statements.append(f"""
+                    CREATE TRIGGER {trigger} AFTER {operation} ON {table} {referencing}
+                    FOR EACH STATEMENT EXECUTE FUNCTION solution_notify_change({arguments})
+                """)
+    return statements
+
+
+def _set_change_triggers(enabled: bool):
+    conn = Connector.DBConnector()
+    try:
+        with conn.transaction():
+            for statement in _change_trigger_statements(enabled):
+                conn.execute(statement)
+    finally:
+        conn.close()
+
+
+# keeps the result cache (Utility/ResultCache.py) and the availability index of this process
+# coherent with the writes of every process, through the notifications of the triggers above
+def _on_change(event: Connector.ChangeEvent):
+    index = _availability_index
+    if event.table is None:
+        ResultCache.clear()
+        if index is not None:
+            index.reload()
+        return
+    ResultCache.invalidate(event.table)
+    if index is None:
+        return
+    if event.table == "reservations":
+        index.reload(None if event.keys is None else [key["apartment_id"] for key in event.keys])
+    elif event.table == "apartments" and event.operation == "DELETE" and event.keys is not None:
+        index.remove_apartments(key["id"] for key in event.keys)
+    elif event.table == "customers" and event.operation == "DELETE" and event.keys is not None:
+        index.remove_customers(key["id"] for key in event.keys)
+    elif event.table in ("apartments", "customers") and event.operation in ("DELETE", "TRUNCATE"):
+        index.reload()
+
+
+# the triggers are per database: enabling the feed in one process makes every write notify,
+# and disabling it stops the notifications for the listeners of all processes
+def enable_change_feed():
+    global _change_feed
+    Connector.get_change_listener().add_callback(_on_change)
+    _set_change_triggers(True)
+    _change_feed = True
+
+
+def disable_change_feed():
+    global _change_feed
+    _change_feed = False
+    Connector.get_change_listener().remove_callback(_on_change)
+    Connector.stop_change_listener()
+    try:
+        _set_change_triggers(False)
+    except Exception as e:
+        print(e)
+
+
+# ---------------------------------- BACKEND: ----------------------------------
+
+# SOLUTION_BACKEND=embedded, set before Solution is first imported, replaces the API above
+# with the in-memory implementation of EmbeddedSolution.py, which needs no database server.
+# SOLUTION_BACKEND=sharded spreads it over the [shard...] databases of database.ini with
+# ShardedSolution.py, which runs the functions above on each shard (import Solution, not
+# ShardedSolution, with this backend)
+BACKEND = os.environ.get("SOLUTION_BACKEND", "postgres")
+if BACKEND == "embedded":
+    from EmbeddedSolution import *
+elif BACKEND == "sharded":
+    from ShardedSolution import *
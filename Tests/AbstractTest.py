@@ -1,12 +1,27 @@
 import unittest
 import Solution as Solution
+import Utility.DBConnector as Connector
+import Utility.ResultCache as ResultCache
 
 
 class AbstractTest(unittest.TestCase):
+    # the whole class shares one connection in test mode, the tables are created once
+    # inside its transaction and everything is rolled back after the last test
+    @classmethod
+    def setUpClass(cls) -> None:
+        Connector.start_test_mode()
+        Solution.create_tables()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        Connector.stop_test_mode()
+
     # before each test, setUp is executed
     def setUp(self) -> None:
-        Solution.create_tables()
+        Connector.begin_test()
 
-    # after each test, tearDown is executed
+    # after each test, tearDown is executed: undo everything the test did,
+    # including cached results of the data it rolls back
     def tearDown(self) -> None:
-        Solution.drop_tables()
+        Connector.rollback_test()
+        ResultCache.clear()
@@ -0,0 +1,45 @@
+import contextlib
+import unittest
+from unittest import mock
+import psycopg2
+import Solution as Solution
+import Utility.DBConnector as Connector
+
+
+# outside test mode, on committed tables: another connection commits while a loader is
+# between its queries, the loader has to read one consistent snapshot
+class ConcurrentWriteTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        Solution.create_tables()
+
+    @classmethod
+    def tearDownClass(cls):
+        Solution.drop_tables()
+
+    def tearDown(self):
+        Solution.clear_tables()
+
+    # commits statements on a connection of its own just before the stream-th
+    # DBConnector.stream of the block starts
+    @contextlib.contextmanager
+    def commit_before_stream(self, statements, stream=1):
+        original = Connector.DBConnector.stream
+        calls = []
+
+        def patched(conn, *args, **kwargs):
+            calls.append(1)
+            if len(calls) == stream:
+                writer = psycopg2.connect(**Connector.DBConnector._DBConnector__config())
+                try:
+                    with writer.cursor() as cursor:
+                        for statement in statements:
+                            cursor.execute(statement)
+                    writer.commit()
+                finally:
+                    writer.close()
+            return original(conn, *args, **kwargs)
+
+        with mock.patch.object(Connector.DBConnector, "stream", patched):
+            yield
+        self.assertGreaterEqual(len(calls), stream)
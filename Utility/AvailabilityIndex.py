@@ -0,0 +1,172 @@
+import bisect
+import threading
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import Utility.DBConnector as Connector
+
+
+class _ApartmentCalendar:
+    # the reservations of one apartment, sorted by start date. reservations never
+    # overlap, so the end dates are sorted as well
+    def __init__(self):
+        self.starts: List[date] = []
+        self.ends: List[date] = []
+        self.customers: List[int] = []
+
+    def insert(self, customer_id: int, start: date, end: date):
+        i = bisect.bisect_left(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.customers.insert(i, customer_id)
+
+    def pop(self, i: int):
+        del self.starts[i]
+        del self.ends[i]
+        del self.customers[i]
+
+
+# in-process index of the Reservations table, answering availability questions
+# without a database round trip. stays are half-open: [start_date, end_date), so a
+# stay may start on the day the previous one ends, exactly like customer_made_reservation.
+# the index only sees what it is told: Solution keeps it in sync when it is enabled
+# (Solution.enable_availability_index), writes of other processes are not seen.
+class AvailabilityIndex:
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__calendars: Dict[int, _ApartmentCalendar] = {}
+
+    # builds an index of everything currently in Reservations
+    @staticmethod
+    def load() -> 'AvailabilityIndex':
+        index = AvailabilityIndex()
+        index.reload()
+        return index
+
+    # reads the reservations of the given apartments (all when None) from the database again
+    def reload(self, apartment_ids: Iterable[int] = None):
+        conn = Connector.DBConnector()
+        try:
+            if apartment_ids is None:
+                _, result = conn.execute("""
+                    SELECT customer_id, apartment_id, start_date, end_date
+                    FROM Reservations
+                    ORDER BY apartment_id, start_date
+                """)
+            else:
+                apartment_ids = list(set(apartment_ids))
+                _, result = conn.execute("""
+                    SELECT customer_id, apartment_id, start_date, end_date
+                    FROM Reservations
+                    WHERE apartment_id = ANY(%s)
+                    ORDER BY apartment_id, start_date
+                """, params=(apartment_ids,))
+        finally:
+            conn.close()
+        calendars = {}
+        for customer_id, apartment_id, start, end in result.rows:
+            calendar = calendars.get(apartment_id)
+            if calendar is None:
+                calendar = calendars[apartment_id] = _ApartmentCalendar()
+            calendar.starts.append(start)
+            calendar.ends.append(end)
+            calendar.customers.append(customer_id)
+        with self.__lock:
+            if apartment_ids is None:
+                self.__calendars = calendars
+            else:
+                for apartment_id in apartment_ids:
+                    self.__calendars.pop(apartment_id, None)
+                self.__calendars.update(calendars)
+
+    def add(self, customer_id: int, apartment_id: int, start: date, end: date):
+        with self.__lock:
+            calendar = self.__calendars.get(apartment_id)
+            if calendar is None:
+                calendar = self.__calendars[apartment_id] = _ApartmentCalendar()
+            calendar.insert(customer_id, start, end)
+
+    # removes the reservation of customer_id starting at start, returns whether there was one
+    def remove(self, customer_id: int, apartment_id: int, start: date) -> bool:
+        with self.__lock:
+            calendar = self.__calendars.get(apartment_id)
+            if calendar is None:
+                return False
+            i = bisect.bisect_left(calendar.starts, start)
+            while i < len(calendar.starts) and calendar.starts[i] == start:
+                if calendar.customers[i] == customer_id:
+                    calendar.pop(i)
+                    return True
+                i += 1
+            return False
+
+    # forgets every reservation, for tables that were emptied or dropped
+    def clear(self):
+        with self.__lock:
+            self.__calendars = {}
+
+    def remove_apartment(self, apartment_id: int):
+        self.remove_apartments([apartment_id])
+
+    def remove_apartments(self, apartment_ids: Iterable[int]):
+        with self.__lock:
+            for apartment_id in apartment_ids:
+                self.__calendars.pop(apartment_id, None)
+
+    def remove_customer(self, customer_id: int):
+        self.remove_customers([customer_id])
+
+    # one pass over all calendars, whatever the number of customers
+    def remove_customers(self, customer_ids: Iterable[int]):
+        customer_ids = set(customer_ids)
+        with self.__lock:
+            for calendar in self.__calendars.values():
+                for i in reversed(range(len(calendar.customers))):
+                    if calendar.customers[i] in customer_ids:
+                        calendar.pop(i)
+
+    # the apartments with reservations in the index
+    def apartments(self) -> List[int]:
+        with self.__lock:
+            return list(self.__calendars)
+
+    def reservations(self, apartment_id: int) -> List[Tuple[int, date, date]]:
+        with self.__lock:
+            calendar = self.__calendars.get(apartment_id)
+            if calendar is None:
+                return []
+            return list(zip(calendar.customers, calendar.starts, calendar.ends))
+
+    # is the apartment free for [start, end)? O(log n) in the apartment's reservations
+    def is_available(self, apartment_id: int, start: date, end: date) -> bool:
+        if start is None or end is None or start >= end:
+            return False
+        with self.__lock:
+            calendar = self.__calendars.get(apartment_id)
+            if calendar is None:
+                return True
+            # the last stay starting before end is the only one that can reach past start
+            i = bisect.bisect_left(calendar.starts, end)
+            return i == 0 or calendar.ends[i - 1] <= start
+
+    # first start date, on or after the given day (default today), of a gap of at
+    # least nights free nights. finding the position is O(log n), then it walks the
+    # following stays until one of the gaps is long enough
+    def next_free_window(self, apartment_id: int, nights: int, after: Optional[date] = None) -> Optional[date]:
+        if nights is None or nights <= 0:
+            return None
+        candidate = after if after is not None else date.today()
+        length = timedelta(days=nights)
+        with self.__lock:
+            calendar = self.__calendars.get(apartment_id)
+            if calendar is None:
+                return candidate
+            i = bisect.bisect_right(calendar.starts, candidate)
+            if i > 0 and calendar.ends[i - 1] > candidate:
+                candidate = calendar.ends[i - 1]
+            while i < len(calendar.starts):
+                if calendar.starts[i] - candidate >= length:
+                    return candidate
+                candidate = max(candidate, calendar.ends[i])
+                i += 1
+            return candidate
@@ -1,9 +1,17 @@
 import psycopg2
+import psycopg2.extensions
 from psycopg2 import errors, sql
 from configparser import ConfigParser
 from Utility.Exceptions import DatabaseException
 import os
-from typing import Union
+import json
+import select
+import time
+import threading
+import logging
+from contextlib import contextmanager
+import itertools
+from typing import Union, Callable, List, Optional, Iterable, Iterator, Dict
 
 
 class ResultSetDict(dict):
@@ -28,15 +36,10 @@ class ResultSet:
 
     # so you can use print(ResultSet)
     def __str__(self):
-        string = ""
-        for col in self.cols_header:
-            string += str(col) + "   "
-        string += '\n'
+        lines = ["".join(str(col) + "   " for col in self.cols_header)]
         for row in self.rows:
-            for val in row:
-                string += str(val) + "   "
-            string += '\n'
-        return string
+            lines.append("".join(str(val) + "   " for val in row))
+        return "\n".join(lines) + "\n"
 
     def __iter__(self):
         for row in range(len(self.rows)):
@@ -70,54 +73,477 @@ class ResultSet:
                 self.cols[col] = index
 
 
+class QueryTrace:
+    # what a single DBConnector.execute call did, handed to the execute hooks.
+    # duration (seconds), rowcount and result_size are None in the before hooks,
+    # connector is the DBConnector that ran it
+    def __init__(self, query: str, params=None, connector: 'DBConnector' = None):
+        self.query = query
+        self.params = params
+        self.connector = connector
+        self.duration = None
+        self.rowcount = None
+        self.result_size = None
+        self.error = None
+
+    def __str__(self):
+        return f'{self.duration}s rows={self.rowcount} result={self.result_size}: {self.query}'
+
+
+# hooks run around every DBConnector.execute, see add_execute_hook
+_before_hooks: List[Callable[[QueryTrace], None]] = []
+_after_hooks: List[Callable[[QueryTrace], None]] = []
+
+
+# register a hook, before hooks get the trace with only query and params filled,
+# after hooks also get duration, rowcount, result_size (and error if the query failed)
+def add_execute_hook(before: Optional[Callable[[QueryTrace], None]] = None,
+                     after: Optional[Callable[[QueryTrace], None]] = None):
+    if before is not None:
+        _before_hooks.append(before)
+    if after is not None:
+        _after_hooks.append(after)
+
+
+def remove_execute_hook(hook: Callable[[QueryTrace], None]):
+    for hooks in (_before_hooks, _after_hooks):
+        if hook in hooks:
+            hooks.remove(hook)
+
+
+def _run_hooks(hooks, trace: QueryTrace):
+    for hook in list(hooks):
+        try:
+            hook(trace)
+        except Exception as e:
+            # a broken hook must never break the query itself
+            print(e)
+
+
+class SlowQueryLogger:
+    # after hook that logs every statement slower than threshold_ms, and optionally
+    # the EXPLAIN (ANALYZE, BUFFERS) of it, see DBConnector.explain
+    def __init__(self, threshold_ms: float = 100, explain: bool = False, logger: logging.Logger = None):
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.logger = logger if logger is not None else logging.getLogger("DBConnector.slow_queries")
+        self.slow_queries: List[QueryTrace] = []
+
+    def __call__(self, trace: QueryTrace):
+        if trace.duration is None or trace.duration * 1000 < self.threshold_ms:
+            return
+        self.slow_queries.append(trace)
+        self.logger.warning("slow query (%.1f ms, %s rows): %s", trace.duration * 1000, trace.rowcount, trace.query)
+        if self.explain and trace.error is None and trace.connector is not None:
+            try:
+                plan = trace.connector.explain(trace.query)
+            except Exception as e:
+                print(e)
+                return
+            self.logger.warning("plan:\n%s", plan)
+
+    def install(self):
+        add_execute_hook(after=self)
+        return self
+
+    def uninstall(self):
+        remove_execute_hook(self)
+
+
+class _CopyStream:
+    # file-like object that renders rows in COPY text format as psycopg2 reads it
+    def __init__(self, rows: Iterable[tuple]):
+        self.rows = iter(rows)
+        self.buffer = ""
+        self.count = 0
+
+    @staticmethod
+    def _format(value) -> str:
+        if value is None:
+            return "\\N"
+        return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+    def read(self, size: int = 8192) -> str:
+        parts = [self.buffer]
+        length = len(self.buffer)
+        for row in self.rows:
+            line = "\t".join(_CopyStream._format(value) for value in row) + "\n"
+            parts.append(line)
+            length += len(line)
+            self.count += 1
+            if length >= size:
+                break
+        data = "".join(parts)
+        self.buffer = data[size:]
+        return data[:size]
+
+
+# read replicas: DBConnector(read_only=True) connects to one of the replicas, in round
+# robin, instead of the primary. replicas are the database.ini sections whose name starts
+# with "replica" (any keys psycopg2.connect takes, like the postgresql section). with
+# read_your_writes_seconds > 0 (section [routing]), a thread that wrote to the primary
+# reads from the primary for that long, so it never misses its own writes on a lagging replica.
+class ReplicaRouter:
+    PRIMARY = "postgresql"
+
+    # a replica is a database.ini section name or a dict of connection parameters
+    def __init__(self, replicas: List[Union[str, Dict[str, str]]] = None, read_your_writes_seconds: float = 0.0):
+        self.replicas = list(replicas) if replicas else []
+        self.read_your_writes_seconds = read_your_writes_seconds
+        self.__next = itertools.count()
+        self.__last_write = threading.local()
+
+    @staticmethod
+    def from_config(parser: ConfigParser) -> 'ReplicaRouter':
+        replicas = [section for section in parser.sections() if section.lower().startswith("replica")]
+        seconds = parser.getfloat("routing", "read_your_writes_seconds", fallback=0.0)
+        return ReplicaRouter(replicas, seconds)
+
+    # where a connection should go, a section name or connection parameters
+    def target(self, read_only: bool) -> Union[str, Dict[str, str]]:
+        if not read_only or not self.replicas:
+            return ReplicaRouter.PRIMARY
+        if self.read_your_writes_seconds > 0:
+            last_write = getattr(self.__last_write, "time", None)
+            if last_write is not None and time.monotonic() - last_write < self.read_your_writes_seconds:
+                return ReplicaRouter.PRIMARY
+        return self.replicas[next(self.__next) % len(self.replicas)]
+
+    def record_write(self):
+        if self.read_your_writes_seconds > 0:
+            self.__last_write.time = time.monotonic()
+
+
+_router = None
+
+
+def get_router() -> ReplicaRouter:
+    global _router
+    if _router is None:
+        _router = ReplicaRouter.from_config(DBConnector._DBConnector__parser())
+    return _router
+
+
+# replaces the replicas of database.ini, e.g. for tests. configure_replicas() sends
+# everything to the primary again
+def configure_replicas(replicas: List[Union[str, Dict[str, str]]] = None, read_your_writes_seconds: float = 0.0):
+    global _router
+    _router = ReplicaRouter(replicas, read_your_writes_seconds)
+
+
+# per thread database override, see use_database
+_thread_targets = threading.local()
+
+
+# the DBConnector()s the calling thread opens inside the block go to target, a database.ini
+# section name or a dict of connection parameters, instead of where the ReplicaRouter sends
+# them. test mode still takes precedence. ShardedSolution.py runs the Solution functions on
+# one shard this way
+@contextmanager
+def use_database(target: Union[str, Dict[str, str]]):
+    previous = getattr(_thread_targets, "target", None)
+    _thread_targets.target = target
+    try:
+        yield
+    finally:
+        _thread_targets.target = previous
+
+
+# connection reuse, see enable_connection_reuse
+_reuse_connections = False
+_thread_connections = threading.local()
+
+
+# with reuse enabled every thread keeps one open connection per database: DBConnector()
+# takes the calling thread's connection instead of opening a new one, and close() rolls back
+# whatever was left uncommitted and keeps it for the next DBConnector() of that thread.
+# the kept connection has one user at a time: a DBConnector() opened while another one of
+# the thread still has it (nested, e.g. inside a transaction()) gets a connection of its own,
+# so it never commits or rolls back the outer one's transaction.
+# meant for long running (e.g. threaded WSGI) workers, call it once at startup
+def enable_connection_reuse(enabled: bool = True):
+    global _reuse_connections
+    _reuse_connections = enabled
+
+
+# closes the calling thread's kept connection, if any
+def release_thread_connection():
+    connections = getattr(_thread_connections, "connections", {})
+    _thread_connections.connections = {}
+    _thread_connections.checked_out = set()
+    for connection in connections.values():
+        if not connection.closed:
+            connection.close()
+
+
+# test mode, see start_test_mode
+_test_connection = None
+_test_lock = threading.RLock()
+
+
+# test mode: every DBConnector() (in any thread) uses one shared connection whose
+# transaction is never committed. each statement runs in its own savepoint, so a failing
+# statement does not abort the transaction, and commit()/rollback()/close() of a DBConnector
+# do nothing. begin_test() / rollback_test() put a test inside a savepoint and undo all it
+# did, and stop_test_mode() rolls back everything, including tables created in test mode.
+def start_test_mode():
+    global _test_connection
+    if _test_connection is not None:
+        return
+    try:
+        _test_connection = psycopg2.connect(**DBConnector._DBConnector__config())
+        _test_connection.autocommit = False
+    except Exception:
+        _test_connection = None
+        raise DatabaseException.ConnectionInvalid("Could not connect to database")
+
+
+def stop_test_mode():
+    global _test_connection
+    if _test_connection is None:
+        return
+    with _test_lock:
+        try:
+            _test_connection.rollback()
+        finally:
+            _test_connection.close()
+            _test_connection = None
+
+
+def in_test_mode() -> bool:
+    return _test_connection is not None
+
+
+def begin_test():
+    with _test_lock:
+        with _test_connection.cursor() as cursor:
+            cursor.execute("SAVEPOINT solution_test")
+
+
+def rollback_test():
+    with _test_lock:
+        with _test_connection.cursor() as cursor:
+            cursor.execute("ROLLBACK TO SAVEPOINT solution_test")
+            cursor.execute("RELEASE SAVEPOINT solution_test")
+
+
+# thread safety:
+# - a DBConnector may be shared by several threads. every thread gets its own cursor,
+#   and execute (the statement, its commit and fetching the results) runs under the
+#   instance lock, so statements of different threads never interleave on the connection.
+# - a transaction spans the whole connection, so threads sharing an instance also share
+#   commits and rollbacks. work that needs its own transaction should use its own
+#   DBConnector, which with enable_connection_reuse() costs no new connection.
 class DBConnector:
-    # constructor
-    def __init__(self):
+    # constructor, read_only connections may go to a read replica (see ReplicaRouter),
+    # serializable ones run their transactions at SERIALIZABLE isolation. a serializable
+    # statement may then fail with SERIALIZATION_FAILURE and has to be retried (see Utility/Retry.py)
+    def __init__(self, read_only: bool = False, serializable: bool = False):
+        self._lock = threading.RLock()
+        self._cursors = {}
+        self._reused = False
+        self._shared = False
+        self._in_transaction = False
+        self._read_only = read_only
+        self._serializable = serializable
+        if _test_connection is not None:
+            # the test transaction is already running, its isolation level cannot change
+            self.connection = _test_connection
+            self._lock = _test_lock
+            self._shared = True
+            return
         try:
+            target = getattr(_thread_targets, "target", None)
+            if target is None:
+                target = get_router().target(read_only)
+            key = target if isinstance(target, str) else tuple(sorted(target.items()))
+            if _reuse_connections:
+                if not hasattr(_thread_connections, "connections"):
+                    _thread_connections.connections = {}
+                    _thread_connections.checked_out = set()
+                connection = _thread_connections.connections.get(key)
+                if connection is not None and not connection.closed and key not in _thread_connections.checked_out:
+                    self.connection = connection
+                    self.__check_out(key)
+                    self.__set_isolation()
+                    return
             # Obtain the configuration parameters
-            params = DBConnector.__config()
+            params = DBConnector.__config(section=target) if isinstance(target, str) else target
             self.connection = psycopg2.connect(**params)
             self.connection.autocommit = False
-            self.cursor = self.connection.cursor()
+            self.__set_isolation()
+            if _reuse_connections and key not in _thread_connections.checked_out:
+                # kept for the thread, unless the kept one is in use: then this one is
+                # closed by close() like without reuse
+                _thread_connections.connections[key] = self.connection
+                self.__check_out(key)
         except Exception as e:
             self.connection = None
-            self.cursor = None
             raise DatabaseException.ConnectionInvalid("Could not connect to database")
 
+    def __check_out(self, key):
+        self._reused = True
+        self._reuse_key = key
+        # the kept connections and checked out keys of the thread that opened it, close()
+        # may run in another thread
+        self._kept = _thread_connections.connections
+        self._checked_out = _thread_connections.checked_out
+        self._checked_out.add(key)
+
+    def __set_isolation(self):
+        if self._serializable:
+            self.connection.isolation_level = psycopg2.extensions.ISOLATION_LEVEL_SERIALIZABLE
+
+    # the calling thread's cursor on this connection
+    @property
+    def cursor(self):
+        if self.connection is None:
+            return None
+        thread = threading.get_ident()
+        cursor = self._cursors.get(thread)
+        if cursor is None or cursor.closed:
+            cursor = self.connection.cursor()
+            self._cursors[thread] = cursor
+        return cursor
+
     # close connection
     def close(self):
-        if self.cursor is not None:
-            self.cursor.close()
-        if self.connection is not None:
-            self.connection.close()
+        with self._lock:
+            for cursor in self._cursors.values():
+                cursor.close()
+            self._cursors.clear()
+            if self.connection is None:
+                return
+            if self._shared:
+                self.connection = None
+                return
+            if self._reused:
+                self._checked_out.discard(self._reuse_key)
+            if self._reused and not self.connection.closed:
+                # keep the thread's connection, without what this user left uncommitted
+                try:
+                    self.connection.rollback()
+                    if self._serializable:
+                        self.connection.isolation_level = psycopg2.extensions.ISOLATION_LEVEL_DEFAULT
+                except Exception:
+                    # broken, the thread opens a new one next time. only this one is
+                    # dropped, the thread's others may be checked out by other DBConnectors
+                    if self._kept.get(self._reuse_key) is self.connection:
+                        del self._kept[self._reuse_key]
+                    self.connection.close()
+            else:
+                self.connection.close()
+            self.connection = None
 
     # commit connection's changes
     def commit(self):
-        if self.connection is not None:
+        if self.connection is not None and not self._shared and not self._in_transaction:
             try:
-                self.connection.commit()
+                with self._lock:
+                    self.connection.commit()
+            except errors.lookup("40001"):
+                # at SERIALIZABLE a conflict may only be detected at commit
+                raise DatabaseException.SERIALIZATION_FAILURE("SERIALIZATION_FAILURE")
             except Exception:
                 raise DatabaseException.ConnectionInvalid("Could not commit changes")
 
+    # run several statements as one transaction: execute() does not commit inside the
+    # block, everything is committed at its end or rolled back if it raises.
+    # other threads sharing this DBConnector wait until the block is done
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            self._in_transaction = True
+            try:
+                yield self
+            except Exception:
+                self._in_transaction = False
+                self.rollback()
+                raise
+            self._in_transaction = False
+            self.commit()
+
+    # a transaction() at REPEATABLE READ: every statement of the block, including streams,
+    # sees the database as of its first statement. for readers that combine several
+    # queries, so rows committed between them cannot refer to rows the earlier ones missed.
+    # in test mode the block is part of the running test transaction
+    @contextmanager
+    def snapshot(self):
+        with self.transaction():
+            if not self._shared:
+                self.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            yield self
+
     # rollback connection's changes
     def rollback(self):
-        if self.connection is not None:
+        if self.connection is not None and not self._shared:
             try:
-                self.connection.rollback()
+                with self._lock:
+                    self.connection.rollback()
             except Exception:
                 raise DatabaseException.ConnectionInvalid("Could not rollback changes")
 
     # executes the query, if it is SELECT you may ask to print the results with printSchema
+    # params are passed to psycopg2 for %s placeholders in the query
     # returns the number of rows effected and a ResultSet (for SELECT)
-    def execute(self, query: Union[str, sql.Composed], printSchema=False) -> (int, ResultSet):
+    def execute(self, query: Union[str, sql.Composed], printSchema=False, params=None) -> (int, ResultSet):
         if self.connection is None:
             raise DatabaseException.ConnectionInvalid("Connection Invalid")
 
+        trace = None
+        if _before_hooks or _after_hooks:
+            trace = QueryTrace(self.__render(query, params), params, self)
+            _run_hooks(_before_hooks, trace)
+            start = time.perf_counter()
+
+        try:
+            row_effected, entries = self.__execute(query, params)
+        except Exception as e:
+            if trace is not None:
+                trace.duration = time.perf_counter() - start
+                trace.error = e
+                _run_hooks(_after_hooks, trace)
+            raise
+
+        if trace is not None:
+            trace.duration = time.perf_counter() - start
+            trace.rowcount = row_effected
+            trace.result_size = entries.size()
+            _run_hooks(_after_hooks, trace)
+
+        # print SELECT entries
+        if printSchema:
+            print(entries)
+
+        return row_effected, entries
+
+    def __execute(self, query, params) -> (int, ResultSet):
+        with self._lock:
+            return self.__execute_locked(query, params)
+
+    def __execute_locked(self, query, params) -> (int, ResultSet):
+        cursor = self.cursor
         # try execute the query
         try:
-            self.cursor.execute(query)
-            row_effected = max(self.cursor.rowcount, 0)
+            if self._shared:
+                cursor.execute("SAVEPOINT solution_statement")
+            try:
+                cursor.execute(query, params)
+                row_effected = max(cursor.rowcount, 0)
+                # get entries in case of SELECT
+                if cursor.description is not None:
+                    entries = ResultSet(cursor.description, cursor.fetchall())
+                else:
+                    entries = ResultSet()
+            except Exception:
+                if self._shared:
+                    cursor.execute("ROLLBACK TO SAVEPOINT solution_statement")
+                raise
+            if self._shared:
+                cursor.execute("RELEASE SAVEPOINT solution_statement")
             self.commit()
+            if not self._read_only:
+                get_router().record_write()
         except errors.lookup("23502"):
             raise DatabaseException.NOT_NULL_VIOLATION("NOT_NULL_VIOLATION")
         except errors.lookup("23503"):
@@ -126,18 +552,108 @@ class DBConnector:
             raise DatabaseException.UNIQUE_VIOLATION("UNIQUE_VIOLATION")
         except errors.lookup("23514"):
             raise DatabaseException.CHECK_VIOLATION("CHECK_VIOLATION")
+        except errors.lookup("40001"):
+            raise DatabaseException.SERIALIZATION_FAILURE("SERIALIZATION_FAILURE")
+        except errors.lookup("40P01"):
+            raise DatabaseException.DEADLOCK_DETECTED("DEADLOCK_DETECTED")
 
-        # get entries in case of SELECT
-        if self.cursor.description is not None:
-            entries = ResultSet(self.cursor.description, self.cursor.fetchall())
-        else:
-            entries = ResultSet()
+        return row_effected, entries
 
-        # print SELECT entries
-        if printSchema:
-            print(entries)
+    # the EXPLAIN (ANALYZE, BUFFERS) plan of query, which runs again for it. it runs on this
+    # connection, so on its database and inside its transaction (with the locks it holds)
+    # or the test transaction, in a savepoint that is always rolled back, so explaining a
+    # write changes nothing
+    def explain(self, query: str) -> str:
+        if self.connection is None:
+            raise DatabaseException.ConnectionInvalid("Connection Invalid")
+        with self._lock:
+            cursor = self.cursor
+            cursor.execute("SAVEPOINT solution_explain")
+            try:
+                cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + query)
+                return "\n".join(row[0] for row in cursor.fetchall())
+            finally:
+                cursor.execute("ROLLBACK TO SAVEPOINT solution_explain")
+                cursor.execute("RELEASE SAVEPOINT solution_explain")
+                if not self._shared and not self._in_transaction:
+                    # the savepoint opened a transaction of its own, end it
+                    self.connection.rollback()
 
-        return row_effected, entries
+    # runs a SELECT on a server side cursor and yields its rows in lists of up to
+    # chunk_size, so results larger than memory can be processed. the rows are read
+    # in one transaction, which is committed once the generator is exhausted or closed
+    def stream(self, query: Union[str, sql.Composed], params=None, chunk_size: int = 10000) -> Iterator[list]:
+        if self.connection is None:
+            raise DatabaseException.ConnectionInvalid("Connection Invalid")
+        cursor = self.connection.cursor(name="stream_%d_%d" % (id(self), threading.get_ident()))
+        try:
+            with self._lock:
+                cursor.execute(query, params)
+            while True:
+                with self._lock:
+                    rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+            self.commit()
+
+    # bulk load rows (tuples) into table with COPY FROM STDIN and commit.
+    # rows may be any iterable, it is consumed in chunks so memory stays constant
+    def copy_rows(self, table: str, columns: List[str], rows: Iterable[tuple]) -> int:
+        if self.connection is None:
+            raise DatabaseException.ConnectionInvalid("Connection Invalid")
+        query = sql.SQL("COPY {table} ({columns}) FROM STDIN").format(
+            table=sql.Identifier(table.lower()),
+            columns=sql.SQL(", ").join(sql.Identifier(c.lower()) for c in columns))
+        stream = _CopyStream(rows)
+        with self._lock:
+            self.cursor.copy_expert(query, stream)
+            self.commit()
+        return stream.count
+
+    # writes the result of a SELECT to file with COPY TO STDOUT, as CSV (with a header line)
+    # or in the PostgreSQL binary COPY format, which COPY FROM reads back. the server sends the
+    # rows in chunks that go straight to file.write, so memory stays constant whatever the size.
+    # file may be a text or binary file object (binary only for the binary format).
+    # returns the number of rows written
+    def copy_out(self, query: Union[str, sql.Composed], file, binary: bool = False, params=None) -> int:
+        if self.connection is None:
+            raise DatabaseException.ConnectionInvalid("Connection Invalid")
+        options = "FORMAT binary" if binary else "FORMAT csv, HEADER true"
+        with self._lock:
+            copy = sql.SQL("COPY ({query}) TO STDOUT WITH ({options})").format(
+                query=sql.SQL(self.__render(query, params)), options=sql.SQL(options))
+            cursor = self.cursor
+            if self._shared:
+                cursor.execute("SAVEPOINT solution_statement")
+            try:
+                cursor.copy_expert(copy, file)
+            except Exception:
+                if self._shared:
+                    cursor.execute("ROLLBACK TO SAVEPOINT solution_statement")
+                raise
+            if self._shared:
+                cursor.execute("RELEASE SAVEPOINT solution_statement")
+            self.commit()
+        return cursor.rowcount
+
+    # the SQL text as the server will see it, with params substituted
+    def __render(self, query, params) -> str:
+        try:
+            return self.cursor.mogrify(query, params).decode()
+        except Exception:
+            return query.as_string(self.connection) if isinstance(query, sql.Composable) else str(query)
+
+    # the parsed database.ini, from the same places __config looks
+    @staticmethod
+    def __parser() -> ConfigParser:
+        parser = ConfigParser()
+        for directory in (os.getcwd(), os.path.dirname(os.getcwd())):
+            if parser.read(os.path.join(os.path.join(directory, "Utility"), 'database.ini')):
+                break
+        return parser
 
     # grant credentials
     @staticmethod
@@ -161,3 +677,126 @@ class DBConnector:
             if db is None:
                 raise DatabaseException.database_ini_ERROR("Please modify database.ini file under Utility")
         return db
+
+
+# a change reported on the change feed: table (lower case), operation (INSERT, UPDATE,
+# DELETE or TRUNCATE) and the primary keys of the changed rows as dicts, or None when they
+# are unknown (too many rows, TRUNCATE). a ChangeEvent with table None means notifications
+# may have been lost (the listener reconnected), anything derived from the tables is suspect
+class ChangeEvent:
+    def __init__(self, table: Optional[str], operation: Optional[str], keys: Optional[List[Dict]], pid: int = 0):
+        self.table = table
+        self.operation = operation
+        self.keys = keys
+        # backend process of the writing connection
+        self.pid = pid
+
+    def __repr__(self):
+        return "ChangeEvent(%r, %r, %r)" % (self.table, self.operation, self.keys)
+
+
+# listens on a NOTIFY channel on its own connection, in a background thread, and passes
+# every change to the registered callbacks. the notifications are sent by triggers on the
+# Solution tables (Solution.enable_change_feed) when the writing transaction commits, so every
+# process sees the committed writes of all processes, its own included
+class ChangeListener:
+    CHANNEL = "solution_changes"
+
+    # section is a database.ini section name or a dict of connection parameters
+    def __init__(self, channel: str = CHANNEL, section: Union[str, Dict[str, str]] = ReplicaRouter.PRIMARY,
+                 poll_seconds: float = 1.0):
+        self.channel = channel
+        self.section = section
+        self.poll_seconds = poll_seconds
+        self.__callbacks: List[Callable[[ChangeEvent], None]] = []
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+        self.__thread = None
+        self.__connection = None
+
+    def add_callback(self, callback: Callable[[ChangeEvent], None]):
+        with self.__lock:
+            self.__callbacks.append(callback)
+
+    def remove_callback(self, callback: Callable[[ChangeEvent], None]):
+        with self.__lock:
+            if callback in self.__callbacks:
+                self.__callbacks.remove(callback)
+
+    def start(self):
+        if self.__thread is not None:
+            return
+        # connect here, so a bad configuration fails the caller instead of the thread
+        self.__connect()
+        self.__stop.clear()
+        self.__thread = threading.Thread(target=self.__run, name="ChangeListener", daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        if self.__thread is None:
+            return
+        self.__stop.set()
+        self.__thread.join()
+        self.__thread = None
+        self.__disconnect()
+
+    def running(self) -> bool:
+        return self.__thread is not None
+
+    def __connect(self):
+        params = self.section if isinstance(self.section, dict) else DBConnector._DBConnector__config(section=self.section)
+        self.__connection = psycopg2.connect(**params)
+        self.__connection.autocommit = True
+        with self.__connection.cursor() as cursor:
+            cursor.execute(sql.SQL("LISTEN {0}").format(sql.Identifier(self.channel)))
+
+    def __disconnect(self):
+        if self.__connection is not None and not self.__connection.closed:
+            self.__connection.close()
+        self.__connection = None
+
+    def __run(self):
+        while not self.__stop.is_set():
+            try:
+                if self.__connection is None:
+                    self.__connect()
+                    # whatever was sent while we were away is lost
+                    self.__dispatch(ChangeEvent(None, None, None))
+                if select.select([self.__connection], [], [], self.poll_seconds) == ([], [], []):
+                    continue
+                self.__connection.poll()
+                while self.__connection.notifies:
+                    notify = self.__connection.notifies.pop(0)
+                    payload = json.loads(notify.payload)
+                    self.__dispatch(ChangeEvent(payload["table"], payload["operation"], payload["keys"], notify.pid))
+            except Exception as e:
+                print(e)
+                self.__disconnect()
+                self.__stop.wait(self.poll_seconds)
+
+    def __dispatch(self, event: ChangeEvent):
+        with self.__lock:
+            callbacks = list(self.__callbacks)
+        for callback in callbacks:
+            try:
+                callback(event)
+            except Exception as e:
+                print(e)
+
+
+_change_listener = None
+
+
+# the process wide listener, started on first use
+def get_change_listener() -> ChangeListener:
+    global _change_listener
+    if _change_listener is None:
+        _change_listener = ChangeListener()
+    if not _change_listener.running():
+        _change_listener.start()
+    return _change_listener
+
+
+def stop_change_listener():
+    if _change_listener is not None:
+        _change_listener.stop()
@@ -23,6 +23,12 @@ class DatabaseException(_Exceptions):
     class CHECK_VIOLATION(_Exceptions):
         pass
 
+    class SERIALIZATION_FAILURE(_Exceptions):
+        pass
+
+    class DEADLOCK_DETECTED(_Exceptions):
+        pass
+
     class database_ini_ERROR(_Exceptions):
         pass
 
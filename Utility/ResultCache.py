@@ -0,0 +1,111 @@
+import copy
+import functools
+import threading
+import time
+from typing import Callable, Dict, Iterable
+
+# results of read functions kept in memory, keyed by function and arguments. every entry
+# depends on a set of tables (@cached(depends_on=...)) and is dropped as soon as a write to
+# one of them is reported, by a @writes function or invalidate(). an optional ttl (seconds)
+# also bounds the age of an entry, for writes the cache cannot see (other processes).
+# off until enable_cache() is called, then with cache disabled again everything is forgotten.
+
+_enabled = False
+_default_ttl = None
+# key -> (value, expiry time or None, tables)
+_entries: Dict[tuple, tuple] = {}
+# table -> number of reported writes. a result is only stored if no write to its tables was
+# reported while it was computed, so a read racing a write never caches the old data
+_generations: Dict[str, int] = {}
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+_lock = threading.Lock()
+
+
+def enable_cache(ttl: float = None):
+    global _enabled, _default_ttl
+    with _lock:
+        _enabled = True
+        _default_ttl = ttl
+
+
+def disable_cache():
+    global _enabled
+    with _lock:
+        _enabled = False
+    clear()
+
+
+def cache_enabled() -> bool:
+    return _enabled
+
+
+# forgets every entry and resets the statistics
+def clear():
+    with _lock:
+        _entries.clear()
+        for counter in _stats:
+            _stats[counter] = 0
+
+
+def cache_stats() -> Dict[str, int]:
+    with _lock:
+        return dict(_stats, entries=len(_entries))
+
+
+def invalidate(*tables: str):
+    tables = {table.lower() for table in tables}
+    with _lock:
+        for table in tables:
+            _generations[table] = _generations.get(table, 0) + 1
+        stale = [key for key, (_, _, depends_on) in _entries.items() if depends_on & tables]
+        for key in stale:
+            del _entries[key]
+        _stats["invalidations"] += len(stale)
+
+
+# a cached result is deep copied on the way out, callers may modify the lists they get and
+# the Owner, Customer and Apartment objects in them
+def cached(depends_on: Iterable[str], ttl: float = None) -> Callable:
+    tables = frozenset(table.lower() for table in depends_on)
+
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            key = (function.__module__, function.__qualname__, args, tuple(sorted(kwargs.items())))
+            try:
+                hash(key)
+            except TypeError:
+                return function(*args, **kwargs)
+            now = time.monotonic()
+            with _lock:
+                entry = _entries.get(key)
+                if entry is not None and (entry[1] is None or entry[1] > now):
+                    _stats["hits"] += 1
+                    return copy.deepcopy(entry[0])
+                _stats["misses"] += 1
+                generations = {table: _generations.get(table, 0) for table in tables}
+            value = function(*args, **kwargs)
+            lifetime = ttl if ttl is not None else _default_ttl
+            with _lock:
+                if _enabled and all(_generations.get(table, 0) == generation
+                                    for table, generation in generations.items()):
+                    _entries[key] = (value, None if lifetime is None else now + lifetime, tables)
+            return copy.deepcopy(value)
+        return wrapper
+    return decorator
+
+
+# marks a function that writes to tables (including ON DELETE CASCADE targets): every call
+# invalidates the cached results depending on them, whatever its outcome
+def writes(*tables: str) -> Callable:
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            try:
+                return function(*args, **kwargs)
+            finally:
+                invalidate(*tables)
+        return wrapper
+    return decorator
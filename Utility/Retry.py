@@ -0,0 +1,76 @@
+import functools
+import random
+import threading
+import time
+from typing import Callable, Dict
+
+from Utility.Exceptions import DatabaseException
+from Utility.ReturnValue import ReturnValue
+
+# errors after which running the same transaction again may succeed
+RETRYABLE = (DatabaseException.SERIALIZATION_FAILURE, DatabaseException.DEADLOCK_DETECTED)
+
+
+# how often and how long to wait before retrying. the n-th retry waits a random time
+# between 0 and min(max_delay, base_delay * 2^n) ("full jitter"), so transactions that
+# collided once do not collide again on the next attempt
+class RetryPolicy:
+    def __init__(self, max_attempts: int = 5, base_delay: float = 0.005, max_delay: float = 0.2):
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        if base_delay < 0 or max_delay < 0:
+            raise ValueError("the delays must not be negative")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, retry: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** retry)))
+
+
+DEFAULT_POLICY = RetryPolicy()
+
+# function name -> counters, see retry_metrics()
+_metrics: Dict[str, Dict[str, int]] = {}
+_metrics_lock = threading.Lock()
+
+
+def _count(name: str, counter: str):
+    with _metrics_lock:
+        counters = _metrics.setdefault(name, {"calls": 0, "retries": 0, "exhausted": 0})
+        counters[counter] += 1
+
+
+# calls: calls of the function, retries: attempts after the first one,
+# exhausted: calls that still failed after max_attempts and returned ERROR
+def retry_metrics() -> Dict[str, Dict[str, int]]:
+    with _metrics_lock:
+        return {name: dict(counters) for name, counters in _metrics.items()}
+
+
+def reset_retry_metrics():
+    with _metrics_lock:
+        _metrics.clear()
+
+
+# runs the decorated function again when it raises one of RETRYABLE. the function must
+# let these errors through (its transaction was rolled back by then) and handle
+# everything else itself. when every attempt failed the call returns ReturnValue.ERROR
+def retry_transaction(policy: RetryPolicy = DEFAULT_POLICY) -> Callable:
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            _count(function.__name__, "calls")
+            for attempt in range(policy.max_attempts):
+                if attempt > 0:
+                    _count(function.__name__, "retries")
+                    time.sleep(policy.delay(attempt - 1))
+                try:
+                    return function(*args, **kwargs)
+                except RETRYABLE as e:
+                    error = e
+            print(error)
+            _count(function.__name__, "exhausted")
+            return ReturnValue.ERROR
+        return wrapper
+    return decorator
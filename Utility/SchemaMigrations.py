@@ -0,0 +1,54 @@
+from typing import List, Tuple
+
+import Utility.DBConnector as Connector
+
+# a migration: (version, description, statements). versions are applied in increasing
+# order and each one is recorded in SchemaVersion, so a schema that is up to date costs
+# a single SELECT. a released migration must never change, add a new version instead.
+Migration = Tuple[int, str, List[str]]
+
+# any constant works, it only has to be the same in every process
+MIGRATION_LOCK = 236363
+
+
+def current_version(conn: Connector.DBConnector) -> int:
+    try:
+        _, result = conn.execute("SELECT COALESCE(MAX(version), 0) FROM SchemaVersion")
+        return result.rows[0][0]
+    except Exception:
+        # no SchemaVersion table yet
+        conn.rollback()
+        return 0
+
+
+# brings the schema up to the last migration and returns its version. when several
+# processes start at once, the first to take the advisory lock applies the missing
+# migrations, the others wait for it and then find nothing left to do
+def migrate(migrations: List[Migration]) -> int:
+    latest = max(version for version, _, _ in migrations)
+    conn = Connector.DBConnector()
+    try:
+        version = current_version(conn)
+        if version >= latest:
+            return version
+        with conn.transaction():
+            conn.execute("SELECT pg_advisory_xact_lock(%s)", params=(MIGRATION_LOCK,))
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS SchemaVersion(
+                    version INTEGER PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    applied_at TIMESTAMP NOT NULL DEFAULT now()
+                )
+            """)
+            version = current_version(conn)
+            for migration_version, description, statements in sorted(migrations):
+                if migration_version <= version:
+                    continue
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute("INSERT INTO SchemaVersion(version, description) VALUES(%s, %s)",
+                             params=(migration_version, description))
+                version = migration_version
+        return version
+    finally:
+        conn.close()
@@ -0,0 +1,90 @@
+import unittest
+from datetime import date
+from unittest import mock
+import psycopg2
+from Solution import *
+from Tests.AbstractTest import AbstractTest
+from Tests.ConcurrentWriteTest import ConcurrentWriteTest
+import Utility.DBConnector as Connector
+from Analytics.Revenue import RevenueSnapshot
+
+
+class TestAnalytics(AbstractTest):
+    def populate(self):
+        add_owner(Owner(1, "Dan"))
+        add_owner(Owner(2, "Yuval"))
+        add_customer(Customer(1, "Noa"))
+        add_customer(Customer(2, "Eli"))
+        add_apartment(Apartment(1, "Herzl 1", "Haifa", "Israel", 80))
+        add_apartment(Apartment(2, "Herzl 2", "Haifa", "Israel", 60))
+        add_apartment(Apartment(3, "Rivoli 5", "Paris", "France", 40))
+        owner_owns_apartment(1, 1)
+        owner_owns_apartment(1, 2)
+        owner_owns_apartment(2, 3)
+        customer_made_reservation(1, 1, date(2023, 12, 30), date(2024, 1, 3), 400)
+        customer_made_reservation(2, 1, date(2024, 1, 10), date(2024, 2, 2), 2300)
+        customer_made_reservation(1, 2, date(2024, 3, 1), date(2024, 3, 8), 700.5)
+        customer_made_reservation(2, 3, date(2024, 12, 30), date(2025, 1, 5), 600)
+
+    def test_occupancy_report(self):
+        self.populate()
+        report = occupancy_report(2024)
+        self.assertAlmostEqual(report.per_apartment()[1][0], 24 / 31)
+        self.assertAlmostEqual(report.per_apartment()[1][1], 1 / 29)
+        self.assertAlmostEqual(report.per_apartment()[2][2], 7 / 31)
+        self.assertAlmostEqual(report.per_owner()[1][0], 24 / 62)
+        self.assertAlmostEqual(report.per_owner()[2][11], 2 / 31)
+        self.assertAlmostEqual(report.per_city()[("Haifa", "Israel")][2], 7 / 62)
+        self.assertEqual(report.longest_gaps(), {1: 334, 2: 299, 3: 364})
+        self.assertEqual(report.peak_days(1), [(date(2024, 1, 1), 1)])
+
+    # like the other queries, a database error gives an empty result rather than None
+    def test_occupancy_report_on_error(self):
+        self.populate()
+        with mock.patch.object(Connector.DBConnector, "stream", side_effect=psycopg2.OperationalError("down")):
+            report = occupancy_report(2024)
+        self.assertEqual(report.per_apartment(), {})
+        self.assertEqual(report.per_owner(), {})
+        self.assertEqual(report.per_city(), {})
+        self.assertEqual(report.longest_gaps(), {})
+
+    def test_revenue_snapshot_matches_profit_per_month(self):
+        self.populate()
+        snapshot = RevenueSnapshot.load()
+        for year in (2023, 2024, 2025):
+            expected = profit_per_month(year)
+            actual = snapshot.profit_per_month(year)
+            self.assertEqual([month for month, _ in actual], [month for month, _ in expected])
+            for (_, profit), (_, expected_profit) in zip(actual, expected):
+                self.assertAlmostEqual(profit, expected_profit)
+        self.assertAlmostEqual(snapshot.by_owner(2024)[1], (400 + 2300 + 700.5) * 0.15)
+        self.assertAlmostEqual(snapshot.by_city(commission=0.1)[("Paris", "France")], 60)
+        by_stay_length = snapshot.by_stay_length()
+        self.assertEqual(sorted(by_stay_length), [4, 6, 7, 23])
+        self.assertAlmostEqual(by_stay_length[7], 700.5 * 0.15)
+
+
+class TestAnalyticsSnapshots(ConcurrentWriteTest):
+    NEW_APARTMENT = ["INSERT INTO Apartments VALUES (2, 'Herzl 2', 'Haifa', 'Israel', 60)",
+                     "INSERT INTO Reservations VALUES (1, 2, '2024-03-01', '2024-03-05', 100)"]
+
+    def setUp(self):
+        add_customer(Customer(1, "Noa"))
+        add_apartment(Apartment(1, "Herzl 1", "Haifa", "Israel", 80))
+        customer_made_reservation(1, 1, date(2024, 1, 1), date(2024, 1, 3), 400)
+
+    def test_revenue_snapshot_is_consistent(self):
+        with self.commit_before_stream(self.NEW_APARTMENT):
+            snapshot = RevenueSnapshot.load()
+        self.assertEqual(len(snapshot), 1)
+        self.assertEqual(list(snapshot.by_apartment()), [1])
+
+    def test_occupancy_report_is_consistent(self):
+        with self.commit_before_stream(self.NEW_APARTMENT):
+            report = occupancy_report(2024)
+        self.assertEqual(list(report.per_apartment()), [1])
+        self.assertEqual(report.peak_days(1), [(date(2024, 1, 1), 1)])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
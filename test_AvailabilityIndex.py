@@ -0,0 +1,82 @@
+import unittest
+from datetime import date
+from Solution import *
+from Tests.AbstractTest import AbstractTest
+from Utility.AvailabilityIndex import AvailabilityIndex
+
+
+class TestAvailabilityIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = AvailabilityIndex()
+        self.index.add(1, 1, date(2024, 1, 1), date(2024, 1, 5))
+        self.index.add(2, 1, date(2024, 1, 10), date(2024, 1, 12))
+        self.index.add(3, 1, date(2024, 1, 5), date(2024, 1, 7))
+
+    def test_is_available(self):
+        self.assertTrue(self.index.is_available(1, date(2023, 12, 1), date(2024, 1, 1)))
+        self.assertTrue(self.index.is_available(1, date(2024, 1, 7), date(2024, 1, 10)))
+        self.assertTrue(self.index.is_available(1, date(2024, 1, 12), date(2024, 2, 1)))
+        self.assertTrue(self.index.is_available(2, date(2024, 1, 1), date(2024, 1, 5)))
+        self.assertFalse(self.index.is_available(1, date(2024, 1, 1), date(2024, 1, 5)))
+        self.assertFalse(self.index.is_available(1, date(2024, 1, 1), date(2024, 1, 2)))
+        self.assertFalse(self.index.is_available(1, date(2023, 12, 1), date(2024, 2, 1)))
+        self.assertFalse(self.index.is_available(1, date(2024, 1, 6), date(2024, 1, 8)))
+        self.assertFalse(self.index.is_available(1, date(2024, 1, 9), date(2024, 1, 11)))
+        self.assertFalse(self.index.is_available(1, date(2024, 1, 8), date(2024, 1, 8)))
+
+    def test_next_free_window(self):
+        self.assertEqual(self.index.next_free_window(1, 3, date(2024, 1, 1)), date(2024, 1, 7))
+        self.assertEqual(self.index.next_free_window(1, 4, date(2024, 1, 1)), date(2024, 1, 12))
+        self.assertEqual(self.index.next_free_window(1, 2, date(2024, 1, 8)), date(2024, 1, 8))
+        self.assertEqual(self.index.next_free_window(1, 3, date(2024, 1, 8)), date(2024, 1, 12))
+        self.assertEqual(self.index.next_free_window(1, 30, date(2023, 1, 1)), date(2023, 1, 1))
+        self.assertEqual(self.index.next_free_window(5, 3, date(2024, 1, 1)), date(2024, 1, 1))
+        self.assertIsNone(self.index.next_free_window(1, 0, date(2024, 1, 1)))
+
+    def test_remove(self):
+        self.assertFalse(self.index.remove(2, 1, date(2024, 1, 1)))
+        self.assertTrue(self.index.remove(1, 1, date(2024, 1, 1)))
+        self.assertFalse(self.index.remove(1, 1, date(2024, 1, 1)))
+        self.assertTrue(self.index.is_available(1, date(2024, 1, 1), date(2024, 1, 5)))
+        self.index.remove_customer(2)
+        self.assertTrue(self.index.is_available(1, date(2024, 1, 10), date(2024, 1, 12)))
+        self.assertEqual(self.index.reservations(1), [(3, date(2024, 1, 5), date(2024, 1, 7))])
+        self.index.remove_apartment(1)
+        self.assertEqual(self.index.reservations(1), [])
+
+
+# the index Solution keeps in sync with its writes
+class TestSolutionAvailabilityIndex(AbstractTest):
+    def setUp(self):
+        super().setUp()
+        self.index = enable_availability_index()
+
+    def tearDown(self):
+        disable_availability_index()
+        super().tearDown()
+
+    def populate(self):
+        add_customer(Customer(1, "Noa"))
+        add_apartment(Apartment(1, "Herzl 1", "Haifa", "Israel", 80))
+        self.assertEqual(customer_made_reservation(1, 1, date(2024, 1, 1), date(2024, 1, 5), 400), ReturnValue.OK)
+
+    def test_clear_tables_empties_the_index(self):
+        self.populate()
+        clear_tables()
+        self.assertEqual(self.index.apartments(), [])
+        self.populate()
+        self.assertEqual(self.index.reservations(1), [(1, date(2024, 1, 1), date(2024, 1, 5))])
+        self.assertEqual(find_available_apartments("Haifa", "Israel", date(2024, 1, 2), date(2024, 1, 3)), [])
+        self.assertEqual([apartment.get_id() for apartment in
+                          find_available_apartments("Haifa", "Israel", date(2024, 1, 5), date(2024, 1, 6))], [1])
+
+    def test_drop_tables_empties_the_index(self):
+        self.populate()
+        drop_tables()
+        create_tables()
+        self.assertEqual(self.index.apartments(), [])
+        self.populate()
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,45 @@
+import random
+import unittest
+from Tests.AbstractTest import AbstractTest
+from Business.Apartment import Apartment
+from Business.Customer import Customer
+from Solution import add_apartment, add_customer
+import Utility.DBConnector as Connector
+from Benchmarks.LoadDriver import LoadConfig, run
+from Benchmarks.SolutionBenchmark import dataset_shape, populate, workloads
+
+
+# populate() at a size past the int4 range of its generated ids, and one call of every
+# benchmarked function on the result
+class TestBenchmarkSmoke(AbstractTest):
+    SIZE = 300001
+
+    def test_populate_and_workloads(self):
+        populate(self.SIZE)
+        shape = dataset_shape(self.SIZE)
+        conn = Connector.DBConnector()
+        try:
+            _, result = conn.execute("SELECT COUNT(*), MIN(customer_id), MAX(customer_id) FROM Reservations")
+        finally:
+            conn.close()
+        self.assertEqual(result.rows[0][0], self.SIZE)
+        self.assertGreaterEqual(result.rows[0][1], 1)
+        self.assertLessEqual(result.rows[0][2], shape["customers"])
+        for name, call in workloads(self.SIZE, random.Random(236363)).items():
+            with self.subTest(name):
+                call(0)
+
+
+# a threaded load run with connection reuse leaves the flag as it found it
+class TestLoadDriverSmoke(AbstractTest):
+    def test_threaded_run_turns_reuse_off(self):
+        for i in range(1, 3):
+            add_customer(Customer(i, "customer" + str(i)))
+            add_apartment(Apartment(i, "street " + str(i), "Haifa", "Israel", 50))
+        summary = run(LoadConfig(workers=2, operations=5, reuse_connections=True))
+        self.assertEqual(summary["overlaps"], [])
+        self.assertFalse(Connector._reuse_connections)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,123 @@
+import random
+import unittest
+from datetime import date, timedelta
+from Solution import *
+from Tests.AbstractTest import AbstractTest
+import Utility.DBConnector as Connector
+
+
+def table_rows(table):
+    conn = Connector.DBConnector()
+    try:
+        _, result = conn.execute("SELECT * FROM " + table + " ORDER BY 1, 2, 3")
+        return result.rows
+    finally:
+        conn.close()
+
+
+def reservations():
+    return table_rows("Reservations")
+
+
+class TestBulkImport(AbstractTest):
+    def populate(self):
+        for i in range(1, 6):
+            add_customer(Customer(i, "customer" + str(i)))
+            add_apartment(Apartment(i, "street " + str(i), "Haifa", "Israel", 50))
+
+    def random_reservations(self, count):
+        rng = random.Random(236363)
+        rows = []
+        for _ in range(count):
+            start = date(2024, 1, 1) + timedelta(days=rng.randrange(60))
+            rows.append((rng.randint(0, 6), rng.randint(1, 6), start,
+                         start + timedelta(days=rng.randint(-1, 6)), rng.choice([100.0, 250.5, 0])))
+        rows.append((1, 1, None, date(2024, 1, 1), 100.0))
+        return rows
+
+    def test_import_reservations_matches_single_rows(self):
+        self.populate()
+        customer_made_reservation(1, 1, date(2024, 1, 10), date(2024, 1, 20), 500)
+        rows = self.random_reservations(300)
+        expected = [customer_made_reservation(*row) for row in rows]
+        expected_table = reservations()
+        customer_cancelled_reservation(1, 1, date(2024, 1, 10))
+        for row, value in zip(rows, expected):
+            if value == ReturnValue.OK:
+                customer_cancelled_reservation(row[0], row[1], row[2])
+        self.assertEqual(len(reservations()), 0)
+
+        customer_made_reservation(1, 1, date(2024, 1, 10), date(2024, 1, 20), 500)
+        self.assertEqual(import_reservations(rows), expected)
+        self.assertEqual(reservations(), expected_table)
+        self.assertIn(ReturnValue.NOT_EXISTS, expected)
+        self.assertIn(ReturnValue.BAD_PARAMS, expected)
+
+    def test_import_reservations_within_batch(self):
+        self.populate()
+        rows = [(1, 1, date(2024, 1, 1), date(2024, 1, 5), 100),
+                (2, 1, date(2024, 1, 3), date(2024, 1, 8), 100),
+                (3, 1, date(2024, 1, 5), date(2024, 1, 6), 100),
+                (4, 1, date(2024, 1, 4), date(2024, 1, 6), 0),
+                (4, 1, date(2024, 1, 6), date(2024, 1, 9), 100)]
+        self.assertEqual(import_reservations(rows), [ReturnValue.OK, ReturnValue.BAD_PARAMS, ReturnValue.OK,
+                                                     ReturnValue.BAD_PARAMS, ReturnValue.OK])
+        self.assertEqual(import_reservations([]), [])
+        self.assertEqual(import_reservations(rows[:1]), [ReturnValue.BAD_PARAMS])
+
+    def test_import_reviews_matches_single_rows(self):
+        self.populate()
+        for customer_id in range(1, 4):
+            for apartment_id in range(1, 4):
+                customer_made_reservation(customer_id, apartment_id, date(2024, customer_id, 1),
+                                          date(2024, customer_id, 10), 100)
+        customer_reviewed_apartment(1, 1, date(2024, 2, 1), 8, "nice")
+        rng = random.Random(236363)
+        rows = [(rng.randint(0, 6), rng.randint(1, 6), date(2024, rng.randint(1, 4), rng.choice([5, 10, 20])),
+                 rng.randint(0, 11), rng.choice(["great", "bad", ""])) for _ in range(200)]
+        rows.append((2, 2, date(2024, 3, 1), 5, None))
+        expected = [customer_reviewed_apartment(*row) for row in rows]
+        expected_table = table_rows("Reviews")
+        clear = Connector.DBConnector()
+        try:
+            clear.execute("DELETE FROM Reviews WHERE NOT (customer_id = 1 AND apartment_id = 1)")
+        finally:
+            clear.close()
+
+        self.assertEqual(import_reviews(rows), expected)
+        self.assertEqual(table_rows("Reviews"), expected_table)
+        self.assertEqual(set(expected), {ReturnValue.OK, ReturnValue.BAD_PARAMS,
+                                         ReturnValue.NOT_EXISTS, ReturnValue.ALREADY_EXISTS})
+        self.assertEqual(import_reviews([]), [])
+
+    def test_bulk_deletes(self):
+        self.populate()
+        add_owner(Owner(1, "Dan"))
+        add_owner(Owner(2, "Yuval"))
+        owner_owns_apartment(1, 1)
+        owner_owns_apartment(2, 2)
+        customer_made_reservation(1, 1, date(2024, 1, 1), date(2024, 1, 5), 100)
+        customer_made_reservation(2, 2, date(2024, 1, 1), date(2024, 1, 5), 100)
+        customer_reviewed_apartment(1, 1, date(2024, 2, 1), 8, "nice")
+        customer_reviewed_apartment(2, 2, date(2024, 2, 1), 6, "ok")
+
+        self.assertEqual(delete_apartments([1, 9, 0, 1]), {1: ReturnValue.OK, 9: ReturnValue.NOT_EXISTS,
+                                                           0: ReturnValue.BAD_PARAMS})
+        self.assertEqual(get_apartment_owner(1).get_owner_id(), None)
+        self.assertEqual([row[1] for row in reservations()], [2])
+        self.assertEqual(delete_customers([2, 3, 7]), {2: ReturnValue.OK, 3: ReturnValue.OK,
+                                                       7: ReturnValue.NOT_EXISTS})
+        self.assertEqual(reservations(), [])
+        self.assertEqual(table_rows("Reviews"), [])
+        self.assertEqual(delete_owners([2, None]), {2: ReturnValue.OK, None: ReturnValue.BAD_PARAMS})
+        self.assertEqual(get_apartment_owner(2).get_owner_id(), None)
+        self.assertEqual(get_owner(1).get_owner_id(), 1)
+        self.assertEqual(delete_owners([]), {})
+        # ids that are not numbers are bad parameters too, not an exception
+        self.assertEqual(delete_owners(["1", 1]), {"1": ReturnValue.BAD_PARAMS, 1: ReturnValue.OK})
+        self.assertEqual(delete_apartments([2, "2"]), {2: ReturnValue.OK, "2": ReturnValue.BAD_PARAMS})
+        self.assertEqual(delete_customers([(1,)]), {(1,): ReturnValue.BAD_PARAMS})
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,123 @@
+import queue
+import time
+import unittest
+from datetime import date
+import psycopg2
+import Solution
+import Utility.DBConnector as Connector
+import Utility.ResultCache as ResultCache
+from Business.Owner import Owner
+from Business.Customer import Customer
+from Business.Apartment import Apartment
+
+
+# notifications are only sent on commit, so these tests write for real (not in test mode)
+class TestChangeFeed(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        Solution.create_tables()
+
+    @classmethod
+    def tearDownClass(cls):
+        Solution.drop_tables()
+
+    def setUp(self):
+        self.events = queue.Queue()
+        self.listener = Connector.ChangeListener(poll_seconds=0.1)
+        self.listener.add_callback(self.events.put)
+        self.listener.start()
+        Solution.enable_change_feed()
+
+    def tearDown(self):
+        Solution.disable_change_feed()
+        self.listener.stop()
+        Solution.clear_tables()
+
+    def next_event(self) -> Connector.ChangeEvent:
+        return self.events.get(timeout=5)
+
+    # a write that Solution does not know about, as if made by another process
+    def foreign_write(self, query):
+        conn = psycopg2.connect(**Connector.DBConnector._DBConnector__config())
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(query)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def count_triggers(self):
+        conn = Connector.DBConnector()
+        try:
+            _, result = conn.execute("SELECT COUNT(*) FROM pg_trigger WHERE tgname LIKE '%_notify_%'")
+            return result.rows[0][0]
+        finally:
+            conn.close()
+
+    def test_events(self):
+        Solution.add_owner(Owner(1, "Dan"))
+        event = self.next_event()
+        self.assertEqual((event.table, event.operation, event.keys), ("owners", "INSERT", [{"id": 1}]))
+        Solution.add_customer(Customer(1, "Noa"))
+        Solution.add_apartment(Apartment(1, "Herzl 1", "Haifa", "Israel", 80))
+        self.assertEqual([self.next_event().table for _ in range(2)], ["customers", "apartments"])
+        Solution.customer_made_reservation(1, 1, date(2024, 1, 1), date(2024, 1, 5), 400)
+        event = self.next_event()
+        self.assertEqual((event.table, event.keys),
+                         ("reservations", [{"customer_id": 1, "apartment_id": 1, "start_date": "2024-01-01"}]))
+        # statements changing nothing send nothing, a cascade notifies every table it touches
+        Solution.delete_owner(7)
+        Solution.delete_apartment(1)
+        self.assertEqual({(event.table, event.operation) for event in [self.next_event(), self.next_event()]},
+                         {("apartments", "DELETE"), ("reservations", "DELETE")})
+        self.assertTrue(self.events.empty())
+
+    # an update sends the keys the rows had before it and after it
+    def test_update_keys(self):
+        Solution.add_owner(Owner(1, "Dan"))
+        self.next_event()
+        self.foreign_write("UPDATE Owners SET id = 2 WHERE id = 1")
+        event = self.next_event()
+        self.assertEqual((event.table, event.operation), ("owners", "UPDATE"))
+        self.assertEqual(sorted(key["id"] for key in event.keys), [1, 2])
+        self.foreign_write("UPDATE Owners SET name = 'Noa'")
+        self.assertEqual(self.next_event().keys, [{"id": 2}])
+
+    # without the feed the tables have no triggers and writes send nothing
+    def test_disabled_feed_sends_nothing(self):
+        Solution.disable_change_feed()
+        Solution.drop_tables()
+        Solution.create_tables()
+        self.foreign_write("INSERT INTO Owners VALUES(1, 'Dan')")
+        self.assertEqual(self.count_triggers(), 0)
+        time.sleep(0.3)
+        self.assertTrue(self.events.empty())
+        # tables created while the feed is enabled get the triggers too
+        Solution.enable_change_feed()
+        Solution.drop_tables()
+        Solution.create_tables()
+        self.assertEqual(self.count_triggers(), 4 * len(Solution.CHANGE_FEED_KEYS))
+        self.foreign_write("INSERT INTO Owners VALUES(2, 'Noa')")
+        event = self.next_event()
+        self.assertEqual((event.table, event.keys), ("owners", [{"id": 2}]))
+
+    def test_change_feed_keeps_caches_coherent(self):
+        Solution.add_customer(Customer(1, "Noa"))
+        Solution.add_apartment(Apartment(1, "Herzl 1", "Haifa", "Israel", 80))
+        ResultCache.enable_cache()
+        index = Solution.enable_availability_index()
+        try:
+            self.assertIsNone(Solution.get_top_customer().get_customer_id())
+            self.foreign_write("INSERT INTO Reservations VALUES(1, 1, '2024-01-01', '2024-01-05', 400)")
+            deadline = time.time() + 5
+            while index.is_available(1, date(2024, 1, 1), date(2024, 1, 2)) and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertFalse(index.is_available(1, date(2024, 1, 1), date(2024, 1, 2)))
+            self.assertEqual(Solution.get_top_customer().get_customer_id(), 1)
+        finally:
+            Solution.disable_availability_index()
+            ResultCache.disable_cache()
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,84 @@
+import time
+import unittest
+import Utility.DBConnector as Connector
+
+
+# enable_connection_reuse outside test mode, which would otherwise share one connection
+class TestConnectionReuse(unittest.TestCase):
+    def setUp(self):
+        Connector.enable_connection_reuse()
+
+    def tearDown(self):
+        Connector.enable_connection_reuse(False)
+        Connector.release_thread_connection()
+
+    def test_sequential_connectors_share_the_connection(self):
+        first = Connector.DBConnector()
+        connection = first.connection
+        first.close()
+        second = Connector.DBConnector()
+        try:
+            self.assertIs(second.connection, connection)
+        finally:
+            second.close()
+
+    def test_nested_connector_leaves_outer_transaction_alone(self):
+        outer = Connector.DBConnector()
+        try:
+            with outer.transaction():
+                outer.execute("SELECT pg_advisory_xact_lock(236363)")
+                inner = Connector.DBConnector()
+                self.assertIsNot(inner.connection, outer.connection)
+                inner.execute("SELECT 1")
+                inner.close()
+                # the inner commit and close did not end the outer transaction, which
+                # still holds its lock
+                _, result = outer.execute("""
+                    SELECT COUNT(*) FROM pg_locks
+                    WHERE locktype = 'advisory' AND pid = pg_backend_pid() AND objid = 236363
+                """)
+                self.assertEqual(result.rows[0][0], 1)
+            kept = outer.connection
+        finally:
+            outer.close()
+        # the thread keeps the outer connection, the inner one was closed
+        self.assertTrue(inner.connection is None)
+        again = Connector.DBConnector()
+        try:
+            self.assertIs(again.connection, kept)
+        finally:
+            again.close()
+
+    # a kept connection that broke is dropped on close(), the thread's other kept ones stay
+    def test_broken_connection_is_dropped_alone(self):
+        outer = Connector.DBConnector()
+        kept = outer.connection
+        try:
+            with Connector.use_database(Connector.DBConnector._DBConnector__config()):
+                inner = Connector.DBConnector()
+            # left in a transaction, close() has something to roll back
+            inner.cursor.execute("SELECT pg_backend_pid()")
+            pid = inner.cursor.fetchone()[0]
+            outer.execute("SELECT pg_terminate_backend(%s)", params=(pid,))
+            deadline = time.time() + 5
+            while time.time() < deadline:
+                _, result = outer.execute("SELECT COUNT(*) FROM pg_stat_activity WHERE pid = %s", params=(pid,))
+                if result.rows[0][0] == 0:
+                    break
+                time.sleep(0.01)
+            inner.close()
+            self.assertTrue(inner.connection is None)
+            _, result = outer.execute("SELECT 1")
+            self.assertEqual(result.rows[0][0], 1)
+        finally:
+            outer.close()
+        self.assertFalse(kept.closed)
+        again = Connector.DBConnector()
+        try:
+            self.assertIs(again.connection, kept)
+        finally:
+            again.close()
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,171 @@
+import random
+import unittest
+from datetime import date, timedelta
+from decimal import Decimal
+import BigTest
+import EmbeddedSolution
+import Solution
+import Utility.DBConnector as Connector
+from Business.Owner import Owner
+from Business.Customer import Customer
+from Business.Apartment import Apartment
+
+API = EmbeddedSolution.__all__
+# results Postgres returns in no particular order
+UNORDERED = {"get_owner_apartments", "reservations_per_owner", "get_all_location_owners",
+             "get_apartment_recommendation"}
+
+
+def normalize(value):
+    if isinstance(value, Owner):
+        return "Owner", value.get_owner_id(), value.get_owner_name()
+    if isinstance(value, Customer):
+        return "Customer", value.get_customer_id(), value.get_customer_name()
+    if isinstance(value, Apartment):
+        return ("Apartment", value.get_id(), value.get_address(), value.get_city(), value.get_country(),
+                value.get_size())
+    if isinstance(value, (float, Decimal)):
+        return round(float(value), 9)
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted(((key, normalize(item)) for key, item in value.items()), key=repr))
+    return value
+
+
+def normalize_result(name, value):
+    value = normalize(value)
+    return tuple(sorted(value, key=repr)) if name in UNORDERED else value
+
+
+# runs test method name of BigTest with the API functions of backend, returns every
+# (function, args, kwargs, result) it called
+def run_bigtest(name, backend):
+    calls = []
+
+    def recording(function_name):
+        function = getattr(backend, function_name)
+
+        def wrapper(*args, **kwargs):
+            result = function(*args, **kwargs)
+            calls.append((function_name, args, kwargs, result))
+            return result
+        return wrapper
+
+    saved = {function_name: getattr(BigTest, function_name, None) for function_name in API}
+    for function_name in API:
+        setattr(BigTest, function_name, recording(function_name))
+    try:
+        getattr(BigTest.TestCRUD(name), name)()
+    finally:
+        for function_name, function in saved.items():
+            setattr(BigTest, function_name, function)
+    return calls
+
+
+# a random mix of every call of the API, valid and invalid, as (function, args)
+def random_calls(rng, count=2000):
+    ids = lambda: rng.choice([None, -1, 0] + list(range(1, 9)) * 6)
+    day = lambda: rng.choice([None] + [date(2024, 1, 1) + timedelta(days=rng.randrange(90))] * 9)
+    later = lambda: rng.choice([None] + [date(2024, 2, 1) + timedelta(days=rng.randrange(120))] * 9)
+    price = lambda: rng.choice([0, 100.0, 333.3, 1250.5])
+    cities = [("Haifa", "Israel"), ("Paris", "France"), ("Rome", "Italy")]
+    # (weight, call)
+    workload = [
+        (3, lambda: ("add_owner", (Owner(ids(), rng.choice(["Dan", "Noa", None])),))),
+        (3, lambda: ("add_customer", (Customer(ids(), rng.choice(["Eli", "Yuval", None])),))),
+        (3, lambda: ("add_apartment", (Apartment(ids(), "street " + str(rng.randrange(12)), *rng.choice(cities),
+                                                 rng.choice([None, 0, 40, 80])),))),
+        (3, lambda: ("owner_owns_apartment", (ids(), ids()))),
+        (1, lambda: ("owner_drops_apartment", (ids(), ids()))),
+        (12, lambda: ("customer_made_reservation", stay())),
+        (1, lambda: ("customer_cancelled_reservation", (ids(), ids(), day()))),
+        (8, lambda: ("customer_reviewed_apartment", (ids(), ids(), later(), rng.randint(0, 11),
+                                                     rng.choice(["ok", "great", ""])))),
+        (2, lambda: ("customer_updated_review", (ids(), ids(), later(), rng.randint(0, 11), "updated"))),
+        (0.3, lambda: ("delete_owner", (ids(),))),
+        (0.3, lambda: ("delete_customer", (ids(),))),
+        (0.3, lambda: ("delete_apartment", (ids(),))),
+        (1, lambda: ("get_apartment_owner", (ids(),))),
+        (1, lambda: ("get_owner_apartments", (ids(),))),
+        (1, lambda: ("get_apartment_rating", (ids(),))),
+        (1, lambda: ("get_owner_rating", (ids(),))),
+        (1, lambda: ("get_apartment_ratings", ([ids() for _ in range(rng.randrange(6))],))),
+        (1, lambda: ("get_owner_ratings", ([ids() for _ in range(rng.randrange(6))],))),
+        (1, lambda: ("get_top_customer", ())),
+        (1, lambda: ("reservations_per_owner", ())),
+        (1, lambda: ("get_all_location_owners", ())),
+        (1, lambda: ("best_value_for_money", ())),
+        (1, lambda: ("profit_per_month", (2024,))),
+        (3, lambda: ("get_apartment_recommendation", (ids(),))),
+        (2, lambda: ("get_apartment_recommendation", (ids(), rng.choice([None, 0, 1, 3]),
+                                                      rng.choice([None, 2.5, 7.0])))),
+        (1, lambda: ("find_available_apartments", (*rng.choice(cities), *stay()[2:4]))),
+    ]
+
+    def stay():
+        start = day()
+        end = start + timedelta(days=rng.randint(-1, 9)) if start is not None else day()
+        return ids(), ids(), start, end, price()
+
+    weights = [weight for weight, _ in workload]
+    return [rng.choices(workload, weights)[0][1]() for _ in range(count)]
+
+
+# the differential harness: every BigTest test runs against Postgres (in test mode) with
+# its own assertions, then the same calls are replayed on the embedded backend and every
+# result has to match. BigTest's assertions also run against the embedded backend alone
+class TestEmbeddedBackend(unittest.TestCase):
+    TESTS = sorted(name for name in dir(BigTest.TestCRUD) if name.startswith("test"))
+
+    @classmethod
+    def setUpClass(cls):
+        if Solution.BACKEND != "postgres":
+            raise unittest.SkipTest("the differential test needs the postgres backend")
+        Connector.start_test_mode()
+        Solution.create_tables()
+
+    @classmethod
+    def tearDownClass(cls):
+        Connector.stop_test_mode()
+
+    def tearDown(self):
+        EmbeddedSolution.drop_tables()
+
+    def test_same_results_as_postgres(self):
+        for name in self.TESTS:
+            with self.subTest(name):
+                Connector.begin_test()
+                try:
+                    calls = run_bigtest(name, Solution)
+                finally:
+                    Connector.rollback_test()
+                EmbeddedSolution.drop_tables()
+                for i, (function_name, args, kwargs, expected) in enumerate(calls):
+                    actual = getattr(EmbeddedSolution, function_name)(*args, **kwargs)
+                    self.assertEqual(normalize_result(function_name, actual),
+                                     normalize_result(function_name, expected),
+                                     f"call {i}: {function_name}{args}")
+
+    def test_bigtest_on_embedded_backend(self):
+        for name in self.TESTS:
+            with self.subTest(name):
+                EmbeddedSolution.drop_tables()
+                run_bigtest(name, EmbeddedSolution)
+
+    # a random mix of every call, valid and invalid, compared call by call
+    def test_random_workload(self):
+        calls = random_calls(random.Random(236363))
+        Connector.begin_test()
+        try:
+            expected = [getattr(Solution, name)(*args) for name, args in calls]
+        finally:
+            Connector.rollback_test()
+        for i, ((name, args), result) in enumerate(zip(calls, expected)):
+            actual = getattr(EmbeddedSolution, name)(*args)
+            self.assertEqual(normalize_result(name, actual), normalize_result(name, result),
+                             f"call {i}: {name}{args}")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,118 @@
+import contextlib
+import csv
+import io
+import os
+import tempfile
+import tracemalloc
+import unittest
+from datetime import date
+from Solution import *
+from Tests.AbstractTest import AbstractTest
+import Utility.DBConnector as Connector
+
+
+# counts what it is given and keeps nothing
+class NullWriter:
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+
+
+class TestExport(AbstractTest):
+    def populate(self):
+        add_owner(Owner(1, "Dan"))
+        add_customer(Customer(1, "Noa, \"the\" guest"))
+        add_apartment(Apartment(1, "Herzl 1", "Haifa", "Israel", 50))
+        add_apartment(Apartment(2, "Herzl 2", "Haifa", "Israel", 80))
+        owner_owns_apartment(1, 1)
+        customer_made_reservation(1, 1, date(2024, 1, 1), date(2024, 1, 5), 400)
+        customer_made_reservation(1, 2, date(2024, 2, 1), date(2024, 2, 3), 250.5)
+        customer_reviewed_apartment(1, 1, date(2024, 1, 6), 8, "line\nbreak, and comma")
+
+    def test_export_table_csv(self):
+        self.populate()
+        out = io.StringIO()
+        self.assertEqual(export_table("Reviews", out), ReturnValue.OK)
+        rows = list(csv.reader(io.StringIO(out.getvalue())))
+        self.assertEqual(rows, [["customer_id", "apartment_id", "review_date", "rating", "review_text"],
+                                ["1", "1", "2024-01-06", "8", "line\nbreak, and comma"]])
+        out = io.StringIO()
+        self.assertEqual(export_table("customers", out), ReturnValue.OK)
+        self.assertEqual(list(csv.reader(io.StringIO(out.getvalue()))), [["id", "name"], ["1", "Noa, \"the\" guest"]])
+
+    def test_export_to_path(self):
+        self.populate()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "reservations.csv")
+            self.assertEqual(export_table("Reservations", path), ReturnValue.OK)
+            with open(path, newline="") as f:
+                rows = list(csv.reader(f))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[1][:4], ["1", "1", "2024-01-01", "2024-01-05"])
+
+    def test_export_view_and_query(self):
+        self.populate()
+        out = io.StringIO()
+        self.assertEqual(export_table("ApartmentRating", out), ReturnValue.OK)
+        # only the reviewed apartment has a rating
+        self.assertEqual(len(out.getvalue().splitlines()), 2)
+        out = io.StringIO()
+        self.assertEqual(export_query("SELECT apartment_id, total_price FROM Reservations WHERE total_price > %s "
+                                      "ORDER BY apartment_id", out, params=(300,)), ReturnValue.OK)
+        self.assertEqual(out.getvalue(), "apartment_id,total_price\n1,400\n")
+
+    def test_binary_round_trip(self):
+        self.populate()
+        out = io.BytesIO()
+        self.assertEqual(export_table("Reservations", out, format="binary"), ReturnValue.OK)
+        self.assertTrue(out.getvalue().startswith(b"PGCOPY\n"))
+        conn = Connector.DBConnector()
+        try:
+            conn.execute("CREATE TEMP TABLE ReservationsCopy (LIKE Reservations)")
+            out.seek(0)
+            conn.cursor.copy_expert("COPY ReservationsCopy FROM STDIN WITH (FORMAT binary)", out)
+            _, copied = conn.execute("SELECT * FROM ReservationsCopy ORDER BY apartment_id")
+            _, original = conn.execute("SELECT * FROM Reservations ORDER BY apartment_id")
+        finally:
+            conn.close()
+        self.assertEqual(copied.rows, original.rows)
+
+    def test_bad_params(self):
+        self.assertEqual(export_table("Reservations; DROP TABLE Owners", io.StringIO()), ReturnValue.BAD_PARAMS)
+        self.assertEqual(export_table(None, io.StringIO()), ReturnValue.BAD_PARAMS)
+        self.assertEqual(export_table("Owners", io.StringIO(), format="parquet"), ReturnValue.BAD_PARAMS)
+        self.assertEqual(export_query("SELECT * FROM NoSuchTable", io.StringIO()), ReturnValue.ERROR)
+        # the failed export left the test transaction usable
+        self.assertEqual(add_owner(Owner(5, "Eli")), ReturnValue.OK)
+
+    def test_constant_memory(self):
+        out = NullWriter()
+        tracemalloc.start()
+        try:
+            self.assertEqual(export_query("SELECT g, 'row ' || g, now() FROM generate_series(1, 300000) g", out),
+                             ReturnValue.OK)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertGreater(out.size, 300000 * 20)
+        self.assertLess(peak, 2 * 1024 * 1024)
+
+    def test_print_all_tables(self):
+        self.populate()
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            print_all_tables()
+        printed = out.getvalue()
+        for table in ["Owners", "Customers", "Apartments", "Reservations", "OwnsApartment", "Reviews"]:
+            self.assertIn("Table: " + table, printed)
+        self.assertIn("1,Herzl 1,Haifa,Israel,50", printed)
+
+    def test_result_set_str(self):
+        _, result = Connector.DBConnector().execute("SELECT 1 AS a, 'x' AS b UNION ALL SELECT 2, 'y'")
+        self.assertEqual(str(result), "a   b   \n1   x   \n2   y   \n")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,64 @@
+import unittest
+from datetime import date
+from decimal import Decimal
+from Solution import *
+from Tests.AbstractTest import AbstractTest
+import Utility.DBConnector as Connector
+
+
+class TestRatings(AbstractTest):
+    def populate(self):
+        for i in range(1, 4):
+            add_owner(Owner(i, "owner" + str(i)))
+            add_customer(Customer(i, "customer" + str(i)))
+        for i in range(1, 6):
+            add_apartment(Apartment(i, "street " + str(i), "Haifa", "Israel", 50))
+        owner_owns_apartment(1, 1)
+        owner_owns_apartment(1, 2)
+        owner_owns_apartment(2, 3)
+        # owner 3 has no apartments, apartments 4 and 5 no owner
+        for day, (customer_id, apartment_id, rating) in enumerate([(1, 1, 8), (2, 1, 5), (1, 2, 3), (3, 4, 9)]):
+            customer_made_reservation(customer_id, apartment_id, date(2024, 1, 1 + 3 * day),
+                                      date(2024, 1, 3 + 3 * day), 100)
+            customer_reviewed_apartment(customer_id, apartment_id, date(2024, 2, 1), rating, "ok")
+
+    def test_apartment_ratings_match_single_calls(self):
+        self.populate()
+        ids = [1, 2, 3, 4, 5, 6, -1, None, 1]
+        ratings = get_apartment_ratings(ids)
+        self.assertEqual(set(ratings), set(ids))
+        for apartment_id in ids:
+            self.assertEqual(ratings[apartment_id], get_apartment_rating(apartment_id))
+        self.assertEqual(ratings[1], Decimal("6.5"))
+        self.assertEqual(ratings[3], 0.0)
+
+    def test_owner_ratings_match_single_calls(self):
+        self.populate()
+        ids = [1, 2, 3, 4, None]
+        ratings = get_owner_ratings(ids)
+        self.assertEqual(set(ratings), set(ids))
+        for owner_id in ids:
+            self.assertEqual(ratings[owner_id], get_owner_rating(owner_id))
+        self.assertEqual(ratings[1], Decimal("4.75"))
+
+    def test_one_query(self):
+        self.populate()
+        queries = []
+        hook = lambda trace: queries.append(trace.query)
+        Connector.add_execute_hook(before=hook)
+        try:
+            get_apartment_ratings(list(range(200)))
+            get_owner_ratings(list(range(200)))
+            self.assertEqual(get_owner_ratings([]), {})
+        finally:
+            Connector.remove_execute_hook(hook)
+        self.assertEqual(len(queries), 2)
+
+    def test_all_owner_ratings(self):
+        self.populate()
+        self.assertEqual(list(all_owner_ratings(chunk_size=2)),
+                         [(owner_id, get_owner_rating(owner_id)) for owner_id in (1, 2, 3)])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
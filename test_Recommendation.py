@@ -0,0 +1,112 @@
+import random
+import unittest
+import numpy as np
+from datetime import date, timedelta
+from Solution import *
+from Tests.AbstractTest import AbstractTest
+from Tests.ConcurrentWriteTest import ConcurrentWriteTest
+from Analytics.Recommendation import RecommendationEngine
+
+
+def as_ids(recommendations):
+    return sorted((apartment.get_id(), float(rating)) for apartment, rating in recommendations)
+
+
+class TestRecommendation(AbstractTest):
+    def populate(self, customers, apartments, reviews):
+        rng = random.Random(236363)
+        for i in range(1, customers + 1):
+            add_customer(Customer(i, "customer" + str(i)))
+        for i in range(1, apartments + 1):
+            add_apartment(Apartment(i, "street " + str(i), "Haifa", "Israel", 50))
+        pairs = rng.sample([(c, a) for c in range(1, customers + 1) for a in range(1, apartments + 1)], reviews)
+        for n, (customer_id, apartment_id) in enumerate(pairs):
+            start = date(2020, 1, 1) + timedelta(days=3 * n)
+            customer_made_reservation(customer_id, apartment_id, start, start + timedelta(days=2), 100)
+            customer_reviewed_apartment(customer_id, apartment_id, start + timedelta(days=2), rng.randint(1, 10), "ok")
+
+    def assertSameRecommendations(self, actual, expected):
+        self.assertEqual([apartment for apartment, _ in actual], [apartment for apartment, _ in expected])
+        for (_, a), (_, b) in zip(actual, expected):
+            self.assertAlmostEqual(a, b, places=9)
+
+    def test_same_as_sql_for_every_customer(self):
+        self.populate(customers=25, apartments=15, reviews=120)
+        engine = RecommendationEngine.load()
+        everyone = dict(engine.recommend_all(batch_size=7))
+        self.assertGreater(len(everyone), 20)
+        for customer_id in range(0, 27):
+            expected = as_ids(get_apartment_recommendation(customer_id))
+            with self.subTest(customer_id=customer_id):
+                self.assertSameRecommendations(as_ids(engine.recommend(customer_id)), expected)
+                self.assertSameRecommendations(as_ids(everyone.get(customer_id, [])), expected)
+
+    def test_get_all_apartment_recommendations(self):
+        self.populate(customers=10, apartments=8, reviews=30)
+        everyone = get_all_apartment_recommendations()
+        self.assertTrue(everyone)
+        for customer_id, recommendations in everyone.items():
+            self.assertSameRecommendations(as_ids(recommendations), as_ids(get_apartment_recommendation(customer_id)))
+        apartment, _ = next(iter(everyone.values()))[0]
+        self.assertEqual(apartment.get_city(), "Haifa")
+
+    def test_top_recommendations(self):
+        self.populate(customers=25, apartments=15, reviews=120)
+        for customer_id in range(1, 26):
+            everything = sorted(as_ids(get_apartment_recommendation(customer_id)), key=lambda item: (-item[1], item[0]))
+            with self.subTest(customer_id=customer_id):
+                ordered = [(apartment.get_id(), rating) for apartment, rating in
+                           get_apartment_recommendation(customer_id, limit=1000)]
+                self.assertEqual([apartment for apartment, _ in ordered], [apartment for apartment, _ in everything])
+                top = [(apartment.get_id(), rating) for apartment, rating in get_apartment_recommendation(customer_id, 3)]
+                self.assertEqual([apartment for apartment, _ in top], [apartment for apartment, _ in everything[:3]])
+                good = [(apartment.get_id(), rating) for apartment, rating in
+                        get_apartment_recommendation(customer_id, min_score=6)]
+                self.assertEqual([apartment for apartment, _ in good],
+                                 [apartment for apartment, rating in everything if rating >= 6])
+                self.assertEqual(len(get_apartment_recommendation(customer_id, limit=2, min_score=6)),
+                                 min(2, len(good)))
+        self.assertEqual(get_apartment_recommendation(1, limit=0), [])
+
+    def test_clamped_and_excludes_reviewed(self):
+        engine = RecommendationEngine([1, 2, 2, 3, 1], [1, 1, 2, 2, 3], [10, 1, 5, 2, 4])
+
+        def scores(customer_id):
+            _, apartments, values = engine.scores(np.searchsorted(engine.customers, [customer_id]))
+            return [(int(engine.apartments[apartment]), value) for apartment, value in zip(apartments, values)]
+
+        # customer 1 rates 10 where customer 2 rates 1, so 2's 5 for apartment 2 becomes 50 -> 10
+        self.assertEqual(scores(1), [(2, 10.0)])
+        # customer 3 shares apartment 2 with customer 2: ratio 2 / 5, 2's 1 -> 0.4 -> 1
+        self.assertEqual(scores(3), [(1, 1.0)])
+        self.assertEqual(engine.recommend(4), [])
+        self.assertEqual(engine.recommend(None), [])
+
+    def test_empty(self):
+        engine = RecommendationEngine.load()
+        self.assertEqual(list(engine.recommend_all()), [])
+        self.assertEqual(engine.recommend(1), [])
+        self.assertEqual(get_all_apartment_recommendations(), {})
+
+
+class TestRecommendationSnapshot(ConcurrentWriteTest):
+    def setUp(self):
+        for customer_id in (1, 2):
+            add_customer(Customer(customer_id, "customer" + str(customer_id)))
+        for apartment_id in (1, 2):
+            add_apartment(Apartment(apartment_id, "street " + str(apartment_id), "Haifa", "Israel", 50))
+        for customer_id, apartment_id in ((1, 1), (2, 1), (2, 2)):
+            start = date(2020, 1, 1) + timedelta(days=10 * apartment_id + 3 * customer_id)
+            customer_made_reservation(customer_id, apartment_id, start, start + timedelta(days=2), 100)
+            customer_reviewed_apartment(customer_id, apartment_id, start + timedelta(days=2), 5, "ok")
+
+    # apartment 2 goes away between the reviews and the apartments, the engine still
+    # sees it in both
+    def test_reviews_and_apartments_are_consistent(self):
+        with self.commit_before_stream(["DELETE FROM Apartments WHERE id = 2"], stream=2):
+            engine = RecommendationEngine.load()
+        self.assertEqual([apartment.get_id() for apartment, _ in engine.recommend(1)], [2])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
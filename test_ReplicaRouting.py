@@ -0,0 +1,82 @@
+import time
+import unittest
+import psycopg2
+import Solution
+import Utility.DBConnector as Connector
+from Business.Owner import Owner
+from Utility.DBConnector import ReplicaRouter
+
+
+class TestReplicaRouter(unittest.TestCase):
+    def test_without_replicas_everything_goes_to_primary(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.target(read_only=True), ReplicaRouter.PRIMARY)
+        self.assertEqual(router.target(read_only=False), ReplicaRouter.PRIMARY)
+
+    def test_round_robin(self):
+        router = ReplicaRouter(["replica1", "replica2"])
+        self.assertEqual([router.target(read_only=True) for _ in range(4)],
+                         ["replica1", "replica2", "replica1", "replica2"])
+        self.assertEqual(router.target(read_only=False), ReplicaRouter.PRIMARY)
+
+    def test_read_your_writes(self):
+        router = ReplicaRouter(["replica1"], read_your_writes_seconds=0.2)
+        self.assertEqual(router.target(read_only=True), "replica1")
+        router.record_write()
+        self.assertEqual(router.target(read_only=True), ReplicaRouter.PRIMARY)
+        time.sleep(0.25)
+        self.assertEqual(router.target(read_only=True), "replica1")
+
+
+# a second database on the same server stands in for a replica: it has the schema
+# but never receives the writes, so every read shows where it was routed
+class TestReplicaRouting(unittest.TestCase):
+    STAND_IN = "_replica"
+
+    @classmethod
+    def setUpClass(cls):
+        cls.primary = Connector.DBConnector._DBConnector__config()
+        cls.replica = dict(cls.primary, database=cls.primary["database"] + cls.STAND_IN)
+        try:
+            admin = psycopg2.connect(**cls.primary)
+            admin.autocommit = True
+            with admin.cursor() as cursor:
+                cursor.execute("DROP DATABASE IF EXISTS " + cls.replica["database"])
+                cursor.execute("CREATE DATABASE " + cls.replica["database"])
+            admin.close()
+        except Exception as e:
+            raise unittest.SkipTest("cannot create a stand-in replica database: " + str(e))
+        for target in (cls.replica, None):
+            Connector.configure_replicas([target] if target else None)
+            Solution.create_tables()
+
+    @classmethod
+    def tearDownClass(cls):
+        Connector.configure_replicas()
+        Solution.drop_tables()
+        admin = psycopg2.connect(**cls.primary)
+        admin.autocommit = True
+        with admin.cursor() as cursor:
+            cursor.execute("DROP DATABASE IF EXISTS " + cls.replica["database"])
+        admin.close()
+
+    def tearDown(self):
+        Connector.configure_replicas()
+        Solution.clear_tables()
+
+    def test_reads_go_to_replica(self):
+        Connector.configure_replicas([self.replica])
+        self.assertEqual(Solution.add_owner(Owner(1, "Dan")), Solution.ReturnValue.OK)
+        self.assertEqual(Solution.get_owner(1), Owner.bad_owner())
+        Connector.configure_replicas()
+        self.assertEqual(Solution.get_owner(1), Owner(1, "Dan"))
+
+    def test_read_your_writes_pins_to_primary(self):
+        Connector.configure_replicas([self.replica], read_your_writes_seconds=60)
+        self.assertEqual(Solution.get_owner(1), Owner.bad_owner())
+        self.assertEqual(Solution.add_owner(Owner(1, "Dan")), Solution.ReturnValue.OK)
+        self.assertEqual(Solution.get_owner(1), Owner(1, "Dan"))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
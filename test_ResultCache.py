@@ -0,0 +1,70 @@
+import time
+import unittest
+from datetime import date
+from Solution import *
+from Tests.AbstractTest import AbstractTest
+import Utility.ResultCache as ResultCache
+
+
+class TestResultCache(AbstractTest):
+    def setUp(self):
+        super().setUp()
+        ResultCache.enable_cache()
+
+    def tearDown(self):
+        ResultCache.disable_cache()
+        super().tearDown()
+
+    def populate(self):
+        add_owner(Owner(1, "Dan"))
+        add_customer(Customer(1, "Noa"))
+        add_apartment(Apartment(1, "Herzl 1", "Haifa", "Israel", 80))
+        owner_owns_apartment(1, 1)
+        customer_made_reservation(1, 1, date(2024, 1, 1), date(2024, 1, 5), 400)
+
+    def test_hits_until_a_dependency_is_written(self):
+        self.populate()
+        self.assertEqual(reservations_per_owner(), [("Dan", 1)])
+        reservations_per_owner().append(("someone", 9))
+        stats = ResultCache.cache_stats()
+        self.assertEqual(reservations_per_owner(), [("Dan", 1)])
+        self.assertEqual(ResultCache.cache_stats()["hits"], stats["hits"] + 1)
+
+        # an unrelated write keeps the entry
+        add_customer(Customer(2, "Eli"))
+        reservations_per_owner()
+        self.assertEqual(ResultCache.cache_stats()["hits"], stats["hits"] + 2)
+
+        customer_made_reservation(2, 1, date(2024, 2, 1), date(2024, 2, 5), 400)
+        self.assertEqual(reservations_per_owner(), [("Dan", 2)])
+        delete_customers([1, 2])
+        self.assertEqual(reservations_per_owner(), [("Dan", 0)])
+
+    def test_results_are_copies(self):
+        self.populate()
+        get_all_location_owners()[0].set_owner_name("Yuval")
+        get_all_location_owners()[0].set_owner_name("Yuval")
+        self.assertEqual(get_all_location_owners(), [Owner(1, "Dan")])
+        self.assertEqual(get_all_location_owners()[0].get_owner_name(), "Dan")
+        self.assertEqual(ResultCache.cache_stats()["hits"], 3)
+
+    def test_arguments_are_part_of_the_key(self):
+        self.populate()
+        self.assertEqual(profit_per_month(2024)[0], (1, 60.0))
+        self.assertEqual(profit_per_month(2023)[0], (1, 0))
+        self.assertEqual(profit_per_month(2024)[0], (1, 60.0))
+        self.assertEqual(ResultCache.cache_stats()["hits"], 1)
+
+    def test_ttl(self):
+        self.populate()
+        ResultCache.enable_cache(ttl=0.05)
+        get_top_customer()
+        get_top_customer()
+        self.assertEqual(ResultCache.cache_stats()["hits"], 1)
+        time.sleep(0.06)
+        get_top_customer()
+        self.assertEqual(ResultCache.cache_stats()["hits"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
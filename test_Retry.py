@@ -0,0 +1,57 @@
+import unittest
+from Utility.Exceptions import DatabaseException
+from Utility.ReturnValue import ReturnValue
+from Utility.Retry import RetryPolicy, retry_transaction, retry_metrics, reset_retry_metrics
+
+NO_WAIT = RetryPolicy(max_attempts=3, base_delay=0, max_delay=0)
+
+
+class TestRetry(unittest.TestCase):
+    def setUp(self):
+        reset_retry_metrics()
+        self.attempts = 0
+
+    def test_retries_until_success(self):
+        @retry_transaction(NO_WAIT)
+        def book():
+            self.attempts += 1
+            if self.attempts < 3:
+                raise DatabaseException.SERIALIZATION_FAILURE("SERIALIZATION_FAILURE")
+            return ReturnValue.OK
+
+        self.assertEqual(book(), ReturnValue.OK)
+        self.assertEqual(retry_metrics()["book"], {"calls": 1, "retries": 2, "exhausted": 0})
+
+    def test_gives_up_after_max_attempts(self):
+        @retry_transaction(NO_WAIT)
+        def book():
+            self.attempts += 1
+            raise DatabaseException.DEADLOCK_DETECTED("DEADLOCK_DETECTED")
+
+        self.assertEqual(book(), ReturnValue.ERROR)
+        self.assertEqual(self.attempts, 3)
+        self.assertEqual(retry_metrics()["book"], {"calls": 1, "retries": 2, "exhausted": 1})
+
+    def test_other_errors_are_not_retried(self):
+        @retry_transaction(NO_WAIT)
+        def book():
+            self.attempts += 1
+            raise DatabaseException.UNIQUE_VIOLATION("UNIQUE_VIOLATION")
+
+        self.assertRaises(DatabaseException.UNIQUE_VIOLATION, book)
+        self.assertEqual(self.attempts, 1)
+
+    def test_backoff_is_bounded(self):
+        policy = RetryPolicy(base_delay=0.01, max_delay=0.05)
+        for retry in range(10):
+            self.assertTrue(0 <= policy.delay(retry) <= min(0.05, 0.01 * 2 ** retry))
+
+    def test_policy_is_validated(self):
+        self.assertRaises(ValueError, RetryPolicy, max_attempts=0)
+        self.assertRaises(ValueError, RetryPolicy, base_delay=-0.1)
+        self.assertRaises(ValueError, RetryPolicy, max_delay=-1)
+        self.assertEqual(RetryPolicy(max_attempts=1).max_attempts, 1)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
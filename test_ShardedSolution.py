@@ -0,0 +1,258 @@
+import csv
+import io
+import random
+import unittest
+from datetime import date
+import psycopg2
+import BigTest
+import ShardedSolution
+import Solution
+import Utility.DBConnector as Connector
+from Business.Owner import Owner
+from Business.Customer import Customer
+from Business.Apartment import Apartment
+from Utility.ReturnValue import ReturnValue
+from test_EmbeddedBackend import normalize_result, random_calls, run_bigtest
+
+
+# three databases on the same server stand in for the shards. the calls of BigTest and of
+# a random workload run against Postgres alone (in test mode), then on the shards, and
+# every result has to match
+class TestShardedSolution(unittest.TestCase):
+    SHARDS = 3
+    TESTS = sorted(name for name in dir(BigTest.TestCRUD) if name.startswith("test"))
+
+    @classmethod
+    def setUpClass(cls):
+        if Solution.BACKEND != "postgres":
+            raise unittest.SkipTest("the differential test needs the postgres backend")
+        cls.primary = Connector.DBConnector._DBConnector__config()
+        cls.shards = [dict(cls.primary, database=f"{cls.primary['database']}_shard{i}") for i in range(cls.SHARDS)]
+        try:
+            cls.admin(["DROP DATABASE IF EXISTS " + shard["database"] for shard in cls.shards]
+                      + ["CREATE DATABASE " + shard["database"] for shard in cls.shards])
+        except Exception as e:
+            raise unittest.SkipTest("cannot create the shard databases: " + str(e))
+        ShardedSolution.configure_shards(cls.shards)
+        ShardedSolution.create_tables()
+
+    @classmethod
+    def tearDownClass(cls):
+        ShardedSolution.configure_shards()
+        cls.admin(["DROP DATABASE IF EXISTS " + shard["database"] for shard in cls.shards])
+
+    @classmethod
+    def admin(cls, statements):
+        admin = psycopg2.connect(**cls.primary)
+        admin.autocommit = True
+        try:
+            with admin.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
+        finally:
+            admin.close()
+
+    def tearDown(self):
+        ShardedSolution.disable_availability_index()
+        ShardedSolution.clear_tables()
+
+    def count(self, shard, query):
+        connection = psycopg2.connect(**self.shards[shard])
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(query)
+                return cursor.fetchone()[0]
+        finally:
+            connection.close()
+
+    def populate(self):
+        ShardedSolution.add_owner(Owner(1, "Dan"))
+        ShardedSolution.add_owner(Owner(2, "Noa"))
+        for customer_id in range(1, 4):
+            ShardedSolution.add_customer(Customer(customer_id, "customer " + str(customer_id)))
+        for apartment_id in range(1, 9):
+            ShardedSolution.add_apartment(Apartment(apartment_id, "street " + str(apartment_id),
+                                                    "Haifa" if apartment_id % 2 else "Paris", "Israel", 50))
+            ShardedSolution.owner_owns_apartment(1 + apartment_id % 2, apartment_id)
+            for customer_id in range(1, 4):
+                start = date(2024, customer_id, apartment_id)
+                ShardedSolution.customer_made_reservation(customer_id, apartment_id, start,
+                                                          date(2024, customer_id, apartment_id + 3), 300)
+                ShardedSolution.customer_reviewed_apartment(customer_id, apartment_id, date(2024, 6, 1),
+                                                            (customer_id * apartment_id) % 10 + 1, "ok")
+
+    def test_rows_live_on_their_shard(self):
+        self.populate()
+        for shard in range(self.SHARDS):
+            self.assertEqual(self.count(shard, "SELECT COUNT(*) FROM Owners"), 2)
+            self.assertEqual(self.count(shard, "SELECT COUNT(*) FROM Customers"), 3)
+            apartments = [apartment_id for apartment_id in range(1, 9) if ShardedSolution.shard_of(apartment_id) == shard]
+            self.assertGreater(len(apartments), 0)
+            self.assertEqual(self.count(shard, "SELECT COUNT(*) FROM Apartments"), len(apartments))
+            self.assertEqual(self.count(shard, "SELECT COUNT(*) FROM Reservations"), 3 * len(apartments))
+        self.assertEqual(ShardedSolution.delete_customer(2), ReturnValue.OK)
+        self.assertEqual(ShardedSolution.delete_customer(2), ReturnValue.NOT_EXISTS)
+        self.assertEqual(sum(self.count(shard, "SELECT COUNT(*) FROM Reviews") for shard in range(self.SHARDS)), 16)
+
+    def execute(self, shard, statement):
+        connection = psycopg2.connect(**self.shards[shard])
+        connection.autocommit = True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(statement)
+        finally:
+            connection.close()
+
+    # a delete one shard refuses is rolled back on the others, with the rows it cascades to
+    def test_replicated_delete_is_all_or_nothing(self):
+        self.populate()
+        last = self.SHARDS - 1
+        self.execute(last, """
+            CREATE FUNCTION refuse_delete() RETURNS trigger LANGUAGE plpgsql AS $$
+            BEGIN RAISE EXCEPTION 'refused'; END $$;
+            CREATE TRIGGER refuse_delete BEFORE DELETE ON Customers FOR EACH ROW EXECUTE FUNCTION refuse_delete();
+            CREATE TRIGGER refuse_delete BEFORE DELETE ON Owners FOR EACH ROW EXECUTE FUNCTION refuse_delete();
+        """)
+        try:
+            self.assertEqual(ShardedSolution.delete_customer(2), ReturnValue.ERROR)
+            self.assertEqual(ShardedSolution.delete_owner(1), ReturnValue.ERROR)
+        finally:
+            self.execute(last, "DROP FUNCTION refuse_delete() CASCADE")
+        for shard in range(self.SHARDS):
+            self.assertEqual(self.count(shard, "SELECT COUNT(*) FROM Customers WHERE id = 2"), 1)
+            self.assertEqual(self.count(shard, "SELECT COUNT(*) FROM Owners WHERE id = 1"), 1)
+        self.assertEqual(sum(self.count(shard, "SELECT COUNT(*) FROM Reservations WHERE customer_id = 2")
+                             for shard in range(self.SHARDS)), 8)
+        self.assertEqual(ShardedSolution.delete_owner(1), ReturnValue.OK)
+        self.assertEqual(ShardedSolution.delete_owner(1), ReturnValue.NOT_EXISTS)
+        self.assertEqual(ShardedSolution.delete_owner(-1), ReturnValue.BAD_PARAMS)
+        for shard in range(self.SHARDS):
+            self.assertEqual(self.count(shard, "SELECT COUNT(*) FROM Owners"), 1)
+
+    def test_address_is_unique_across_shards(self):
+        first, second = 1, next(apartment_id for apartment_id in range(2, 20)
+                                if ShardedSolution.shard_of(apartment_id) != ShardedSolution.shard_of(1))
+        self.assertEqual(ShardedSolution.add_apartment(Apartment(first, "Herzl 1", "Haifa", "Israel", 50)),
+                         ReturnValue.OK)
+        self.assertEqual(ShardedSolution.add_apartment(Apartment(second, "Herzl 1", "Haifa", "Israel", 60)),
+                         ReturnValue.ALREADY_EXISTS)
+        self.assertEqual(ShardedSolution.get_apartment(second), Apartment.bad_apartment())
+        self.assertEqual(ShardedSolution.add_apartment(Apartment(second, "Herzl 1", "Haifa", "Israel", -1)),
+                         ReturnValue.BAD_PARAMS)
+        self.assertEqual(ShardedSolution.add_apartment(Apartment(second, "Herzl 2", "Haifa", "Israel", 60)),
+                         ReturnValue.OK)
+
+    # with reuse, add_apartment's lock connection and the insert on shard 0 are two
+    # connectors of one thread, the insert must not end the lock's transaction
+    def test_address_is_unique_with_connection_reuse(self):
+        Connector.enable_connection_reuse()
+        try:
+            self.test_address_is_unique_across_shards()
+        finally:
+            Connector.enable_connection_reuse(False)
+            Connector.release_thread_connection()
+
+    def test_same_results_as_postgres(self):
+        for name in self.TESTS:
+            with self.subTest(name):
+                Connector.start_test_mode()
+                try:
+                    Solution.create_tables()
+                    calls = run_bigtest(name, Solution)
+                finally:
+                    Connector.stop_test_mode()
+                ShardedSolution.clear_tables()
+                for i, (function_name, args, kwargs, expected) in enumerate(calls):
+                    actual = getattr(ShardedSolution, function_name)(*args, **kwargs)
+                    self.assertEqual(normalize_result(function_name, actual),
+                                     normalize_result(function_name, expected),
+                                     f"call {i}: {function_name}{args}")
+
+    def test_bigtest_on_shards(self):
+        for name in self.TESTS:
+            with self.subTest(name):
+                ShardedSolution.clear_tables()
+                run_bigtest(name, ShardedSolution)
+
+    def test_random_workload(self):
+        calls = random_calls(random.Random(236363))
+        Connector.start_test_mode()
+        try:
+            Solution.create_tables()
+            expected = [getattr(Solution, name)(*args) for name, args in calls]
+        finally:
+            Connector.stop_test_mode()
+        for i, ((name, args), result) in enumerate(zip(calls, expected)):
+            actual = getattr(ShardedSolution, name)(*args)
+            self.assertEqual(normalize_result(name, actual), normalize_result(name, result),
+                             f"call {i}: {name}{args}")
+
+    def test_bulk_and_streaming(self):
+        self.populate()
+        rows = [(3, apartment_id, date(2024, 9, 1), date(2024, 9, 3), 100) for apartment_id in range(1, 10)]
+        self.assertEqual(ShardedSolution.import_reservations(rows), [ReturnValue.OK] * 8 + [ReturnValue.NOT_EXISTS])
+        ratings = ShardedSolution.get_owner_ratings([1, 2, 3])
+        self.assertEqual(list(ShardedSolution.all_owner_ratings(chunk_size=1)), [(1, ratings[1]), (2, ratings[2])])
+        self.assertEqual(ShardedSolution.delete_apartments([8, 1, 8, 99]),
+                         {8: ReturnValue.OK, 1: ReturnValue.OK, 99: ReturnValue.NOT_EXISTS})
+        recommendations = ShardedSolution.get_all_apartment_recommendations()
+        for customer_id in range(1, 4):
+            self.assertEqual(normalize_result("get_apartment_recommendation", recommendations.get(customer_id, [])),
+                             normalize_result("get_apartment_recommendation",
+                                              ShardedSolution.get_apartment_recommendation(customer_id)))
+        report = ShardedSolution.occupancy_report(2024)
+        self.assertEqual(list(report.per_apartment()), list(range(2, 8)))
+        self.assertAlmostEqual(report.per_apartment()[2][0], 3 / 31)
+        self.assertAlmostEqual(report.per_apartment()[2][8], 2 / 30)
+        self.assertAlmostEqual(report.per_city()[("Haifa", "Israel")][0], 9 / (3 * 31))
+        self.assertAlmostEqual(report.per_owner()[1][1], 9 / (3 * 29))
+
+    def test_export(self):
+        self.populate()
+        out = io.StringIO()
+        self.assertEqual(ShardedSolution.export_table("Reservations", out), ReturnValue.OK)
+        rows = list(csv.reader(io.StringIO(out.getvalue())))
+        self.assertEqual(rows[0], ["customer_id", "apartment_id", "start_date", "end_date", "total_price"])
+        self.assertEqual(len(rows), 1 + 24)
+        out = io.StringIO()
+        self.assertEqual(ShardedSolution.export_table("Owners", out), ReturnValue.OK)
+        self.assertEqual(out.getvalue(), "id,name\n1,Dan\n2,Noa\n")
+        self.assertEqual(ShardedSolution.export_table("OwnerRating", io.StringIO()), ReturnValue.ERROR)
+
+        out = io.BytesIO()
+        self.assertEqual(ShardedSolution.export_table("Reservations", out, format="binary"), ReturnValue.OK)
+        connection = psycopg2.connect(**self.shards[0])
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("CREATE TEMP TABLE ReservationsCopy (LIKE Reservations)")
+                out.seek(0)
+                cursor.copy_expert("COPY ReservationsCopy FROM STDIN WITH (FORMAT binary)", out)
+                cursor.execute("SELECT COUNT(*), SUM(total_price) FROM ReservationsCopy")
+                self.assertEqual(cursor.fetchone(), (24, 24 * 300.0))
+        finally:
+            connection.close()
+
+    def test_availability_index(self):
+        self.populate()
+        index = ShardedSolution.enable_availability_index()
+        self.assertEqual(sorted(index.apartments()), list(range(1, 9)))
+        self.assertFalse(index.is_available(5, date(2024, 1, 6), date(2024, 1, 7)))
+        self.assertEqual(ShardedSolution.customer_cancelled_reservation(1, 5, date(2024, 1, 5)), ReturnValue.OK)
+        self.assertTrue(index.is_available(5, date(2024, 1, 6), date(2024, 1, 7)))
+        self.assertEqual(ShardedSolution.delete_apartment(5), ReturnValue.OK)
+        self.assertEqual(index.reservations(5), [])
+
+    def test_change_feed_triggers(self):
+        triggers = "SELECT COUNT(*) FROM pg_trigger WHERE tgname LIKE '%_notify_%'"
+        ShardedSolution.enable_change_feed()
+        try:
+            for shard in range(self.SHARDS):
+                self.assertEqual(self.count(shard, triggers), 4 * len(Solution.CHANGE_FEED_KEYS))
+        finally:
+            ShardedSolution.disable_change_feed()
+        for shard in range(self.SHARDS):
+            self.assertEqual(self.count(shard, triggers), 0)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
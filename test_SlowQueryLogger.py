@@ -0,0 +1,86 @@
+import threading
+import unittest
+import psycopg2.extensions
+import Utility.DBConnector as Connector
+
+
+# the plans are taken on the connection that ran the slow statement, so they see (and do
+# not wait for) the locks of its transaction, and explaining a write changes nothing
+class TestSlowQueryLogger(unittest.TestCase):
+    SLOW_INSERT = "INSERT INTO ExplainTest SELECT 1 FROM pg_sleep(0.05)"
+
+    # a writer stuck on its plan would still hold its lock, do not wait for it
+    @staticmethod
+    def ddl(*statements):
+        conn = Connector.DBConnector()
+        try:
+            conn.execute("SET lock_timeout = '5s'")
+            for statement in statements:
+                conn.execute(statement)
+        finally:
+            conn.close()
+
+    def setUp(self):
+        self.ddl("DROP TABLE IF EXISTS ExplainTest", "CREATE TABLE ExplainTest (id INTEGER)")
+        self.logger = Connector.SlowQueryLogger(threshold_ms=20, explain=True).install()
+
+    def tearDown(self):
+        self.logger.uninstall()
+        self.ddl("DROP TABLE ExplainTest")
+
+    def count(self, conn):
+        _, result = conn.execute("SELECT COUNT(*) FROM ExplainTest")
+        return result.rows[0][0]
+
+    def test_explain_inside_locked_transaction(self):
+        def write():
+            conn = Connector.DBConnector()
+            try:
+                with conn.transaction():
+                    conn.execute("LOCK TABLE ExplainTest IN SHARE ROW EXCLUSIVE MODE")
+                    conn.execute(self.SLOW_INSERT)
+            finally:
+                conn.close()
+
+        with self.assertLogs(self.logger.logger) as logs:
+            # a plan taken on another connection would wait for the lock forever
+            writer = threading.Thread(target=write, daemon=True)
+            writer.start()
+            writer.join(10)
+            self.assertFalse(writer.is_alive())
+        self.assertEqual(len(self.logger.slow_queries), 1)
+        self.assertIn("Insert on explaintest", "\n".join(logs.output))
+        conn = Connector.DBConnector()
+        try:
+            self.assertEqual(self.count(conn), 1)
+        finally:
+            conn.close()
+
+    def test_explain_outside_transaction(self):
+        conn = Connector.DBConnector()
+        try:
+            with self.assertLogs(self.logger.logger) as logs:
+                conn.execute(self.SLOW_INSERT)
+            self.assertIn("Insert on explaintest", "\n".join(logs.output))
+            # the insert is committed, its re-run for the plan is not, and no transaction is left open
+            self.assertEqual(conn.connection.get_transaction_status(),
+                             psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+            self.assertEqual(self.count(conn), 1)
+        finally:
+            conn.close()
+
+    def test_explain_in_test_mode(self):
+        Connector.start_test_mode()
+        try:
+            conn = Connector.DBConnector()
+            with self.assertLogs(self.logger.logger) as logs:
+                conn.execute(self.SLOW_INSERT)
+            self.assertIn("Insert on explaintest", "\n".join(logs.output))
+            self.assertEqual(self.count(conn), 1)
+            conn.close()
+        finally:
+            Connector.stop_test_mode()
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)